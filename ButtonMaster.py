@@ -1,27 +1,23 @@
 import RPi.GPIO as GPIO
-import time
 import os
-
-# use BCM pin numbers
-GPIO.setmode(GPIO.BCM)
+import signal
+from gpio_bus import get_bus
 
 # set pin 18 as input with pull-down
 BUTTON_PIN = 18
-GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
 hold_time_required = 5  # seconds to hold before reboot
 
+def reboot(event):
+    print("Rebooting...")
+    os.system("sudo reboot")
+
+bus = get_bus()
+bus.watch(BUTTON_PIN, pull="down")
+bus.on_hold(BUTTON_PIN, hold_time_required, reboot, name="reboot-button")
+
 try:
-    while True:
-        if GPIO.input(BUTTON_PIN) == GPIO.HIGH:
-            press_start = time.time()
-            while GPIO.input(BUTTON_PIN) == GPIO.HIGH:
-                time.sleep(0.1)
-                if time.time() - press_start >= hold_time_required:
-                    print("Rebooting...")
-                    os.system("sudo reboot")
-                    break
-        time.sleep(0.1)
+    signal.pause()  # everything happens in the edge callbacks
 
 except KeyboardInterrupt:
     print("Stopped.")
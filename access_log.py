@@ -0,0 +1,222 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from upload_queue import get_upload_queue, PRIORITY_LOCK_STATUS
+from hal import s3_client
+
+# --- Config ---
+S3_BUCKET_NAME = "doorinfo"
+LOG_PREFIX = "door_log"                 # door_log/YYYY/MM/DD/HH/<segment>.jsonl
+PENDING_FILE = "access_log.pending.jsonl"
+FLUSH_SECONDS = 5                       # longest an event waits locally
+BATCH_SIZE = 50                         # or flush as soon as this many are pending
+COMPACTED_NAME = "compacted"
+TAIL_MAX_HOURS = 24 * 7                 # how far back tail() will look
+DEVICE = socket.gethostname()
+
+
+def hour_prefix(when):
+    return f"{LOG_PREFIX}/{when:%Y/%m/%d/%H}/"
+
+
+def _hours(start, end):
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour <= end:
+        yield hour
+        hour += timedelta(hours=1)
+
+
+class AccessLog:
+    """
+    Append-only door event log stored as small hourly JSONL segments.
+
+    append() adds one event to a local pending file (so a crash loses
+    nothing) and returns. Every FLUSH_SECONDS, or once BATCH_SIZE events are
+    pending, the batch becomes one new segment object under its hour's
+    prefix and is handed to the upload queue. Each segment has a unique key,
+    so writers never overwrite each other and no write re-sends old entries.
+    Segments are spooled in the lock-status priority class: they record
+    lock events, so they go out with door_status.json and are never
+    evicted to make room for clips. An event leaves the pending file only
+    once its segment is in the upload spool.
+    compact() merges an old hour's segments into one object. tail() and
+    read_range() only list and fetch the hours they need.
+    """
+
+    def __init__(self, bucket=S3_BUCKET_NAME, pending_file=PENDING_FILE, client=None):
+        self.bucket = bucket
+        self.pending_file = pending_file
+        self._client = client
+        self._lock = threading.Lock()
+        self._pending = self._load_pending()
+        self._seq = 0
+        self._wake = threading.Event()
+        self._running = False
+
+    @property
+    def client(self):
+        # Only the readers and compaction talk to S3 directly; appends go through the upload queue
+        if self._client is None:
+            self._client = s3_client(signature_version="s3v4")
+        return self._client
+
+    # --- Writing ---
+    def start(self):
+        if not self._running:
+            self._running = True
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+        return self
+
+    def append(self, action, **fields):
+        now = time.time()
+        event = {"ts": now, "time": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                 "action": action, "device": DEVICE, **fields}
+        line = json.dumps(event)
+        with self._lock:
+            with open(self.pending_file, "a") as f:
+                f.write(line + "\n")
+            self._pending.append(line)
+            if len(self._pending) >= BATCH_SIZE:
+                self._wake.set()
+        return event
+
+    def _load_pending(self):
+        if not os.path.exists(self.pending_file):
+            return []
+        with open(self.pending_file, "r") as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _flush_loop(self):
+        while self._running:
+            self._wake.wait(FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[LOG] Flush failed, keeping events pending: {e}")
+
+    def flush(self):
+        """Turn pending events into segments (one per hour they fall in)."""
+        with self._lock:
+            lines = self._pending
+            if not lines:
+                return 0
+            by_hour = {}
+            for i, line in enumerate(lines):
+                ts = json.loads(line)["ts"]
+                by_hour.setdefault(hour_prefix(datetime.fromtimestamp(ts)), []).append(i)
+            queue = get_upload_queue()
+            spooled = set()
+            try:
+                for prefix, batch in by_hour.items():
+                    self._seq += 1
+                    key = f"{prefix}{DEVICE}-{int(time.time() * 1000)}-{self._seq}.jsonl"
+                    body = "".join(lines[i] + "\n" for i in batch)
+                    queue.enqueue_bytes(self.bucket, key, body.encode("utf-8"),
+                                        PRIORITY_LOCK_STATUS, content_type="application/x-ndjson")
+                    spooled.update(batch)
+            finally:
+                # Only what is in the durable upload spool leaves the pending file
+                self._pending = [line for i, line in enumerate(lines) if i not in spooled]
+                self._rewrite_pending()
+        return len(spooled)
+
+    def _rewrite_pending(self):
+        tmp = self.pending_file + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("".join(line + "\n" for line in self._pending))
+        os.replace(tmp, self.pending_file)
+
+    # --- Reading ---
+    def _segment_keys(self, hour):
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=hour_prefix(hour)):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return keys
+
+    def _read_segment(self, key):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read().decode("utf-8")
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+
+    def _read_hour(self, hour):
+        events = []
+        for key in self._segment_keys(hour):
+            events.extend(self._read_segment(key))
+        events.sort(key=lambda e: e["ts"])
+        return events
+
+    def read_range(self, start, end=None):
+        """Events with start <= time <= end (datetimes), oldest first."""
+        end = end or datetime.now()
+        events = []
+        for hour in _hours(start, end):
+            events.extend(e for e in self._read_hour(hour)
+                          if start.timestamp() <= e["ts"] <= end.timestamp())
+        return events
+
+    def tail(self, n=20):
+        """The newest n events, oldest first, walking back one hour at a time."""
+        events = []
+        hour = datetime.now()
+        for _ in range(TAIL_MAX_HOURS):
+            events = self._read_hour(hour) + events
+            if len(events) >= n:
+                break
+            hour -= timedelta(hours=1)
+        return events[-n:]
+
+    # --- Compaction ---
+    def compact(self, older_than_hours=2, max_hours=TAIL_MAX_HOURS):
+        """
+        Merge each finished hour's segments into one compacted object.
+        The merged object is written before the inputs are deleted, so a
+        reader sees every event at least once throughout.
+        """
+        merged_hours = 0
+        newest = datetime.now() - timedelta(hours=older_than_hours)
+        for hour in _hours(newest - timedelta(hours=max_hours), newest):
+            keys = self._segment_keys(hour)
+            if len(keys) <= 1:
+                continue
+            events = {}
+            for key in keys:
+                for e in self._read_segment(key):
+                    events[(e["ts"], e.get("device"), e["action"])] = e
+            body = "".join(json.dumps(e) + "\n" for e in sorted(events.values(), key=lambda e: e["ts"]))
+            target = f"{hour_prefix(hour)}{COMPACTED_NAME}-{int(time.time())}.jsonl"
+            self.client.put_object(Bucket=self.bucket, Key=target, Body=body.encode("utf-8"),
+                                   ContentType="application/x-ndjson")
+            self.client.delete_objects(Bucket=self.bucket,
+                                       Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True})
+            merged_hours += 1
+            print(f"[LOG] Compacted {len(keys)} segments of {hour:%Y-%m-%d %H}:00 → {target}")
+        return merged_hours
+
+
+access_log = None
+_log_lock = threading.Lock()
+
+def get_access_log():
+    global access_log
+    with _log_lock:
+        if access_log is None:
+            access_log = AccessLog().start()
+    return access_log
+
+
+if __name__ == "__main__":
+    # python access_log.py tail [n] | compact [older_than_hours]
+    command = sys.argv[1] if len(sys.argv) > 1 else "tail"
+    log_reader = AccessLog()
+    if command == "compact":
+        hours = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        print(f"[LOG] ✅ Compacted {log_reader.compact(hours)} hour(s)")
+    else:
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        for e in log_reader.tail(n):
+            print(f"{e['time']} - {e['action']}")
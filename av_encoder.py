@@ -0,0 +1,114 @@
+import threading
+from fractions import Fraction
+import av
+import numpy as np
+
+# --- Config ---
+VIDEO_CODEC = "libx264"
+VIDEO_BITRATE = 1_000_000
+VIDEO_PRESET = "veryfast"
+AUDIO_BITRATE = 96_000
+ENCODER_THREADS = 2
+KEYFRAME_SECONDS = 1    # one fragment per keyframe interval
+# Fragmented MP4: playable/streamable while it is still being written and
+# never needs to seek back to patch the header
+FRAGMENT_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+PTS_TIME_BASE = Fraction(1, 1000)
+
+
+class ClipEncoder:
+    """
+    In-process H.264 + AAC encoder muxing straight into one fragmented MP4.
+    `output` is a path or any writable file object (e.g. io.BytesIO).
+    add_video()/add_audio() may be called from different threads; frames
+    are timestamped from their capture time so audio and video stay in sync.
+    t0 is the capture time of pts 0; by default the first timestamp added.
+    Audio starting after t0 is offset by the gap, so pass the first video
+    frame's time as t0 when audio may be added before it.
+    """
+
+    def __init__(self, output, width, height, fps=30, audio_rate=44100, audio_channels=2,
+                 with_audio=True, bitrate=VIDEO_BITRATE, audio_bitrate=AUDIO_BITRATE,
+                 threads=ENCODER_THREADS, t0=None):
+        self._lock = threading.Lock()
+        self.container = av.open(output, mode="w", format="mp4", options={"movflags": FRAGMENT_FLAGS})
+
+        self.video = self.container.add_stream(VIDEO_CODEC, rate=fps)
+        self.video.width = width
+        self.video.height = height
+        self.video.pix_fmt = "yuv420p"
+        self.video.bit_rate = bitrate
+        self.video.codec_context.thread_count = threads
+        self.video.codec_context.gop_size = max(1, int(fps * KEYFRAME_SECONDS))
+        self.video.codec_context.options = {"preset": VIDEO_PRESET, "tune": "zerolatency"}
+        # Capture timestamps jitter; in the default 1/fps time base two frames
+        # less than a frame interval apart would get the same pts
+        self.video.codec_context.time_base = PTS_TIME_BASE
+        self.video.time_base = PTS_TIME_BASE
+
+        self.audio = None
+        self.audio_channels = audio_channels
+        self.audio_rate = audio_rate
+        if with_audio:
+            self.audio = self.container.add_stream("aac", rate=audio_rate)
+            self.audio.layout = "stereo" if audio_channels == 2 else "mono"
+            self.audio.bit_rate = audio_bitrate
+
+        self._t0 = t0
+        self._last_video_pts = -1
+        self._audio_samples = 0
+        self.video_frames = 0
+        self.closed = False
+
+    def _pts(self, timestamp):
+        if self._t0 is None:
+            self._t0 = timestamp
+        return int(round((timestamp - self._t0) / PTS_TIME_BASE))
+
+    def add_video(self, bgr, timestamp):
+        frame = av.VideoFrame.from_ndarray(bgr, format="bgr24")
+        with self._lock:
+            pts = max(self._pts(timestamp), self._last_video_pts + 1)
+            self._last_video_pts = pts
+            frame.pts = pts
+            frame.time_base = PTS_TIME_BASE
+            for packet in self.video.encode(frame):
+                self.container.mux(packet)
+            self.video_frames += 1
+
+    def add_audio(self, pcm, timestamp=None):
+        """Interleaved signed 16-bit PCM bytes at the configured rate/channels."""
+        if self.audio is None or not pcm:
+            return
+        samples = np.frombuffer(pcm, dtype=np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout=self.audio.layout.name)
+        frame.sample_rate = self.audio_rate
+        with self._lock:
+            if timestamp is not None and self._audio_samples == 0:
+                if self._t0 is None:
+                    self._t0 = timestamp
+                else:
+                    self._audio_samples = max(0, int(round((timestamp - self._t0) * self.audio_rate)))
+            # Audio is continuous, so its clock is the running sample count
+            frame.pts = self._audio_samples
+            frame.time_base = Fraction(1, self.audio_rate)
+            self._audio_samples += samples.shape[1] // self.audio_channels
+            for packet in self.audio.encode(frame):
+                self.container.mux(packet)
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            for stream in (self.video, self.audio):
+                if stream is not None:
+                    for packet in stream.encode(None):
+                        self.container.mux(packet)
+            self.container.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
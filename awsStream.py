@@ -1,196 +1,181 @@
 import asyncio
 import threading
 import time
-import datetime
 import os
-import subprocess
 import cv2
-import numpy as np
-import boto3
 import aiohttp
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
-import pyrealsense2 as rs
 import av
+from frame_broker import get_broker, STANDBY_FPS
+from clip_recorder import MotionClipRecorder
+from upload_queue import get_upload_queue, PRIORITY_MOTION_CLIP
+from intercom import AudioIntercom
+from metrics import timer
+from hal import s3_client
 
 # --- Config ---
 SIGNALING_SERVER = "http://54.151.64.7:8000"
-DEFAULT_BUCKET = "streambuffer"
 MOTION_BUCKET = "smartdoor-events"
 AUDIO_BUCKET = "audioforstream"
-RECORD_SECONDS = 5
-MOTION_COOLDOWN = 30
-OUTPUT_DIR = "/home/pi/streambuffer"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+STREAM_SIZE = (640, 480)
 
 # --- Globals ---
-s3 = boto3.client("s3")
+s3 = s3_client()
 streaming_event = threading.Event()
 stop_event = threading.Event()
 streaming_lock = threading.Lock()
 video_track_instance = None
-last_motion_upload_time = 0
-LAST_PLAYED_FILE = ""
-AUDIO_POLL_INTERVAL = 1  # seconds
+recorder = None
+recorder_lock = threading.Lock()
+intercom = AudioIntercom(s3, AUDIO_BUCKET)
+RECV_STALL_TIMEOUT = 0.5  # seconds recv() waits for a new frame before repeating the last one
 
 # --- Upload helper ---
 def upload_to_s3(filepath, bucket):
+    # Spooled and sent by the shared upload queue; returns immediately
     filename = os.path.basename(filepath)
-    try:
-        s3.upload_file(filepath, bucket, filename)
-        print(f"[UPLOAD] {filename} → s3://{bucket}/{filename}")
-        os.remove(filepath)
-    except Exception as e:
-        print(f"[ERROR] Failed to upload {filename} to {bucket}: {e}")
-
-# --- Audio polling and playback ---
-def start_audio_polling_thread():
-    def poll_audio():
-        global LAST_PLAYED_FILE
-        print("[AUDIO] Starting audio polling thread...")
-
+    with timer("upload_to_s3"):
+        get_upload_queue().enqueue_file(filepath, bucket, filename, PRIORITY_MOTION_CLIP, content_type="video/mp4")
+
+# --- Latest-frame slot ---
+class FrameSlot:
+    """
+    Single-slot buffer between the capture thread and the event loop.
+    publish() replaces one tuple reference (atomic under the GIL), so the
+    writer never takes a lock and never waits on a reader; readers on the
+    event loop await next_frame() and are woken via call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._latest = None     # (seq, image)
+        self._loop = None
+        self._waiters = []
+
+    def publish(self, seq, image):
+        self._latest = (seq, image)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def peek(self):
+        return self._latest
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def next_frame(self, after_seq=-1):
+        """Wait for a frame newer than `after_seq` and return (seq, image)."""
+        self._loop = asyncio.get_running_loop()
         while True:
-            try:
-                response = s3.list_objects_v2(Bucket=AUDIO_BUCKET)
-                for obj in response.get("Contents", []):
-                    key = obj["Key"]
-                    if key == LAST_PLAYED_FILE:
-                        continue
-
-                    if not key.lower().endswith((".mp3", ".wav", ".ogg", ".3gp")):
-                        continue
-
-                    local_path = f"/tmp/{key}"
-                    print(f"[AUDIO] New file found: {key}. Downloading...")
-
-                    s3.download_file(AUDIO_BUCKET, key, local_path)
-
-                    # Play audio
-                    print(f"[AUDIO] Playing: {local_path}")
-                    try:
-                        subprocess.run(["ffplay", "-nodisp", "-autoexit", local_path], check=True)
-                    except subprocess.CalledProcessError as e:
-                        print(f"[AUDIO] Failed to play audio: {e}")
-
-                    # Delete after playing
-                    s3.delete_object(Bucket=AUDIO_BUCKET, Key=key)
-                    print(f"[AUDIO] Deleted {key} from S3 bucket.")
-                    LAST_PLAYED_FILE = key
-
-            except Exception as e:
-                print(f"[AUDIO] Error while polling audio bucket: {e}")
-
-            time.sleep(AUDIO_POLL_INTERVAL)
-
-    threading.Thread(target=poll_audio, daemon=True).start()
+            latest = self._latest
+            if latest is not None and latest[0] > after_seq:
+                return latest
+            fut = self._loop.create_future()
+            self._waiters.append(fut)
+            await fut
 
 # --- RealSense Track ---
 class RealSenseVideoTrack(VideoStreamTrack):
-    def __init__(self, motion_check_fn=None):
+    def __init__(self):
         super().__init__()
-        self.motion_check_fn = motion_check_fn
-        self.pipeline = None
+        self.camera = None
         self.keep_recording = True
+        self.slot = FrameSlot()
+        self.last_seq = -1
+        self.stats = {"frames_sent": 0, "stalled_recv": 0, "repeated_frames": 0}
         self.start_pipeline()
 
-        self.recording_thread = threading.Thread(target=self.record_loop, daemon=True)
-        self.recording_thread.start()
+        # Frame acquisition happens here, never on the event loop
+        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.capture_thread.start()
 
     def start_pipeline(self):
-        with streaming_lock:
-            self.pipeline = rs.pipeline()
-            config = rs.config()
-            config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
-            self.pipeline.start(config)
-            print("[RealSense] Camera pipeline started.")
+        # Own subscription to the shared camera; the motion recorder has its own.
+        # Nobody is watching until the answer arrives, so the camera may idle until then
+        self.camera = get_broker().subscribe("webrtc", size=STREAM_SIZE, max_fps=STANDBY_FPS)
+        print("[RealSense] Subscribed to frame broker.")
+
+    def viewer_connected(self):
+        camera = self.camera
+        if camera:
+            camera.set_max_fps(None)
 
     def stop(self):
         self.keep_recording = False
         with streaming_lock:
-            if self.pipeline:
-                self.pipeline.stop()
-                self.pipeline = None
-                print("[RealSense] Camera pipeline stopped.")
-
-    def record_loop(self):
-        global last_motion_upload_time
+            if self.camera:
+                self.camera.close()
+            self.camera = None
+            print("[RealSense] Camera subscription closed.")
 
+    def capture_loop(self):
         while self.keep_recording:
-            now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            base = os.path.join(OUTPUT_DIR, now)
-            video_file = base + ".mp4"
-            audio_file = base + ".wav"
-            stitched_file = base + "_final.mp4"
-
-            out = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*"mp4v"), 30, (640, 480))
-            start_time = time.time()
-
-            audio_proc = subprocess.Popen([
-                "arecord", "-D", "hw:2,0", "-f", "S16_LE",
-                "-r", "44100", "-c", "2", "-d", str(RECORD_SECONDS),
-                audio_file
-            ])
-
-            while time.time() - start_time < RECORD_SECONDS and self.keep_recording:
-                with streaming_lock:
-                    if self.pipeline:
-                        frames = self.pipeline.wait_for_frames()
-                        color_frame = frames.get_color_frame()
-                        if color_frame:
-                            img = np.asanyarray(color_frame.get_data())
-                            out.write(img)
-
-            out.release()
-            audio_proc.wait()
-
-            if not os.path.exists(video_file) or not os.path.exists(audio_file):
-                print("[WARN] Skipping upload – missing video or audio")
-                continue
-
-            try:
-                subprocess.run([
-                    "ffmpeg", "-y", "-i", video_file, "-i", audio_file,
-                    "-c:v", "copy", "-c:a", "aac", "-strict", "experimental", stitched_file
-                ], check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"[ERROR] ffmpeg stitching failed: {e}")
-                continue
-
-            upload_bucket = DEFAULT_BUCKET
-            if self.motion_check_fn:
+            camera = self.camera
+            packet = camera.get(timeout=1) if camera else None
+            if packet is not None:
+                self.slot.publish(packet.seq, packet.color)
+
+    async def next_frame(self):
+        """Next unseen frame from the slot; repeats the last one if the camera stalls."""
+        latest = self.slot.peek()
+        if latest is None or latest[0] <= self.last_seq:
+            self.stats["stalled_recv"] += 1
+            while True:
                 try:
-                    is_motion = self.motion_check_fn()
-                    now_time = time.time()
-                    if is_motion and now_time - last_motion_upload_time >= MOTION_COOLDOWN:
-                        last_motion_upload_time = now_time
-                        upload_bucket = MOTION_BUCKET
-                        print(f"[MOTION DETECTED] Uploading stitched clip to {upload_bucket}")
-                except Exception as e:
-                    print(f"[WARN] Motion check failed: {e}")
-
-            upload_to_s3(stitched_file, upload_bucket)
-
-            for f in [video_file, audio_file]:
-                if os.path.exists(f):
-                    os.remove(f)
+                    latest = await asyncio.wait_for(self.slot.next_frame(self.last_seq), RECV_STALL_TIMEOUT)
+                    break
+                except asyncio.TimeoutError:
+                    latest = self.slot.peek()
+                    if latest is not None:
+                        self.stats["repeated_frames"] += 1
+                        break
+        self.last_seq = latest[0]
+        self.stats["frames_sent"] += 1
+        return latest[1]
 
     async def recv(self):
         pts, time_base = await self.next_timestamp()
-        with streaming_lock:
-            if not self.pipeline:
-                await asyncio.sleep(0.01)
-                return await self.recv()
-
-            frames = self.pipeline.wait_for_frames()
-            color_frame = frames.get_color_frame()
-            if not color_frame:
-                await asyncio.sleep(0.01)
-                return await self.recv()
-
-            img = np.asanyarray(color_frame.get_data())
-            frame = av.VideoFrame.from_ndarray(img, format="bgr24")
-            frame.pts = pts
-            frame.time_base = time_base
-            return frame
+        img = await self.next_frame()
+
+        frame = av.VideoFrame.from_ndarray(img, format="bgr24")
+        frame.pts = pts
+        frame.time_base = time_base
+        return frame
+
+# --- Motion clip recorder ---
+def start_recorder(motion_check_fn=None):
+    """
+    Start the motion clip recorder on its own camera subscription. It runs
+    whether or not a viewer is connected, so a failed or closed WebRTC
+    session never stops event recording. Replaces a recorder that died.
+    """
+    global recorder
+    with recorder_lock:
+        if recorder is not None and recorder.alive():
+            return recorder
+        if recorder is not None:
+            recorder.stop()
+            recorder.camera.close()
+        camera = get_broker().subscribe("recorder", size=STREAM_SIZE, buffer=8)
+        # Idle footage stays in memory; motion events stream straight to S3
+        recorder = MotionClipRecorder(camera, motion_check_fn, upload_fn=upload_to_s3, bucket=MOTION_BUCKET,
+                                      s3=s3, idle_fps=STANDBY_FPS)
+        recorder.start()
+        return recorder
+
+def recorder_alive():
+    return recorder is not None and recorder.alive()
+
+def stop_recorder():
+    global recorder
+    with recorder_lock:
+        if recorder is not None:
+            recorder.stop()
+            recorder.camera.close()
+            recorder = None
 
 # --- WebRTC streaming ---
 async def stream_offer(video_track):
@@ -215,14 +200,18 @@ async def stream_offer(video_track):
                     await pc.setRemoteDescription(
                         RTCSessionDescription(sdp=data["sdp"], type=data["type"])
                     )
+                    video_track.viewer_connected()
                     break
             await asyncio.sleep(1)
 
     print("[WebRTC] Streaming started.")
+    intercom.set_active(True)  # a viewer may talk back; pick up their messages quickly
     while streaming_event.is_set() and not stop_event.is_set():
         await asyncio.sleep(1)
 
+    intercom.set_active(False)
     print("[WebRTC] Stopping stream...")
+    print(f"[WebRTC] Track stats: {video_track.stats}")
     video_track.stop()
     await pc.close()
     cv2.destroyAllWindows()
@@ -236,13 +225,15 @@ def start_streaming_thread(motion_check_fn=None):
 
     streaming_event.set()
     stop_event.clear()
+    intercom.start()  # started with the stream rather than at import; restarts it if it died
+    start_recorder(motion_check_fn)
 
     def run():
         global video_track_instance
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            video_track_instance = RealSenseVideoTrack(motion_check_fn)
+            video_track_instance = RealSenseVideoTrack()
             loop.run_until_complete(stream_offer(video_track_instance))
         except Exception as e:
             print(f"[ERROR] Streaming thread failed: {e}")
@@ -274,6 +265,3 @@ def stop_streaming():
     print("[awsStream] Stopping stream.")
     stop_event.set()
     streaming_event.clear()
-
-# --- Startup tasks ---
-start_audio_polling_thread()
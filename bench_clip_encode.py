@@ -0,0 +1,116 @@
+import io
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+import cv2
+import numpy as np
+from av_encoder import ClipEncoder
+
+# --- Config ---
+SECONDS = 5
+FPS = 30
+SIZE = (640, 480)
+AUDIO_RATE = 44100
+AUDIO_CHANNELS = 2
+THREAD_COUNTS = [1, 2, 4]
+BITRATES = [500_000, 1_000_000]
+
+
+def synthetic_media(seconds=SECONDS):
+    """Moving gradient + noise so the encoders have real work, plus a tone."""
+    rng = np.random.default_rng(0)
+    w, h = SIZE
+    base = np.tile(np.linspace(0, 255, w, dtype=np.uint8), (h, 1))
+    frames = []
+    for i in range(seconds * FPS):
+        shifted = np.roll(base, i * 4, axis=1)
+        img = np.dstack([shifted, np.roll(shifted, 40, axis=0), 255 - shifted])
+        img = cv2.add(img, rng.integers(0, 12, img.shape, dtype=np.uint8))
+        frames.append(img)
+    t = np.arange(seconds * AUDIO_RATE) / AUDIO_RATE
+    tone = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    pcm = np.repeat(tone, AUDIO_CHANNELS).tobytes()
+    return frames, pcm
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + kids.ru_utime + kids.ru_stime
+
+
+def measure(fn):
+    cpu0, wall0 = cpu_seconds(), time.perf_counter()
+    written = fn()
+    return time.perf_counter() - wall0, cpu_seconds() - cpu0, written
+
+
+def legacy_path(frames, pcm, workdir):
+    """Old recorder: mp4v VideoWriter + WAV on disk, then ffmpeg remux with AAC."""
+    video_file = os.path.join(workdir, "clip.mp4")
+    audio_file = os.path.join(workdir, "clip.wav")
+    final_file = os.path.join(workdir, "clip_final.mp4")
+    out = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*"mp4v"), FPS, SIZE)
+    for img in frames:
+        out.write(img)
+    out.release()
+    with wave.open(audio_file, "wb") as wf:
+        wf.setnchannels(AUDIO_CHANNELS)
+        wf.setsampwidth(2)
+        wf.setframerate(AUDIO_RATE)
+        wf.writeframes(pcm)
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", video_file, "-i", audio_file,
+                    "-c:v", "copy", "-c:a", "aac", final_file], check=True)
+    written = sum(os.path.getsize(f) for f in (video_file, audio_file, final_file))
+    for f in (video_file, audio_file, final_file):
+        os.remove(f)
+    return written
+
+
+def pyav_path(frames, pcm, output, threads, bitrate):
+    chunk = AUDIO_RATE // 10 * AUDIO_CHANNELS * 2
+    t0 = time.time()
+    with ClipEncoder(output, SIZE[0], SIZE[1], fps=FPS, audio_rate=AUDIO_RATE,
+                     audio_channels=AUDIO_CHANNELS, threads=threads, bitrate=bitrate) as encoder:
+        for i, img in enumerate(frames):
+            encoder.add_video(img, t0 + i / FPS)
+        for off in range(0, len(pcm), chunk):
+            encoder.add_audio(pcm[off:off + chunk])
+    if isinstance(output, io.BytesIO):
+        return len(output.getvalue())
+    written = os.path.getsize(output)
+    os.remove(output)
+    return written
+
+
+def main():
+    frames, pcm = synthetic_media()
+    workdir = tempfile.mkdtemp(prefix="bench_clip_")
+    print(f"[INFO] {SECONDS}s clip, {SIZE[0]}x{SIZE[1]} @ {FPS} fps, {AUDIO_CHANNELS}ch {AUDIO_RATE} Hz audio")
+    print(f"{'path':<34} {'wall s':>7} {'cpu s':>7} {'bytes to disk':>14}")
+
+    if shutil.which("ffmpeg"):
+        wall, cpu, written = measure(lambda: legacy_path(frames, pcm, workdir))
+        print(f"{'VideoWriter + wav + ffmpeg':<34} {wall:>7.2f} {cpu:>7.2f} {written:>14,}")
+    else:
+        print("[WARN] ffmpeg not found, skipping the legacy path")
+
+    for threads in THREAD_COUNTS:
+        for bitrate in BITRATES:
+            label = f"PyAV file ({threads} thr, {bitrate // 1000} kb/s)"
+            path = os.path.join(workdir, "pyav.mp4")
+            wall, cpu, written = measure(lambda: pyav_path(frames, pcm, path, threads, bitrate))
+            print(f"{label:<34} {wall:>7.2f} {cpu:>7.2f} {written:>14,}")
+
+    wall, cpu, size = measure(lambda: pyav_path(frames, pcm, io.BytesIO(), 2, BITRATES[-1]))
+    print(f"{'PyAV in-memory (2 thr)':<34} {wall:>7.2f} {cpu:>7.2f} {0:>14,}  ({size:,} bytes in RAM)")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import hal
+
+# --- Config ---
+SECTIONS = ["camera", "face", "recorder", "lock"]   # "lock-fixed" isolates the actuation path
+CAMERA_SECONDS = 5
+FACE_ATTEMPTS = 3
+RECORDER_SECONDS = 8
+LOCK_ROUNDS = 5
+OVERRIDE_ROUNDS = 10
+AUTHORIZED_USER = "kolade"
+PIR_PIN = 22
+RELAY_PIN = 17
+EVENT_BUCKET = "smartdoor-events"
+
+
+def setup(workdir, replay):
+    """Point every device, bucket and spool at the simulation before the door modules are imported."""
+    hal.use_sim(replay, s3_dir=os.path.join(workdir, "s3"))
+    import s3_stream_upload
+    import clip_recorder
+    import upload_queue
+    import access_log
+    import metrics
+    s3_stream_upload.SPOOL_DIR = os.path.join(workdir, "upload_spool")
+    clip_recorder.OUTPUT_DIR = os.path.join(workdir, "streambuffer")
+    upload_queue.upload_queue = upload_queue.UploadQueue(spool_dir=os.path.join(workdir, "upload_queue")).start()
+    access_log.access_log = access_log.AccessLog(
+        pending_file=os.path.join(workdir, "access_log.pending.jsonl")).start()
+    metrics.metrics = metrics.Metrics(path=os.path.join(workdir, "metrics.jsonl"), port=None)
+    hal.s3_client().put_object(Bucket="smartdooraccounts", Key="currentUser/currentUser.json",
+                               Body=json.dumps({"username": AUTHORIZED_USER}))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def bench_camera():
+    """Broker throughput with replay unpaced: the ceiling the rest of the pipeline can see."""
+    from frame_broker import get_broker
+    hal.REPLAY_REALTIME = False
+    try:
+        with get_broker().subscribe("bench", depth=True, buffer=1) as sub:
+            sub.get(timeout=5)
+            start, got = time.perf_counter(), 0
+            while time.perf_counter() - start < CAMERA_SECONDS:
+                if sub.get(timeout=1) is not None:
+                    got += 1
+            elapsed = time.perf_counter() - start
+    finally:
+        hal.REPLAY_REALTIME = True
+    return {"frames_per_second": got / elapsed}
+
+
+def bench_face():
+    from face_rec_aws import face_rec
+    from frame_broker import get_broker
+    broker = get_broker()
+    durations, decisions = [], []
+    frames_before = broker.frames
+    start = time.perf_counter()
+    for _ in range(FACE_ATTEMPTS):
+        t = time.perf_counter()
+        decisions.append(face_rec(show=False))
+        durations.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return {"attempts": len(durations), "authorized": sum(1 for d in decisions if d),
+            "frames_per_second": (broker.frames - frames_before) / elapsed,
+            "attempt_p50_seconds": percentile(durations, 0.5), "attempt_max_seconds": max(durations)}
+
+
+def bench_recorder():
+    """Continuous motion for RECORDER_SECONDS, streamed to the local S3 as one multipart clip."""
+    from clip_recorder import MotionClipRecorder
+    from frame_broker import get_broker
+    s3 = hal.s3_client()
+    before = dict(s3.stats)
+    camera = get_broker().subscribe("recorder", size=(640, 480), buffer=8)
+    recorder = MotionClipRecorder(camera, lambda: True, bucket=EVENT_BUCKET, fps=30, s3=s3)
+    start = time.perf_counter()
+    recorder.start()
+    time.sleep(RECORDER_SECONDS)
+    recorder.stop()
+    deadline = time.time() + 30
+    while recorder.stats["clips_written"] < recorder.stats["events"] and time.time() < deadline:
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    camera.close()
+    return {"events": recorder.stats["events"], "clips": recorder.stats["clips_written"],
+            "frames_encoded_per_second": camera.delivered / elapsed,
+            "bytes_uploaded": s3.stats["bytes_uploaded"] - before["bytes_uploaded"],
+            "seconds_to_clip_in_s3": elapsed - RECORDER_SECONDS}
+
+
+def bench_lock(fixed=False):
+    """
+    PIR edge → recognition scheduler → attempt → relay, timed from the
+    injected edge to the relay write. Also times pushed override changes
+    from the stand-in server to the relay.
+    """
+    import recognition_scheduler
+    from recognition_scheduler import RecognitionScheduler
+    from smartdoor import setup_gpio, open_lock, close_lock
+    from aws_sync import upload_log_and_status
+    from override_channel import OverrideChannel, serve_standin
+    from upload_queue import get_upload_queue
+    from gpio_bus import get_bus
+
+    gpio = hal.gpio()
+    setup_gpio()
+    recognition_scheduler.ATTEMPT_COOLDOWN = 0.5
+    recognition_scheduler.MAX_ATTEMPTS_PER_MINUTE = 60
+    s3_before = dict(hal.s3_client().stats)
+
+    def attempt():
+        if fixed:
+            return True
+        from face_rec_aws import face_rec
+        return face_rec(show=False)
+
+    def on_result(authorized):
+        if authorized:
+            open_lock()
+            upload_log_and_status("Lock OFF (face scan)", False)
+        else:
+            close_lock()
+            upload_log_and_status("Lock ON (face scan)", True)
+
+    def wait_relay(level, since, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            for ts, pin, written in reversed(gpio.writes):
+                if pin == RELAY_PIN and written == level and ts >= since:
+                    return ts
+            time.sleep(0.001)
+        return None
+
+    scheduler = RecognitionScheduler(attempt, on_result=on_result, pir_pin=PIR_PIN, presence=False).start()
+    unlock, decided = [], 0
+    for _ in range(LOCK_ROUNDS):
+        close_lock()
+        scheduler._armed_until = 0.0
+        time.sleep(recognition_scheduler.ATTEMPT_COOLDOWN)
+        edge = time.time()
+        gpio.inject(PIR_PIN, gpio.HIGH)
+        relay = wait_relay(gpio.LOW, edge, timeout=60)
+        gpio.inject(PIR_PIN, gpio.LOW)
+        if relay is not None:
+            decided += 1
+            unlock.append(relay - edge)
+    scheduler.stop()
+
+    server, state = serve_standin(0)
+    base = f"http://127.0.0.1:{server.server_address[1]}/override"
+    channel = OverrideChannel(on_change=lambda value, source: close_lock() if value else open_lock(),
+                              stream_url=base + "/stream", poll_url=base)
+    channel.start()
+    override = []
+    for _ in range(OVERRIDE_ROUNDS):
+        sent = time.time()
+        state.set(not channel.value)
+        relay = wait_relay(gpio.HIGH if state.value else gpio.LOW, sent, timeout=5)
+        if relay is not None:
+            override.append(relay - sent)
+        time.sleep(0.05)
+    channel.stop()
+    server.shutdown()
+
+    queue = get_upload_queue()
+    deadline = time.time() + 30
+    while sum(queue.stats()["pending"].values()) and time.time() < deadline:
+        time.sleep(0.1)
+    return {"unlocks": decided, "unlock_p50_ms": 1000 * percentile(unlock, 0.5),
+            "unlock_max_ms": 1000 * max(unlock, default=0.0),
+            "override_p50_ms": 1000 * percentile(override, 0.5),
+            "override_max_ms": 1000 * max(override, default=0.0),
+            "relay_events": len(get_bus().history(RELAY_PIN)),
+            "bytes_uploaded": hal.s3_client().stats["bytes_uploaded"] - s3_before["bytes_uploaded"]}
+
+
+def main():
+    # python bench_door.py [camera|face|recorder|lock|lock-fixed ...] [replay.npz|replay.bag] [--json out.json]
+    args = sys.argv[1:]
+    out = None
+    if "--json" in args:
+        i = args.index("--json")
+        out = args[i + 1]
+        del args[i:i + 2]
+    replay = next((a for a in args if a.endswith((".npz", ".bag"))), None)
+    sections = [a for a in args if a != replay] or SECTIONS
+
+    workdir = tempfile.mkdtemp(prefix="bench_door_")
+    setup(workdir, os.path.abspath(replay) if replay else None)
+    print(f"[INFO] Replay: {replay or 'synthetic scene'}; local S3 + spools under {workdir}")
+    benches = {"camera": bench_camera, "face": bench_face, "recorder": bench_recorder,
+               "lock": bench_lock, "lock-fixed": lambda: bench_lock(fixed=True)}
+    results = {}
+    try:
+        for name in sections:
+            print(f"[INFO] Running {name}...")
+            try:
+                results[name] = benches[name]()
+            except ImportError as e:
+                results[name] = {"skipped": f"missing dependency: {e.name}"}
+    finally:
+        from metrics import get_metrics
+        results["stages"] = get_metrics().snapshot()["stages"]
+        results["s3"] = dict(hal.s3_client().stats)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name in sections:
+        print(f"\n{name}")
+        for key, value in results[name].items():
+            print(f"  {key:28s} {value:.2f}" if isinstance(value, float) else f"  {key:28s} {value}")
+    print("\nstages (ms)")
+    for stage, s in sorted(results["stages"].items()):
+        print(f"  {stage:28s} n={s['count']:<6d} p50={s['p50_ms']:>8.2f} p95={s['p95_ms']:>8.2f}")
+    print(f"\ns3: {results['s3']['objects_written']} objects, {results['s3']['bytes_uploaded']} bytes uploaded")
+    if out:
+        with open(out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import sys
+import time
+import cv2
+from imutils import paths
+from face_detect import detect_faces, box_iou, ROI_MARGIN
+
+# --- Config ---
+DATASET_DIR = "dataset"
+SCALES = [1.0, 0.5, 0.33, 0.25, 0.2]
+MATCH_IOU = 0.5
+
+
+def padded(box, shape, margin=ROI_MARGIN):
+    """Stand-in for the face-mesh ROI: the reference box grown by the mesh margin."""
+    top, right, bottom, left = box
+    h, w = shape[:2]
+    pad_y, pad_x = (bottom - top) * margin, (right - left) * margin
+    return (max(0, int(top - pad_y)), min(w, int(right + pad_x)),
+            min(h, int(bottom + pad_y)), max(0, int(left - pad_x)))
+
+
+def run(images, scale, use_roi, references):
+    found = total = 0
+    elapsed = 0.0
+    for rgb, ref in zip(images, references):
+        rois = [padded(b, rgb.shape) for b in ref] if use_roi else [None]
+        start = time.perf_counter()
+        boxes = [b for roi in rois for b in detect_faces(rgb, scale=scale, roi=roi)]
+        elapsed += time.perf_counter() - start
+        total += len(ref)
+        found += sum(1 for r in ref if any(box_iou(r, b) >= MATCH_IOU for b in boxes))
+    recall = found / total if total else 0.0
+    return recall, elapsed / len(images) * 1000.0
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else DATASET_DIR
+    images = [cv2.cvtColor(cv2.imread(p), cv2.COLOR_BGR2RGB) for p in paths.list_images(root)]
+    if not images:
+        print(f"[ERROR] No images under {root}")
+        return
+
+    # Full-resolution detections are the reference the other modes are scored against
+    references = [detect_faces(rgb, scale=1.0) for rgb in images]
+    print(f"[INFO] {len(images)} images, {sum(map(len, references))} reference faces")
+    print(f"{'scale':>6} {'roi':>4} {'recall':>7} {'ms/frame':>9}")
+    for scale in SCALES:
+        for use_roi in (False, True):
+            recall, ms = run(images, scale, use_roi, references)
+            print(f"{scale:>6.2f} {'yes' if use_roi else 'no':>4} {recall:>7.2%} {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
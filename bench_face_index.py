@@ -0,0 +1,59 @@
+import time
+import numpy as np
+from face_index import FaceIndex, DEFAULT_TOLERANCE, ENCODING_DIM
+
+# --- Config ---
+ENROLLED_SIZES = [100, 1000, 5000]
+FACES_PER_FRAME = [1, 4]
+ENCODINGS_PER_USER = 10
+REPEATS = 200
+
+
+def list_scan(known_encodings, known_names, encs, tolerance=DEFAULT_TOLERANCE):
+    """The per-face scan recognize_faces used before the index (same math as
+    face_recognition.compare_faces + face_distance, without needing dlib)."""
+    names = []
+    for enc in encs:
+        matches = list(np.linalg.norm(np.array(known_encodings) - enc, axis=1) <= tolerance)
+        name = "Unknown"
+        distances = np.linalg.norm(np.array(known_encodings) - enc, axis=1)
+        if len(distances) > 0:
+            best_match = np.argmin(distances)
+            if matches[best_match]:
+                name = known_names[best_match]
+        names.append(name)
+    return names
+
+
+def timed(fn, repeats=REPEATS):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'known':>6} {'faces':>5} {'list scan ms':>13} {'index ms':>9} {'speedup':>8}")
+    for n in ENROLLED_SIZES:
+        # Cluster encodings per user like real enrollments do
+        users = n // ENCODINGS_PER_USER
+        centers = rng.normal(0, 0.1, (users, ENCODING_DIM))
+        known = [centers[i // ENCODINGS_PER_USER] + rng.normal(0, 0.02, ENCODING_DIM) for i in range(n)]
+        names = [f"user{i // ENCODINGS_PER_USER}" for i in range(n)]
+        index = FaceIndex(known, names)
+
+        for m in FACES_PER_FRAME:
+            queries = [centers[rng.integers(users)] + rng.normal(0, 0.02, ENCODING_DIM) for _ in range(m)]
+            baseline = list_scan(known, names, queries)
+            indexed = [name for name, _ in index.query(queries)]
+            assert baseline == indexed, "index disagrees with list scan"
+
+            t_list = timed(lambda: list_scan(known, names, queries))
+            t_index = timed(lambda: index.query(queries))
+            print(f"{n:>6} {m:>5} {t_list:>13.3f} {t_index:>9.3f} {t_list / t_index:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
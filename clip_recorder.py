@@ -0,0 +1,306 @@
+import os
+import queue
+import subprocess
+import threading
+import time
+import datetime
+from collections import deque
+import cv2
+import numpy as np
+from av_encoder import ClipEncoder
+from s3_stream_upload import MultipartUploadSink, resume_pending
+
+# --- Config ---
+PRE_ROLL_SECONDS = 5
+POST_ROLL_SECONDS = 10
+MAX_EVENT_SECONDS = 60      # motion keeps extending an event up to this length
+MOTION_COOLDOWN = 30        # seconds between the starts of two events
+JPEG_QUALITY = 80
+AUDIO_DEVICE = "hw:2,0"
+AUDIO_RATE = 44100
+AUDIO_CHANNELS = 2
+AUDIO_CHUNK_SECONDS = 0.1
+OUTPUT_DIR = "/home/pi/streambuffer"
+RESUME_RETRY_SECONDS = 30   # first wait before retrying uploads a dropped connection left in the spool
+RESUME_RETRY_MAX = 600
+
+
+class EncodedRing:
+    """Time-bounded ring of (timestamp, bytes) holding the last `seconds` of media."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._items = deque()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+    def append(self, timestamp, data):
+        with self._lock:
+            self._items.append((timestamp, data))
+            self.nbytes += len(data)
+            while self._items and self._items[0][0] < timestamp - self.seconds:
+                self.nbytes -= len(self._items.popleft()[1])
+
+    def since(self, timestamp):
+        with self._lock:
+            return [item for item in self._items if item[0] >= timestamp]
+
+
+class MotionClipRecorder:
+    """
+    Keeps the last PRE_ROLL_SECONDS of video (JPEG-encoded) and audio in
+    memory. Nothing touches disk or the network until trigger() is called
+    (directly, or when motion_check_fn reports motion); then pre-roll plus
+    everything up to POST_ROLL_SECONDS after the last motion is encoded as
+    one clip while the event is still running. Given an S3 client the clip
+    is streamed to `bucket` as a multipart upload; otherwise (or when the
+    upload cannot be started, e.g. offline) it is written to OUTPUT_DIR
+    and handed to upload_fn(path, bucket). If the connection drops mid-clip,
+    the rest of the clip is spooled by the sink and its upload is resumed
+    in the background.
+
+    With idle_fps the camera subscription is held at that rate between
+    events (so the frame broker can drop to its standby profile) and
+    raised to full rate while an event is being recorded; the pre-roll is
+    then at idle_fps.
+    """
+
+    def __init__(self, camera, motion_check_fn=None, upload_fn=None, bucket=None, fps=30, s3=None, idle_fps=None):
+        self.camera = camera
+        self.motion_check_fn = motion_check_fn
+        self.upload_fn = upload_fn
+        self.bucket = bucket
+        self.s3 = s3
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.video_ring = EncodedRing(PRE_ROLL_SECONDS)
+        self.audio_ring = EncodedRing(PRE_ROLL_SECONDS)
+        self.event = None               # {"start", "end", "video", "audio", "with_audio"} while recording
+        self._event_lock = threading.Lock()
+        self._last_event_start = 0
+        self._clips = queue.Queue()
+        self._running = False
+        self._audio_proc = None
+        self._threads = []
+        self._resuming = False
+        self._resume_lock = threading.Lock()
+        self.stats = {"events": 0, "clips_written": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        self._running = True
+        if self.idle_fps:
+            self.camera.set_max_fps(self.idle_fps)
+        if self.s3 is not None:
+            # Finish clips a crash or reboot cut off mid-upload
+            threading.Thread(target=resume_pending, args=(self.s3,), daemon=True).start()
+        self._threads = [threading.Thread(target=target, daemon=True)
+                         for target in (self._video_loop, self._writer_loop, self._audio_loop)]
+        for t in self._threads:
+            t.start()
+        print("[RECORDER] Ring buffer recorder started "
+              f"(pre-roll {PRE_ROLL_SECONDS}s, post-roll {POST_ROLL_SECONDS}s).")
+
+    def alive(self):
+        # The audio thread may end on its own (no microphone); video and writer may not
+        return self._running and all(t.is_alive() for t in self._threads[:2])
+
+    def stop(self):
+        self._running = False
+        if self._audio_proc:
+            self._audio_proc.terminate()
+        self._finish_event(force=True)
+
+    # --- Triggering ---
+    def trigger(self):
+        """Start an event clip, or extend the one in progress."""
+        now = time.time()
+        with self._event_lock:
+            if self.event is not None:
+                self.event["end"] = min(now + POST_ROLL_SECONDS, self.event["start"] + MAX_EVENT_SECONDS)
+                return
+            if now - self._last_event_start < MOTION_COOLDOWN:
+                return
+            self._last_event_start = now
+            start = now - PRE_ROLL_SECONDS
+            audio = self.audio_ring.since(start)
+            self.event = {"start": start, "end": now + POST_ROLL_SECONDS,
+                          "video": self.video_ring.since(start), "audio": audio, "with_audio": bool(audio)}
+            self.stats["events"] += 1
+            self._clips.put(("open", self.event))
+        if self.idle_fps:
+            self.camera.set_max_fps(None)
+        print("[MOTION DETECTED] Recording event clip with pre-roll.")
+
+    def _add_to_event(self, kind, timestamp, data):
+        with self._event_lock:
+            if self.event is not None:
+                self._clips.put((kind, timestamp, data))
+
+    def _finish_event(self, force=False):
+        with self._event_lock:
+            if self.event is None or (not force and time.time() < self.event["end"]):
+                return
+            self.event = None
+        self._clips.put(("close",))
+        if self.idle_fps:
+            self.camera.set_max_fps(self.idle_fps)
+
+    # --- Capture threads ---
+    def _video_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+        while self._running:
+            packet = self.camera.get(timeout=1)
+            if packet is None:
+                continue
+            ok, jpg = cv2.imencode(".jpg", packet.color, params)
+            if not ok:
+                continue
+            data = jpg.tobytes()
+            self.video_ring.append(packet.timestamp, data)
+            self._add_to_event("video", packet.timestamp, data)
+
+            if self.motion_check_fn:
+                try:
+                    if self.motion_check_fn():
+                        self.trigger()
+                except Exception as e:
+                    print(f"[WARN] Motion check failed: {e}")
+            self._finish_event()
+
+    def _audio_loop(self):
+        chunk_bytes = int(AUDIO_RATE * AUDIO_CHUNK_SECONDS) * AUDIO_CHANNELS * 2
+        try:
+            self._audio_proc = subprocess.Popen([
+                "arecord", "-q", "-D", AUDIO_DEVICE, "-f", "S16_LE", "-t", "raw",
+                "-r", str(AUDIO_RATE), "-c", str(AUDIO_CHANNELS)
+            ], stdout=subprocess.PIPE)
+        except OSError as e:
+            print(f"[WARN] Audio capture unavailable, recording video only: {e}")
+            return
+        while self._running:
+            data = self._audio_proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            now = time.time()
+            self.audio_ring.append(now, data)
+            self._add_to_event("audio", now, data)
+
+    # --- Clip writing (only on events) ---
+    def _writer_loop(self):
+        """
+        Encodes the event in progress as its frames arrive. With an S3
+        client the fragmented MP4 goes straight into a multipart upload, so
+        the clip is in the cloud one part after the event ends; otherwise it
+        is written to OUTPUT_DIR and handed to upload_fn when closed.
+        """
+        clip = None
+        while self._running or not self._clips.empty():
+            try:
+                item = self._clips.get(timeout=1)
+            except queue.Empty:
+                continue
+            kind = item[0]
+            try:
+                if kind == "open":
+                    clip = {"event": item[1], "encoder": None, "sink": None, "path": None, "audio": []}
+                    for ts, data in item[1]["video"]:
+                        self._clip_video(clip, ts, data)
+                    for ts, data in item[1]["audio"]:
+                        self._clip_audio(clip, ts, data)
+                elif clip is None:
+                    continue
+                elif kind == "video":
+                    self._clip_video(clip, item[1], item[2])
+                elif kind == "audio":
+                    self._clip_audio(clip, item[1], item[2])
+                elif kind == "close":
+                    self._close_clip(clip)
+                    clip = None
+            except Exception as e:
+                print(f"[ERROR] Failed to write event clip: {e}")
+                if clip is not None:
+                    self._abandon_clip(clip)
+                clip = None
+        if clip is not None:
+            self._close_clip(clip)
+
+    def _open_clip(self, clip, first_frame, timestamp):
+        event = clip["event"]
+        stamp = datetime.datetime.fromtimestamp(event["start"]).strftime("%Y-%m-%d_%H-%M-%S")
+        filename = stamp + "_final.mp4"
+        output = None
+        if self.s3 is not None:
+            try:
+                clip["sink"] = output = MultipartUploadSink(self.s3, self.bucket, filename)
+            except Exception as e:
+                # Offline: record to disk and let upload_fn spool it for later
+                print(f"[RECORDER] Multipart upload unavailable, recording {filename} locally: {e}")
+        if output is None:
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            clip["path"] = output = os.path.join(OUTPUT_DIR, filename)
+        h, w = first_frame.shape[:2]
+        # The clip's clock starts at the first video frame, not at buffered pre-roll audio
+        clip["encoder"] = ClipEncoder(output, w, h, fps=self.fps, audio_rate=AUDIO_RATE, t0=timestamp,
+                                      audio_channels=AUDIO_CHANNELS, with_audio=event["with_audio"])
+
+    def _clip_video(self, clip, timestamp, data):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if clip["encoder"] is None:
+            self._open_clip(clip, img, timestamp)
+            clip["first_ts"] = timestamp
+            # Audio that arrived before the first frame, minus anything older than it
+            for ts, pcm in clip["audio"]:
+                if ts >= timestamp:
+                    clip["encoder"].add_audio(pcm, ts)
+            clip["audio"] = None
+        clip["encoder"].add_video(img, timestamp)
+
+    def _clip_audio(self, clip, timestamp, data):
+        if clip["encoder"] is None:
+            clip["audio"].append((timestamp, data))
+        elif timestamp >= clip["first_ts"]:
+            clip["encoder"].add_audio(data, timestamp)
+
+    def _close_clip(self, clip):
+        if clip["encoder"] is None:
+            return
+        clip["encoder"].close()
+        if clip["sink"] is not None:
+            clip["sink"].close()
+            if clip["sink"].failed:
+                self._schedule_resume()
+        self.stats["clips_written"] += 1
+        if clip["path"] and self.upload_fn:
+            self.upload_fn(clip["path"], self.bucket)
+
+    def _abandon_clip(self, clip):
+        # The sink's uploader thread waits for a close that would otherwise never come
+        sink = clip["sink"]
+        if sink is not None and not sink.closed:
+            try:
+                sink.close()    # completes with what was written, or leaves the parts for resume_pending
+            except Exception as e:
+                print(f"[ERROR] Failed to close upload of {sink.key}: {e}")
+            if sink.failed:
+                self._schedule_resume()
+
+    # --- Spooled uploads ---
+    def _schedule_resume(self):
+        with self._resume_lock:
+            if self._resuming:
+                return
+            self._resuming = True
+        threading.Thread(target=self._resume_loop, daemon=True).start()
+
+    def _resume_loop(self):
+        # Parts a dropped connection left in the spool are retried here rather than at the next start
+        delay = RESUME_RETRY_SECONDS
+        while True:
+            time.sleep(delay)
+            pending = resume_pending(self.s3)
+            with self._resume_lock:
+                if pending == 0 or not self._running:
+                    self._resuming = False
+                    return
+            delay = min(delay * 2, RESUME_RETRY_MAX)
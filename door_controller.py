@@ -0,0 +1,231 @@
+import asyncio
+import json
+import signal
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from metrics import get_metrics
+
+# --- Config ---
+EXECUTOR_WORKERS = 4
+RESTART_BACKOFF = 1             # seconds before the first restart, doubled per crash
+RESTART_BACKOFF_MAX = 60
+HEALTH_INTERVAL = 2             # seconds between liveness checks of thread-based components
+SHUTDOWN_GRACE = 5              # seconds tasks get to finish before they are cancelled
+REPORT_FILE = "/home/pi/smartdoor/controller_report.json"
+
+
+class TaskSpec:
+    """Book-keeping for one supervised task."""
+
+    def __init__(self, name, factory, restart):
+        self.name = name
+        self.factory = factory
+        self.restart = restart      # "on_crash", "always" or "never"
+        self.task = None
+        self.state = "pending"
+        self.starts = 0
+        self.crashes = 0
+        self.last_error = None
+        self.started_at = None
+
+    def report(self):
+        return {"state": self.state, "starts": self.starts, "crashes": self.crashes,
+                "last_error": self.last_error,
+                "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else 0.0}
+
+
+class DoorController:
+    """
+    One asyncio event loop that owns every long-running part of the door.
+
+    Each part runs as a supervised task. A crash is logged with its
+    traceback and the task is restarted with exponential backoff, instead
+    of one thread dying silently while the rest run on stale state.
+    Blocking work (GPIO, S3, model inference) goes through run_blocking(),
+    which uses a bounded executor and records per-operation latency.
+    Existing thread-based components are supervised through
+    supervise_component(), which restarts them when their alive() check
+    fails. On shutdown, on_shutdown hooks run first so tasks can finish.
+    Tasks still running after SHUTDOWN_GRACE are cancelled, and cleanups
+    run last in reverse order. SIGUSR1 (or report()) dumps task states and
+    latencies.
+    """
+
+    def __init__(self, workers=EXECUTOR_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="door-io")
+        self.loop = None
+        self._specs = {}
+        self._shutdown_hooks = []
+        self._cleanups = []
+        self._queues = []
+        self._sources = {}
+        self._stopping = None
+        self.latency = {}           # op -> {"count", "total", "max", "last"}
+
+    # --- Supervision ---
+    def supervise(self, name, factory, restart="on_crash"):
+        """Run `await factory()` as a task named `name`, restarting it per `restart`."""
+        spec = TaskSpec(name, factory, restart)
+        self._specs[name] = spec
+        if self.loop is not None:
+            spec.task = self.loop.create_task(self._supervisor(spec), name=name)
+        return spec
+
+    async def _supervisor(self, spec):
+        backoff = RESTART_BACKOFF
+        while not self._stopping.is_set():
+            spec.state = "running"
+            spec.starts += 1
+            spec.started_at = time.time()
+            try:
+                await spec.factory()
+                spec.state = "finished"
+                if spec.restart != "always":
+                    return
+                backoff = RESTART_BACKOFF
+            except asyncio.CancelledError:
+                spec.state = "cancelled"
+                raise
+            except Exception as e:
+                spec.crashes += 1
+                spec.state = "crashed"
+                spec.last_error = f"{type(e).__name__}: {e}"
+                print(f"[CONTROLLER] Task '{spec.name}' crashed:\n{traceback.format_exc()}")
+                if spec.restart == "never":
+                    return
+            print(f"[CONTROLLER] Restarting '{spec.name}' in {backoff}s.")
+            spec.state = "restarting"
+            try:
+                await asyncio.wait_for(self._stopping.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    def supervise_component(self, name, start, alive, stop=None):
+        """Supervise a thread-based component: start() it, then restart it whenever alive() goes False."""
+
+        async def run():
+            await self.run_blocking(f"{name}.start", start)
+            try:
+                while not self._stopping.is_set():
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), HEALTH_INTERVAL)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                    if not alive():
+                        raise RuntimeError(f"{name} is no longer running")
+            finally:
+                if stop is not None and self._stopping.is_set():
+                    await self.run_blocking(f"{name}.stop", stop)
+
+        return self.supervise(name, run)
+
+    def on_shutdown(self, fn):
+        """fn() runs (in the executor) at the start of shutdown, before tasks are cancelled."""
+        self._shutdown_hooks.append(fn)
+
+    def add_cleanup(self, fn):
+        """fn() runs after all tasks have stopped; cleanups run in reverse order."""
+        self._cleanups.append(fn)
+
+    # --- Blocking work ---
+    async def run_blocking(self, op, fn, *args):
+        start = time.perf_counter()
+        try:
+            return await self.loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            stat = self.latency.setdefault(op, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+            stat["count"] += 1
+            stat["total"] += elapsed
+            stat["max"] = max(stat["max"], elapsed)
+            stat["last"] = elapsed
+            get_metrics().observe(f"controller_{op}", elapsed)
+
+    @property
+    def stopping(self):
+        return self._stopping is not None and self._stopping.is_set()
+
+    def threadsafe_queue(self):
+        """
+        An asyncio.Queue plus a put() that any thread may call (for callback-style
+        components). Consumers get None once shutdown starts.
+        """
+        q = asyncio.Queue()
+        self._queues.append(q)
+
+        def put(item):
+            self.loop.call_soon_threadsafe(q.put_nowait, item)
+
+        return q, put
+
+    # --- Reporting ---
+    def add_report_source(self, name, fn):
+        """Include fn() (a component's stats dict) in every report."""
+        self._sources[name] = fn
+
+    def report(self, path=REPORT_FILE):
+        data = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "tasks": {name: spec.report() for name, spec in self._specs.items()},
+                "latency_ms": {op: {"count": s["count"], "avg": round(1000 * s["total"] / s["count"], 2),
+                                    "max": round(1000 * s["max"], 2), "last": round(1000 * s["last"], 2)}
+                               for op, s in self.latency.items() if s["count"]},
+                "components": {}}
+        for name, fn in self._sources.items():
+            try:
+                data["components"][name] = fn()
+            except Exception as e:
+                data["components"][name] = f"unavailable: {e}"
+        print(f"[CONTROLLER] Report:\n{json.dumps(data, indent=2, default=str)}")
+        if path:
+            try:
+                with open(path, "w") as f:
+                    json.dump(data, f, indent=2, default=str)
+            except OSError as e:
+                print(f"[CONTROLLER] Could not write report: {e}")
+        return data
+
+    # --- Lifecycle ---
+    def stop(self):
+        if self._stopping is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self._stopping.set)
+        self.loop.add_signal_handler(signal.SIGUSR1, self.report)
+        for spec in self._specs.values():
+            spec.task = self.loop.create_task(self._supervisor(spec), name=spec.name)
+        print(f"[CONTROLLER] Running {len(self._specs)} supervised task(s).")
+
+        await self._stopping.wait()
+        print("[CONTROLLER] Shutting down...")
+        for hook in self._shutdown_hooks:
+            try:
+                await self.run_blocking("shutdown_hook", hook)
+            except Exception as e:
+                print(f"[CONTROLLER] Shutdown hook failed: {e}")
+        for q in self._queues:
+            q.put_nowait(None)
+        tasks = [s.task for s in self._specs.values() if s.task and not s.task.done()]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_GRACE)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for fn in reversed(self._cleanups):
+            try:
+                await self.run_blocking("cleanup", fn)
+            except Exception as e:
+                print(f"[CONTROLLER] Cleanup failed: {e}")
+        self.report()
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        finally:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,228 @@
+import glob
+import hashlib
+import os
+import pickle
+import struct
+import sys
+import numpy as np
+
+# --- Config ---
+STORE_FILE = "encodings.sdenc"
+NAMES_SUFFIX = ".names"
+ENCODING_DIM = 128
+LEGACY_COMBINED = "encodings.pickle"
+LEGACY_PER_USER_GLOB = "encodings_*.pickle"
+
+# Header: magic, version, row width, committed row count, SHA-1 of the
+# committed names (all zero in stores written before it was added), padded
+# to 64 bytes. Count and digest are written together as the commit point.
+MAGIC = b"SDENC\x00"
+VERSION = 1
+HEADER_FORMAT = "<6sHIQ20s"
+HEADER_SIZE = 64
+COUNT_OFFSET = struct.calcsize("<6sHI")
+COMMIT_FORMAT = "<Q20s"
+NO_DIGEST = bytes(20)
+ROW_BYTES = ENCODING_DIM * 4
+
+
+class EncodingStore:
+    """
+    Binary face-encoding store: a fixed header followed by fixed-width
+    128-d float32 rows, plus a names table (one name per row) next to it.
+
+    Rows are memory-mapped on load, and adding a person appends rows and
+    names before bumping the header count, so a crash mid-append leaves
+    the previously committed rows intact. Rewrites (remove/replace) swap
+    in the row file, then the names table; the header carries a digest of
+    the names, so a crash between the two is finished on the next read
+    rather than pairing rows with the wrong names.
+
+    A new store next to old encodings*.pickle files imports them as it is
+    created; readers stop looking at the pickles once the store exists.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.names_path = path + NAMES_SUFFIX
+        if not os.path.exists(self.path):
+            self._write_all(np.empty((0, ENCODING_DIM), dtype=np.float32), [])
+            legacy = legacy_pickles(os.path.dirname(path))
+            if legacy:
+                print(f"[INFO] New encoding store {path}: importing {len(legacy)} legacy pickle(s)")
+                import_pickles(self, legacy)
+
+    # --- Header ---
+    def _read_header(self):
+        """(committed row count, names digest)."""
+        with open(self.path, "rb") as f:
+            magic, version, dim, count, digest = struct.unpack(HEADER_FORMAT,
+                                                               f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC or version != VERSION or dim != ENCODING_DIM:
+            raise ValueError(f"[ERROR] '{self.path}' is not a v{VERSION} encoding store.")
+        return count, digest
+
+    @property
+    def count(self):
+        return self._read_header()[0]
+
+    def mtime(self):
+        """Modification time of the store, used by callers to hot-reload."""
+        return os.path.getmtime(self.path)
+
+    # --- Reading ---
+    def load(self):
+        """Return (rows, names): a read-only memmap of committed rows and their names."""
+        count, digest = self._read_header()
+        names = self._read_names(count, digest)
+        if count == 0:
+            return np.empty((0, ENCODING_DIM), dtype=np.float32), names
+        rows = np.memmap(self.path, dtype=np.float32, mode="r",
+                         offset=HEADER_SIZE, shape=(count, ENCODING_DIM))
+        return rows, names
+
+    def _read_names(self, count, digest):
+        # Lines past the committed count are leftovers of an interrupted append
+        names = _read_lines(self.names_path)[:count]
+        if digest == NO_DIGEST or names_digest(names) == digest:
+            return names
+        # A rewrite stopped after the row file was swapped in: its names are still in the .tmp file
+        pending = _read_lines(self.names_path + ".tmp")[:count]
+        if names_digest(pending) == digest:
+            print(f"[WARN] Finishing an interrupted rewrite of {self.names_path}")
+            os.replace(self.names_path + ".tmp", self.names_path)
+            return pending
+        raise ValueError(f"[ERROR] '{self.names_path}' does not match the rows in '{self.path}'.")
+
+    def people(self):
+        return sorted(set(self.load()[1]))
+
+    # --- Writing ---
+    def append(self, name, encodings):
+        """Append one person's encodings without rewriting existing rows."""
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if len(rows) == 0:
+            return 0
+
+        count, digest = self._read_header()
+        names = self._read_names(count, digest)
+        if self._names_line_count() != count:
+            self._rewrite_names(names)
+
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + count * ROW_BYTES)
+            f.write(rows.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self.names_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{name}\n" for _ in range(len(rows))))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Commit point: only now do readers see the new rows
+        with open(self.path, "r+b") as f:
+            f.seek(COUNT_OFFSET)
+            f.write(struct.pack(COMMIT_FORMAT, count + len(rows), names_digest(names + [name] * len(rows))))
+            f.flush()
+            os.fsync(f.fileno())
+        return len(rows)
+
+    def remove(self, name):
+        """Drop every row belonging to `name` (rewrites the store)."""
+        rows, names = self.load()
+        keep = [i for i, n in enumerate(names) if n != name]
+        if len(keep) == len(names):
+            return 0
+        kept_rows = np.array(rows[keep], dtype=np.float32)
+        del rows
+        self._write_all(kept_rows, [names[i] for i in keep])
+        return len(names) - len(keep)
+
+    def replace(self, name, encodings):
+        """Re-enroll `name`. New people are appended; existing ones are swapped out."""
+        self.remove(name)
+        return self.append(name, encodings)
+
+    def _names_line_count(self):
+        if not os.path.exists(self.names_path):
+            return 0
+        with open(self.names_path, "rb") as f:
+            return sum(1 for _ in f)
+
+    def _write_names_tmp(self, names):
+        tmp = self.names_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(f"{n}\n" for n in names))
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp
+
+    def _rewrite_names(self, names):
+        os.replace(self._write_names_tmp(names), self.names_path)
+
+    def _write_all(self, rows, names):
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, ENCODING_DIM, len(rows),
+                             names_digest(names)).ljust(HEADER_SIZE, b"\x00")
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(np.ascontiguousarray(rows, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        names_tmp = self._write_names_tmp(names)
+        # Rows first: until the names follow, _read_names finds them in names_tmp by digest
+        os.replace(tmp, self.path)
+        os.replace(names_tmp, self.names_path)
+
+
+def names_digest(names):
+    return hashlib.sha1("".join(f"{n}\n" for n in names).encode("utf-8")).digest()
+
+
+def _read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def legacy_pickles(directory=""):
+    """The old pickled encoding files in `directory` that exist, combined file first."""
+    paths = [os.path.join(directory, LEGACY_COMBINED)]
+    paths += sorted(glob.glob(os.path.join(directory, LEGACY_PER_USER_GLOB)))
+    return [p for p in paths if os.path.exists(p)]
+
+
+def import_pickles(store, paths=None):
+    """
+    Import the old pickled {"encodings", "names"} files (done automatically
+    when a store is created). Per-user files win over the combined
+    encodings.pickle for the same name.
+    """
+    if paths is None:
+        paths = legacy_pickles()
+    people = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            data = pickle.loads(f.read())
+        from_file = {}
+        for enc, name in zip(data["encodings"], data["names"]):
+            from_file.setdefault(name, []).append(enc)
+        people.update(from_file)
+        print(f"[INFO] Read {len(data['encodings'])} encodings from {path}")
+
+    for name, encodings in people.items():
+        store.replace(name, encodings)
+        print(f"[INFO] Imported {len(encodings)} encodings for {name}")
+    return people
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else STORE_FILE
+    store = EncodingStore(target)
+    import_pickles(store)
+    print(f"[INFO] ✅ {store.count} encodings in {target}")
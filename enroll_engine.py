@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+import face_recognition
+from imutils import paths
+from encoding_store import EncodingStore, STORE_FILE
+
+# --- Config ---
+WORKERS = os.cpu_count() or 4
+FLUSH_EVERY = 16  # images encoded between store appends
+HASH_SUFFIX = ".hashes"
+
+
+# --- Content-hash manifest ---
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def manifest_path(store):
+    return store.path + HASH_SUFFIX
+
+
+def load_manifest(store):
+    """{sha1 of image bytes: name} for every image already encoded into the store."""
+    path = manifest_path(store)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[WARN] Could not read {path}, re-encoding everything: {e}")
+        return {}
+
+
+def save_manifest(store, manifest):
+    path = manifest_path(store)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def remove_person(store, name):
+    """Forget `name` entirely."""
+    store.remove(name)
+    manifest = {h: n for h, n in load_manifest(store).items() if n != name}
+    save_manifest(store, manifest)
+
+
+# --- Worker (runs in a separate process) ---
+def encode_image(job):
+    path, name, digest = job
+    image = cv2.imread(path)
+    if image is None:
+        return path, name, digest, None
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    boxes = face_recognition.face_locations(rgb, model="hog")
+    encodings = face_recognition.face_encodings(rgb, boxes)
+    return path, name, digest, [np.asarray(e, dtype=np.float32) for e in encodings]
+
+
+def _encode_all(jobs, workers):
+    """Run encode_image over (path, name, digest) jobs; yields results as they finish."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(encode_image, job) for job in jobs]
+        for i, future in enumerate(as_completed(futures)):
+            path, name, digest, encodings = future.result()
+            print(f"[INFO] processed image {i + 1}/{len(jobs)}: {path}")
+            if encodings is None:
+                print(f"[WARN] Could not read {path}")
+                continue
+            yield path, name, digest, encodings
+
+
+# --- Engine ---
+def reenroll_person(name, images, store=None, workers=WORKERS):
+    """
+    Replace `name`'s encodings with those found in `images` (paths). Every
+    image is encoded before the store is touched, so if none of them shows
+    a face the person keeps their old enrollment. Returns the number of
+    encodings saved (0 = nothing changed).
+    """
+    store = store or EncodingStore(STORE_FILE)
+    jobs = [(path, name, file_hash(path)) for path in images]
+    encodings, digests = [], []
+    for _, _, digest, found in _encode_all(jobs, workers):
+        encodings.extend(found)
+        digests.append(digest)
+    if not encodings:
+        return 0
+
+    store.replace(name, encodings)
+    manifest = {h: n for h, n in load_manifest(store).items() if n != name}
+    manifest.update((digest, name) for digest in digests)
+    save_manifest(store, manifest)
+    return len(encodings)
+
+
+def enroll_images(images, store=None, workers=WORKERS):
+    """
+    Encode (path, name) pairs across a process pool and stream the results
+    into the encoding store. Images whose content hash is already in the
+    manifest are skipped, so re-running over the same tree only encodes
+    new files. Returns the number of encodings added.
+    """
+    store = store or EncodingStore(STORE_FILE)
+    manifest = load_manifest(store)
+
+    jobs = []
+    for path, name in images:
+        digest = file_hash(path)
+        if digest not in manifest:
+            jobs.append((path, name, digest))
+    print(f"[INFO] {len(images) - len(jobs)} images already encoded, {len(jobs)} new.")
+    if not jobs:
+        return 0
+
+    added = 0
+    batch = {}
+    done = []
+
+    def flush():
+        nonlocal added
+        for person, encodings in batch.items():
+            added += store.append(person, encodings)
+        for digest, person in done:
+            manifest[digest] = person
+        save_manifest(store, manifest)
+        batch.clear()
+        done.clear()
+
+    for path, name, digest, encodings in _encode_all(jobs, workers):
+        if encodings:
+            batch.setdefault(name, []).extend(encodings)
+        # Faceless images are recorded too, so they are not retried every run
+        done.append((digest, name))
+        if len(done) >= FLUSH_EVERY:
+            flush()
+    flush()
+    return added
+
+
+def dataset_images(root="dataset"):
+    """(path, name) for every image under dataset/<name>/."""
+    return [(p, p.split(os.path.sep)[-2]) for p in paths.list_images(root)]
@@ -1,38 +1,16 @@
-
-# --- Shared RealSense Pipeline ---
-pipeline = None
-
-def get_shared_pipeline():
-    global pipeline
-    if pipeline is None:
-        pipeline = get_shared_pipeline()
-        config = rs.config()
-        config.enable_stream(rs.stream.color, 1280, 800, rs.format.bgr8, 30)
-        config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-        # Start handled by get_shared_pipeline()
-        print("[INFO] Shared RealSense pipeline started.")
-    return pipeline
-
-def stop_shared_pipeline():
-    global pipeline
-    if pipeline:
-        stop_shared_pipeline()
-        print("[INFO] Shared RealSense pipeline stopped.")
-        pipeline = None
-
 import os
 import cv2
 import time
 import json
 import boto3
 import shutil
-import numpy as np
-import pyrealsense2 as rs
 from datetime import datetime
 import random
-import pickle
 from imutils import paths
-import face_recognition
+from face_detect import detect_faces
+from encoding_store import EncodingStore, STORE_FILE
+from enroll_engine import reenroll_person
+from frame_broker import get_broker
 
 PHOTO_MIN = 5
 PHOTO_MAX = 10
@@ -70,12 +48,8 @@ def create_folder(name):
 def capture_photos(name):
     folder = create_folder(name)
 
-    pipeline = get_shared_pipeline()
-    config = rs.config()
-    config.enable_stream(rs.stream.color, 1280, 800, rs.format.bgr8, 30)
-    
     print("[INFO] Starting RealSense camera...")
-    # Start handled by get_shared_pipeline()
+    camera = get_broker().subscribe("enrollment")
     time.sleep(2)
 
     photo_count = 0
@@ -84,16 +58,15 @@ def capture_photos(name):
 
     try:
         while photo_count < total_photos:
-            frames = pipeline.wait_for_frames()
-            color_frame = frames.get_color_frame()
-            if not color_frame:
+            packet = camera.latest(timeout=1)
+            if packet is None:
                 continue
 
-            color_image = np.asanyarray(color_frame.get_data())
+            color_image = packet.color
 
             # Check if a face is present
             rgb = cv2.cvtColor(color_image, cv2.COLOR_BGR2RGB)
-            locs = face_recognition.face_locations(rgb)
+            locs = detect_faces(rgb)
 
             if len(locs) == 0:
                 print("[SKIP] No face detected in frame.")
@@ -108,7 +81,7 @@ def capture_photos(name):
 
             time.sleep(PAUSE_TIME)
     finally:
-        stop_shared_pipeline()
+        camera.close()
         cv2.destroyAllWindows()
         print("[INFO] Done capturing.")
 
@@ -119,38 +92,21 @@ def auto_enroll_person(name):
         return
 
     print(f"[INFO] Enrolling faces for: {name}")
-    imagePaths = list(paths.list_images(folder_path))
-    knownEncodings = []
-    knownNames = []
-
-    for (i, imagePath) in enumerate(imagePaths):
-        print(f"[INFO] Processing image {i + 1}/{len(imagePaths)}")
-
-        image = cv2.imread(imagePath)
-        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-        boxes = face_recognition.face_locations(rgb, model="hog")
-        encodings = face_recognition.face_encodings(rgb, boxes)
-
-        for encoding in encodings:
-            knownEncodings.append(encoding)
-            knownNames.append(name)
+    images = list(paths.list_images(folder_path))
+    added = reenroll_person(name, images, EncodingStore(STORE_FILE))
 
-    if not knownEncodings:
-        print(f"[WARNING] No faces detected for {name}")
+    if not added:
+        print(f"[WARNING] No faces detected for {name}; previous enrollment kept")
         return
 
-    output_file = f"encodings_{name}.pickle"
-    print(f"[INFO] Saving to {output_file}...")
-    with open(output_file, "wb") as f:
-        f.write(pickle.dumps({"encodings": knownEncodings, "names": knownNames}))
-    print(f"[INFO] ✅ Enrollment complete")
+    print(f"[INFO] ✅ Enrollment complete ({added} encodings saved to {STORE_FILE})")
 
     # Clean up folder
     print(f"[INFO] Deleting photo folder: {folder_path}")
     shutil.rmtree(folder_path, ignore_errors=True)
 
 # --- Execute all steps immediately ---
-username = get_current_username()
-capture_photos(username)
-auto_enroll_person(username)
+if __name__ == "__main__":
+    username = get_current_username()
+    capture_photos(username)
+    auto_enroll_person(username)
@@ -2,53 +2,46 @@ import cv2
 import threading
 import time
 import pyaudio
-import wave
-import boto3
-import os
-import subprocess
+from av_encoder import ClipEncoder
+from upload_queue import get_upload_queue, PRIORITY_MOTION_CLIP
+from metrics import timer
 
 # AWS config
 S3_BUCKET = "smartdoor-events"
-S3_REGION = "us-east-1"
 
 # File paths
-VIDEO_FILENAME = "/home/pi/smartdoor/latest_video.avi"
-AUDIO_FILENAME = "/home/pi/smartdoor/latest_audio.wav"
 FINAL_FILENAME = "/home/pi/smartdoor/final_output.mp4"
 
+# Video config
+VIDEO_FPS = 20
+FRAME_SIZE = (640, 480)
+
 # Audio config
 RATE = 16000
 CHANNELS = 1
 CHUNK = 1024
 FORMAT = pyaudio.paInt16
 
-def record_audio(duration, stop_flag):
+stop_flag = threading.Event()
+
+def record_audio(duration, stop_flag, encoder):
     audio = pyaudio.PyAudio()
     stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
                         input=True, frames_per_buffer=CHUNK)
-    frames = []
 
     print("🎙️ Recording audio...")
     for _ in range(0, int(RATE / CHUNK * duration)):
         if stop_flag.is_set():
             break
-        frames.append(stream.read(CHUNK, exception_on_overflow=False))
+        encoder.add_audio(stream.read(CHUNK, exception_on_overflow=False), time.time())
 
     print("🛑 Audio recording finished.")
     stream.stop_stream()
     stream.close()
     audio.terminate()
 
-    with wave.open(AUDIO_FILENAME, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(audio.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(frames))
-
-def record_video(duration, stop_flag):
+def record_video(duration, stop_flag, encoder):
     cap = cv2.VideoCapture(0)
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(VIDEO_FILENAME, fourcc, 20.0, (640, 480))
 
     print("🎥 Recording video...")
     start = time.time()
@@ -57,38 +50,28 @@ def record_video(duration, stop_flag):
             break
         ret, frame = cap.read()
         if ret:
-            out.write(frame)
+            if (frame.shape[1], frame.shape[0]) != FRAME_SIZE:
+                frame = cv2.resize(frame, FRAME_SIZE)
+            encoder.add_video(frame, time.time())
 
     print("🛑 Video recording finished.")
     cap.release()
-    out.release()
-
-def merge_audio_video():
-    print("🎞️ Merging audio and video with ffmpeg...")
-    cmd = [
-        'ffmpeg',
-        '-y',
-        '-i', VIDEO_FILENAME,
-        '-i', AUDIO_FILENAME,
-        '-c:v', 'copy',
-        '-c:a', 'aac',
-        '-strict', 'experimental',
-        FINAL_FILENAME
-    ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    print("✅ Merged file created:", FINAL_FILENAME)
 
 def upload_to_s3():
-    print("☁️ Uploading merged video to S3...")
-    s3 = boto3.client('s3', region_name=S3_REGION)
-    s3.upload_file(FINAL_FILENAME, S3_BUCKET, "recordings/smartdoor_capture.mp4")
-    print("✅ Upload complete!")
+    print("☁️ Queueing video for upload to S3...")
+    with timer("upload_to_s3"):
+        get_upload_queue().enqueue_file(FINAL_FILENAME, S3_BUCKET, "recordings/smartdoor_capture.mp4",
+                                        PRIORITY_MOTION_CLIP, content_type="video/mp4")
 
 def start_recording(duration=10):
-    stop_flag = threading.Event()
+    stop_flag.clear()
 
-    audio_thread = threading.Thread(target=record_audio, args=(duration, stop_flag))
-    video_thread = threading.Thread(target=record_video, args=(duration, stop_flag))
+    # Both threads feed one in-process H.264/AAC encoder, so the clip is
+    # written once, already muxed, instead of video + wav + ffmpeg remux
+    encoder = ClipEncoder(FINAL_FILENAME, FRAME_SIZE[0], FRAME_SIZE[1], fps=VIDEO_FPS,
+                          audio_rate=RATE, audio_channels=CHANNELS)
+    audio_thread = threading.Thread(target=record_audio, args=(duration, stop_flag, encoder))
+    video_thread = threading.Thread(target=record_video, args=(duration, stop_flag, encoder))
 
     audio_thread.start()
     video_thread.start()
@@ -96,7 +79,8 @@ def start_recording(duration=10):
     audio_thread.join()
     video_thread.join()
 
-    merge_audio_video()
+    encoder.close()
+    print("✅ Clip encoded:", FINAL_FILENAME)
     upload_to_s3()
 
 def stop_recording():
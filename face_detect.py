@@ -0,0 +1,60 @@
+import cv2
+import face_recognition
+from metrics import timer
+
+# --- Config ---
+DETECT_SCALE = 0.25     # HOG runs on a copy this size; 1.0 = full resolution
+DETECT_UPSAMPLE = 1     # face_recognition's default
+ROI_MARGIN = 0.35       # grow the face-mesh box by this fraction on each side
+
+
+def mesh_bbox(landmarks, w, h, margin=ROI_MARGIN):
+    """(top, right, bottom, left) around MediaPipe landmarks, padded and clamped to the frame."""
+    xs = [lm.x for lm in landmarks]
+    ys = [lm.y for lm in landmarks]
+    left, right = min(xs) * w, max(xs) * w
+    top, bottom = min(ys) * h, max(ys) * h
+    pad_x = (right - left) * margin
+    pad_y = (bottom - top) * margin
+    return (max(0, int(top - pad_y)), min(w, int(right + pad_x)),
+            min(h, int(bottom + pad_y)), max(0, int(left - pad_x)))
+
+
+def detect_faces(rgb, scale=DETECT_SCALE, roi=None, model="hog", upsample=DETECT_UPSAMPLE):
+    """
+    Find faces on a downscaled copy of `rgb` (optionally only inside `roi`,
+    a (top, right, bottom, left) box) and return the boxes in full-resolution
+    coordinates, ready for face_recognition.face_encodings on the full frame.
+    """
+    h, w = rgb.shape[:2]
+    off_y = off_x = 0
+    img = rgb
+    if roi is not None:
+        top, right, bottom, left = roi
+        if bottom - top < 8 or right - left < 8:
+            return []
+        img = rgb[top:bottom, left:right]
+        off_y, off_x = top, left
+
+    if scale != 1.0:
+        img = cv2.resize(img, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    with timer("face_locations"):
+        found = face_recognition.face_locations(img, upsample, model)
+    boxes = []
+    for (top, right, bottom, left) in found:
+        boxes.append((max(0, int(round(top / scale)) + off_y),
+                      min(w, int(round(right / scale)) + off_x),
+                      min(h, int(round(bottom / scale)) + off_y),
+                      max(0, int(round(left / scale)) + off_x)))
+    return boxes
+
+
+def box_iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
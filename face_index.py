@@ -0,0 +1,119 @@
+import glob
+import os
+import pickle
+import numpy as np
+
+# --- Config ---
+ENCODING_DIM = 128
+DEFAULT_TOLERANCE = 0.6  # same default as face_recognition.compare_faces
+ENCODING_GLOB = "encodings_*.pickle"
+
+
+class FaceIndex:
+    """
+    All enrolled face encodings in one contiguous float32 matrix.
+    Every face in a frame is matched against every known encoding with a
+    single matrix product instead of one Python list scan per face.
+    """
+
+    def __init__(self, encodings=None, names=None):
+        self.people = []                # unique names, label -> name
+        self._label_of = {}             # name -> label
+        self.matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self.labels = np.empty((0,), dtype=np.int32)
+        self.sq_norms = np.empty((0,), dtype=np.float32)
+        self.centroids = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        if encodings is not None and len(encodings):
+            self.add(names, encodings)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_pickles(cls, paths):
+        index = cls()
+        for path in paths:
+            with open(path, "rb") as f:
+                data = pickle.loads(f.read())
+            if data["encodings"]:
+                index.add(data["names"], data["encodings"])
+        return index
+
+    @classmethod
+    def from_store(cls, store):
+        """Build directly on the store's memory-mapped rows (no per-row copy)."""
+        rows, names = store.load()
+        index = cls()
+        if len(names):
+            index.matrix = rows
+            index.labels = np.fromiter((index._label(n) for n in names), dtype=np.int32, count=len(names))
+            index.sq_norms = np.einsum("ij,ij->i", rows, rows)
+            index._update_centroids()
+        return index
+
+    @classmethod
+    def from_directory(cls, directory="."):
+        return cls.from_pickles(sorted(glob.glob(os.path.join(directory, ENCODING_GLOB))))
+
+    def _label(self, name):
+        label = self._label_of.get(name)
+        if label is None:
+            label = len(self.people)
+            self._label_of[name] = label
+            self.people.append(name)
+        return label
+
+    def add(self, names, encodings):
+        """
+        Append encodings. `names` is either one name for every row or a
+        list with one name per row (the layout of the pickle files).
+        """
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if isinstance(names, str):
+            names = [names] * len(rows)
+        labels = np.fromiter((self._label(n) for n in names), dtype=np.int32, count=len(rows))
+
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, rows]))
+        self.labels = np.concatenate([self.labels, labels])
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self._update_centroids()
+
+    def _update_centroids(self):
+        counts = np.bincount(self.labels, minlength=len(self.people)).astype(np.float32)
+        sums = np.zeros((len(self.people), ENCODING_DIM), dtype=np.float32)
+        np.add.at(sums, self.labels, self.matrix)
+        self.centroids = sums / np.maximum(counts, 1)[:, None]
+
+    def distances(self, encodings):
+        """Euclidean distance from each query (rows) to each known encoding (cols)."""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        d2 = q_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    def centroid_distances(self, encodings):
+        """Euclidean distance from each query to each enrolled person's centroid."""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        return np.linalg.norm(queries[:, None, :] - self.centroids[None, :, :], axis=2)
+
+    def query(self, encodings, tolerance=DEFAULT_TOLERANCE):
+        """
+        Match every face of a frame at once.
+        Returns one (name, distance) per query; name is "Unknown" when the
+        nearest known encoding is further away than `tolerance`.
+        """
+        if len(encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [("Unknown", float("inf"))] * len(encodings)
+
+        dist = self.distances(encodings)
+        best = np.argmin(dist, axis=1)
+        best_dist = dist[np.arange(len(best)), best]
+
+        results = []
+        for idx, d in zip(best, best_dist):
+            name = self.people[self.labels[idx]] if d <= tolerance else "Unknown"
+            results.append((name, float(d)))
+        return results
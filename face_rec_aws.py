@@ -1,237 +1,444 @@
-
-# --- Shared RealSense Pipeline ---
-pipeline = None
-
-def get_shared_pipeline():
-    global pipeline
-    if pipeline is None:
-        pipeline = get_shared_pipeline()
-        config = rs.config()
-        config.enable_stream(rs.stream.color, 1280, 800, rs.format.bgr8, 30)
-        config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-        # Start handled by get_shared_pipeline()
-        print("[INFO] Shared RealSense pipeline started.")
-    return pipeline
-
-def stop_shared_pipeline():
-    global pipeline
-    if pipeline:
-        stop_shared_pipeline()
-        print("[INFO] Shared RealSense pipeline stopped.")
-        pipeline = None
-
 import face_recognition
 import cv2
-import numpy as np
-import pyrealsense2 as rs
 import time
-import pickle
 import csv
+import glob
 import os
-import boto3
 import json
+import threading
 from datetime import datetime
 # from gpiozero import LED
 import mediapipe as mp
+from face_index import FaceIndex, ENCODING_GLOB
+from encoding_store import EncodingStore, STORE_FILE
+from frame_pipeline import StagedPipeline, DropOldestQueue
+from face_detect import detect_faces, mesh_bbox, box_iou
+from face_tracker import FaceTracker, landmark_points, MAX_FACES
+from frame_quality import score_roi, get_exposure_hints
+from illumination import get_illumination
+from liveness import is_live
+from frame_broker import get_broker
+from upload_queue import get_upload_queue, PRIORITY_EVIDENCE
+from metrics import get_metrics, timer
+from hal import s3_client
+
+# ------------------ Configuration ------------------
+CSV_LOG = "access_log.csv"
+CONFIRM_TIME = 3
+QUALITY_GRACE = 2  # extra seconds to wait for a frame that passes the quality gate before encoding the best anyway
+NO_FACE_TIMEOUT = 3
+RELOAD_INTERVAL = 10  # seconds between checks for new encodings / authorized user
+FRAME_PERIOD = 1 / 30
+PIPELINE_QUEUE_SIZE = 1  # frames buffered between stages (older ones are dropped)
+ACCOUNTS_BUCKET = "smartdooraccounts"
+CURRENT_USER_KEY = "currentUser/currentUser.json"
+CURRENT_USER_FILE = "currentUser.json"
+S3_BUCKET_FAILED = "smartdoor-events"
+S3_FOLDER_FAILED = "Error Logs"
+S3_BUCKET_RECOGNIZED = "smartdoorpictures"
+S3_FOLDER_ACCEPTED = "accepted"
+S3_FOLDER_REJECTED = "rejected"
+
+
+def index_version():
+    """What the hot reload compares: the store's mtime, or every old pickle's mtime while there is no store."""
+    if os.path.exists(STORE_FILE):
+        return os.path.getmtime(STORE_FILE)
+    return tuple((path, os.path.getmtime(path)) for path in sorted(glob.glob(ENCODING_GLOB)))
+
+
+def load_face_index():
+    version = index_version()
+    if os.path.exists(STORE_FILE):
+        return FaceIndex.from_store(EncodingStore(STORE_FILE)), version
+    # Store not created yet (run encoding_store.py once): read the old pickles
+    return FaceIndex.from_directory("."), version
+
+
+def is_real_face(depth_image, depth_scale, landmarks, w, h):
+    """Dense plane-fit liveness over the face mesh. Returns (is_live, confidence)."""
+    return is_live(depth_image, landmarks, w, h, depth_scale=depth_scale)
+
+
+def draw_faces(frame, locs, names, authorized_user):
+    for (top, right, bottom, left), name in zip(locs, names):
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+        cv2.rectangle(frame, (left, top - 35), (right, top), (0, 0, 255), cv2.FILLED)
+        cv2.putText(frame, name, (left + 6, top - 10), cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
+        if name == authorized_user:
+            cv2.putText(frame, "Authorized", (left + 6, bottom + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
+    return frame
+
+
+def log(name, status):
+    timestamp = time.strftime("%Y-%m-%d %I:%M:%S %p")
+    with open(CSV_LOG, "a", newline="") as f:
+        csv.writer(f).writerow([name, timestamp, status])
+    print(f"[LOG] {name} @ {timestamp} | {status}")
+
+
+class FaceRecognizer:
+    """
+    Resident recognizer. Models, encodings and the camera subscription are
+    created once and stay warm between attempts; a background thread
+    hot-reloads the encoding store and currentUser.json.
+
+    Frames come from the shared frame broker with depth already aligned
+    to color. Capture, liveness and recognition run as separate stages
+    joined by drop-oldest queues, so the camera never waits on inference
+    and each stage works on the freshest frame available to it.
+    authenticate() consumes the newest liveness result and returns None
+    while the attempt is still undecided, or True/False once it is; it
+    never waits longer than one frame period.
+
+    The liveness stage checks every face FaceMesh finds (up to MAX_FACES),
+    scores its ROI (frame_quality) and hands it to the face tracker; the
+    largest face drives the exposure hint. Once a face has been live for
+    CONFIRM_TIME, tracks whose cached identity is still good are decided
+    without encoding, and only the others send the best frame of their
+    burst to the encoder. If one of those has no frame passing the gate
+    yet, the attempt keeps collecting for up to QUALITY_GRACE before
+    encoding the best it has. The door opens if any live track is the
+    authorized user, whatever order dlib reports the faces in.
+    """
+
+    def __init__(self):
+        if not os.path.exists(CSV_LOG):
+            with open(CSV_LOG, "w", newline="") as f:
+                csv.writer(f).writerow(["Name", "Timestamp", "Status"])
+
+        self.s3 = s3_client()
+        self.authorized_user = None
+        self._user_etag = None
+        self.face_index = None
+        self._index_version = None
+        self.reload_if_changed()
+
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=False,
+            max_num_faces=MAX_FACES,
+            refine_landmarks=True,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        self.camera = get_broker().subscribe("recognizer", depth=True)
+        self.camera.pause()
+        self.display = None
+        self.tracker = FaceTracker()
+        self.hints = get_exposure_hints()
+
+        self.frames = StagedPipeline(queue_size=PIPELINE_QUEUE_SIZE)
+        self.frames.add_stage("capture", self._capture)
+        self.frames.add_stage("liveness", self._liveness)
+        self._recognize_in = DropOldestQueue(1)
+        self.recognition = self.frames.add_stage("recognition", self._recognize_and_report,
+                                                 inbox=self._recognize_in)
+        self._attempt = 0
+        self._awaiting_result = False
+
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_loop, daemon=True)
+        self._watcher.start()
+        self.reset()
+
+    # --- Hot reload ---
+    def reload_if_changed(self):
+        head = self.s3.head_object(Bucket=ACCOUNTS_BUCKET, Key=CURRENT_USER_KEY)
+        if head["ETag"] != self._user_etag:
+            print("[INFO] Downloading currentUser.json from S3...")
+            self.s3.download_file(ACCOUNTS_BUCKET, CURRENT_USER_KEY, CURRENT_USER_FILE)
+            with open(CURRENT_USER_FILE, "r") as f:
+                user = json.load(f).get("username", "").strip()
+            if not user:
+                raise ValueError("[ERROR] Could not retrieve username from currentUser.json")
+            self.authorized_user = user
+            self._user_etag = head["ETag"]
+            print(f"[INFO] Authorized username loaded: {user}")
+
+        if self.face_index is None or index_version() != self._index_version:
+            print("[INFO] Loading face encodings...")
+            self.face_index, self._index_version = load_face_index()
+            print(f"[INFO] Indexed {len(self.face_index)} encodings for {len(self.face_index.people)} users.")
+
+        if self.authorized_user not in self.face_index.people:
+            print(f"[WARN] No face encodings enrolled for '{self.authorized_user}'.")
+
+    def _watch_loop(self):
+        while not self._stop.wait(RELOAD_INTERVAL):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                print(f"[WARN] Reload check failed: {e}")
+
+    # --- Attempt state ---
+    def reset(self):
+        # Results of an in-flight recognition from an earlier attempt are
+        # ignored because they carry the old attempt number
+        self._attempt += 1
+        self._awaiting_result = False
+        self.confirm_start = None
+        self.no_face_start = None
+
+    def pause(self):
+        """Stop pulling frames between attempts; threads and models stay warm."""
+        self.frames.pause()
+        self.camera.pause()
+        self.hints.clear()
+        get_illumination().attempt_ended()
+
+    def stats(self):
+        return self.frames.stats()
+
+    def tracks(self):
+        """Every face currently tracked, with its cached identity, plus tracker counters."""
+        return {"tracks": self.tracker.tracks(time.time()), **self.tracker.stats}
+
+    # --- Pipeline stages (worker threads) ---
+    def _capture(self):
+        packet = self.camera.latest(timeout=0.5)
+        if packet is None or packet.depth is None:
+            return None
+        return {"color": packet.color, "depth": packet.depth,
+                "depth_scale": packet.depth_scale, "time": packet.timestamp}
+
+    def _liveness(self, item):
+        frame = item["color"]
+        with timer("face_mesh"):
+            result = self.face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        h, w, _ = frame.shape
+        faces = []
+        for mesh in result.multi_face_landmarks or []:
+            landmarks = mesh.landmark
+            live, liveness = is_real_face(item["depth"], item["depth_scale"], landmarks, w, h)
+            box = mesh_bbox(landmarks, w, h)
+            with timer("frame_quality"):
+                quality = score_roi(frame, box)
+            faces.append({"box": box, "points": landmark_points(landmarks, w, h),
+                          "live": live, "liveness": liveness, "quality": quality})
+        item["face"] = bool(faces)
+        item["live"] = any(f["live"] for f in faces)
+        self.tracker.update(faces, item["time"], frame)
+        if faces:
+            # Exposure follows the largest (usually nearest) face
+            main = max(faces, key=lambda f: (f["box"][2] - f["box"][0]) * (f["box"][1] - f["box"][3]))
+            self.hints.publish(main["box"], (w, h), main["quality"])
+        return item
+
+    # --- Attempt state machine (caller thread) ---
+    def authenticate(self):
+        """Consume the newest pipeline result. Returns None (undecided), True or False."""
+        if not self.frames.running:
+            get_illumination().attempt_started()    # ring comes up while the camera does
+            self.camera.resume()
+            self.frames.start()
 
-def face_rec():
-    # ------------------ Configuration ------------------
-    CSV_LOG = "access_log.csv"
-    CONFIRM_TIME = 3
-    DEPTH_VARIATION = 0.03
-    LANDMARKS = [1, 234, 454, 152]
-    S3_BUCKET_FAILED = "smartdoor-events"
-    S3_FOLDER_FAILED = "Error Logs"
-    S3_BUCKET_RECOGNIZED = "smartdoorpictures"
-    S3_FOLDER_ACCEPTED = "accepted"
-    S3_FOLDER_REJECTED = "rejected"
-    LOCAL_TMP_DIR = "tmp_failed"
-    os.makedirs(LOCAL_TMP_DIR, exist_ok=True)
-    s3 = boto3.client("s3")
-
-    # Load authorized username from S3
-    print("[INFO] Downloading currentUser.json from S3...")
-    s3.download_file("smartdooraccounts", "currentUser/currentUser.json", "currentUser.json")
-    with open("currentUser.json", "r") as f:
-        current_user_data = json.load(f)
-    AUTHORIZED_USER = current_user_data.get("username", "").strip()
-    if not AUTHORIZED_USER:
-        raise ValueError("[ERROR] Could not retrieve username from currentUser.json")
-
-    print(f"[INFO] Authorized username loaded: {AUTHORIZED_USER}")
-
-    # Load corresponding encoding file
-    print("[INFO] Loading face encodings...")
-    encoding_file = f"encodings_{AUTHORIZED_USER}.pickle"
-    if not os.path.exists(encoding_file):
-        raise FileNotFoundError(f"[ERROR] Encoding file '{encoding_file}' not found.")
-    with open(encoding_file, "rb") as f:
-        data = pickle.loads(f.read())
-    known_encodings = data["encodings"]
-    known_names = data["names"]
-
-    mp_face_mesh = mp.solutions.face_mesh
-    face_mesh = mp_face_mesh.FaceMesh(
-        static_image_mode=False,
-        max_num_faces=1,
-        refine_landmarks=True,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
-
-    pipeline = get_shared_pipeline()
-    config = rs.config()
-    config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-    config.enable_stream(rs.stream.color, 1280, 800, rs.format.bgr8, 30)
-    # Start handled by get_shared_pipeline()
-    align = rs.align(rs.stream.color)
-
-    if not os.path.exists(CSV_LOG):
-        with open(CSV_LOG, "w", newline="") as f:
-            csv.writer(f).writerow(["Name", "Timestamp", "Status"])
-
-    def get_depth(depth_frame, x, y):
+        if self._awaiting_result:
+            result = self.recognition.outbox.get(timeout=FRAME_PERIOD)
+            if result is None or result[0] != self._attempt:
+                return None
+            self.reset()
+            return result[1]
+
+        item = self.frames.output.get(timeout=FRAME_PERIOD)
+        if item is None:
+            return None
+
+        frame = item["color"]
+        self.display = frame.copy()
+        now = item["time"]
+
+        if not item["face"]:
+            self.confirm_start = None
+            if self.no_face_start is None:
+                self.no_face_start = now
+            elif now - self.no_face_start >= NO_FACE_TIMEOUT:
+                print(f"[ERROR] No face detected for {NO_FACE_TIMEOUT} seconds. Exiting.")
+                self.reset()
+                return False
+            return None
+
+        self.no_face_start = None  # reset timeout
+        if not item["live"]:
+            self.confirm_start = None
+            return None
+
+        if self.confirm_start is None:
+            self.confirm_start = now
+        elif now - self.confirm_start >= CONFIRM_TIME:
+            return self._decide_or_encode(frame, now, now - self.confirm_start >= CONFIRM_TIME + QUALITY_GRACE)
+
+        cv2.putText(self.display, f"Authenticating... {now - self.confirm_start:.1f}s", (20, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        return None
+
+    def _decide_or_encode(self, frame, now, grace):
+        """
+        Decide from cached track identities where they are still good;
+        otherwise queue the best frame of every live track that needs
+        (re)encoding for the recognition stage. Returns None while undecided.
+        """
+        live = self.tracker.live_tracks(now)
+        cached = {}
+        for t in live:
+            # Only a face watched without a break since it was encoded keeps its
+            # verdict; a rejection is redone once a clearly better frame exists
+            cached[t.id] = self.tracker.cached(t, now, continuous=True, trusted=self.authorized_user)
+        known = [(t.id, t.box, cached[t.id]) for t in live if cached[t.id] is not None]
+        if self.authorized_user in cached.values():
+            return self._decide_from_cache(frame, known)
+
+        jobs, waiting = [], []
+        for t in live:
+            if cached[t.id] is not None:
+                continue
+            best = self.tracker.best_frame(t) or (self.tracker.best_frame(t, passing=False) if grace else None)
+            if best is None:
+                waiting.append(t)
+                continue
+            quality, (best_frame, box) = best
+            get_metrics().set_gauge("encoded_frame_score", quality.score)
+            jobs.append((t.id, best_frame.copy(), box, quality.score))
+
+        if waiting and not grace:
+            reason = waiting[0].quality.reason if waiting[0].quality else None
+            cv2.putText(self.display, f"{reason}, hold still..." if reason else "Hold still...", (20, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+            return None
+        if not jobs:
+            return self._decide_from_cache(frame, known) if known else None
+
+        print(f"[INFO] ✅ Real face confirmed, encoding {len(jobs)} of {len(live)} tracked face(s)...")
+        self._recognize_in.put((self._attempt, jobs, known))
+        self._awaiting_result = True
+        return None
+
+    def _decide_from_cache(self, frame, known):
+        authorized = any(name == self.authorized_user for _, _, name in known)
+        print(f"[INFO] ✅ Decided from tracked faces: {[name for _, _, name in known]}")
+        self._record_decision(frame.copy(), known, authorized)
+        self.reset()
+        return authorized
+
+    # --- Recognition stage ---
+    def identify(self, rgb, box):
+        """
+        Encode the face inside one tracked box. Returns (location, encoding,
+        name, distance), or None if HOG finds no face there.
+        """
+        # Detect on a downscaled copy inside the box, then encode on the
+        # full-resolution frame
+        locs = detect_faces(rgb, roi=box)
+        if not locs:
+            locs = [loc for loc in detect_faces(rgb) if box_iou(loc, box) > 0]
+        if not locs:
+            return None
+        # The detection that belongs to this track, not whichever dlib lists first
+        loc = max(locs, key=lambda l: box_iou(l, box))
+        with timer("face_encodings"):
+            encoding = face_recognition.face_encodings(rgb, [loc])[0]
+        with timer("face_match"):
+            name, distance = self.face_index.query([encoding])[0]
+        return loc, encoding, name, distance
+
+    def _recognize_and_report(self, job):
+        # authenticate() waits for a result carrying this attempt number, so
+        # every failure still has to produce one or the attempt never ends
         try:
-            return depth_frame.get_distance(int(x), int(y))
-        except:
-            return 0.0
-
-    def is_real_face(depth_frame, landmarks, w, h):
-        depths = [get_depth(depth_frame, int(lm.x * w), int(lm.y * h)) for lm in [landmarks[i] for i in LANDMARKS]]
-        return max(depths) - min(depths) > DEPTH_VARIATION
-
-    def recognize_faces(frame):
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        locs = face_recognition.face_locations(rgb)
-        encs = face_recognition.face_encodings(rgb, locs)
-        names = []
-        for enc in encs:
-            matches = face_recognition.compare_faces(known_encodings, enc)
-            name = "Unknown"
-            distances = face_recognition.face_distance(known_encodings, enc)
-            if len(distances) > 0:
-                best_match = np.argmin(distances)
-                if matches[best_match]:
-                    name = known_names[best_match]
-            names.append(name)
-        return locs, names
-
-    def draw_faces(frame, locs, names):
-        for (top, right, bottom, left), name in zip(locs, names):
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-            cv2.rectangle(frame, (left, top - 35), (right, top), (0, 0, 255), cv2.FILLED)
-            cv2.putText(frame, name, (left + 6, top - 10), cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
-            if name == AUTHORIZED_USER:
-                cv2.putText(frame, "Authorized", (left + 6, bottom + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
-        return frame
-
-    def log(name, status):
-        timestamp = time.strftime("%Y-%m-%d %I:%M:%S %p")
-        with open(CSV_LOG, "a", newline="") as f:
-            csv.writer(f).writerow([name, timestamp, status])
-        print(f"[LOG] {name} @ {timestamp} | {status}")
-
-    confirm_start = None
-    face_ready = False
-    no_face_start = None
+            return self._recognize(job)
+        except Exception as e:
+            print(f"[ERROR] Recognition failed: {e}")
+            return job[0], False
 
-    try:
-        while True:
-            frames = pipeline.wait_for_frames()
-            frames = align.process(frames)
-            depth_frame = frames.get_depth_frame()
-            color_frame = frames.get_color_frame()
-            if not depth_frame or not color_frame:
+    def _recognize(self, job):
+        attempt, jobs, known = job
+        now = time.time()
+        faces, evidence = list(known), None
+        for track_id, img, box, score in jobs:
+            found = self.identify(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), box)
+            if found is None:
                 continue
+            loc, encoding, name, distance = found
+            self.tracker.set_identity(track_id, encoding, name, distance, now, score)
+            faces.append((track_id, loc, name))
+            if evidence is None:
+                evidence = img
 
-            frame = np.asanyarray(color_frame.get_data())
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            result = face_mesh.process(rgb)
-            display = frame.copy()
-
-            if result.multi_face_landmarks:
-                no_face_start = None  # reset timeout
-                lm = result.multi_face_landmarks[0].landmark
-                h, w, _ = frame.shape
-                if is_real_face(depth_frame, lm, w, h):
-                    if confirm_start is None:
-                        confirm_start = time.time()
-                    elif time.time() - confirm_start >= CONFIRM_TIME:
-                        face_ready = True
-                else:
-                    confirm_start = None
-            else:
-                confirm_start = None
-                if no_face_start is None:
-                    no_face_start = time.time()
-                elif time.time() - no_face_start >= 3:
-                    print("[ERROR] No face detected for 3 seconds. Exiting.")
-                    return False
+        if evidence is None:
+            _, img, box, _ = jobs[0]
+            self._report_failed_frame(img, box)
+            return attempt, False
 
-            if face_ready:
-                print("[INFO] ✅ Real face confirmed, capturing new frame...")
-                for _ in range(3):
-                    pipeline.wait_for_frames()
-                fresh = align.process(pipeline.wait_for_frames()).get_color_frame()
-                if fresh:
-                    fresh_img = np.asanyarray(fresh.get_data())
-                    locs, names = recognize_faces(fresh_img)
-
-                    if not locs:
-                        gray = cv2.cvtColor(fresh_img, cv2.COLOR_BGR2GRAY)
-                        brightness = np.mean(gray)
-                        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-                        print(f"[DEBUG] Brightness: {brightness:.2f}")
-                        print(f"[DEBUG] Laplacian variance: {sharpness:.2f}")
-
-                        if brightness < 60:
-                            reason = "Too dark"
-                        elif brightness > 200:
-                            reason = "Too bright"
-                        elif sharpness < 100:
-                            reason = "Too blurry"
-                        else:
-                            reason = "Unclear cause"
-
-                        filename = f"{datetime.now().strftime('%Y-%m-%d_%I-%M-%S_%p')}_{reason.replace(' ', '_')}.jpg"
-                        local_path = os.path.join(LOCAL_TMP_DIR, filename)
-                        cv2.imwrite(local_path, fresh_img)
-
-                        try:
-                            s3.upload_file(local_path, S3_BUCKET_FAILED, f"{S3_FOLDER_FAILED}/{filename}")
-                            print(f"[UPLOAD] Sent {filename} to S3 → s3://{S3_BUCKET_FAILED}/{S3_FOLDER_FAILED}/")
-                        except Exception as e:
-                            print(f"[ERROR] Failed to upload to S3: {e}")
-                        return False
-                    else:
-                        display = draw_faces(fresh_img, locs, names)
-                        for name in names:
-                            timestamp = datetime.now().strftime('%Y-%m-%d_%I-%M-%S_%p')
-                            upload_name = f"{timestamp}_{name}.jpg"
-                            is_authorized = name == AUTHORIZED_USER
-
-                            _, buffer = cv2.imencode(".jpg", fresh_img)
-                            try:
-                                s3.put_object(Bucket=S3_BUCKET_RECOGNIZED,
-                                              Key=f"{S3_FOLDER_ACCEPTED if is_authorized else S3_FOLDER_REJECTED}/{upload_name}",
-                                              Body=buffer.tobytes(),
-                                              ContentType='image/jpeg')
-                                print(f"[UPLOAD] Sent to s3://{S3_BUCKET_RECOGNIZED}/{'accepted' if is_authorized else 'rejected'}/{upload_name}")
-                            except Exception as e:
-                                print(f"[ERROR] Upload to S3 failed: {e}")
-
-                            log(name, "Authorized" if is_authorized else "Unknown")
-                            return is_authorized
-
-            elif confirm_start:
-                elapsed = time.time() - confirm_start
-                cv2.putText(display, f"Authenticating... {elapsed:.1f}s", (20, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-
-            cv2.imshow("Face Recognition", display)
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                return False
+        faces.sort()
+        authorized = any(name == self.authorized_user for _, _, name in faces)
+        self._record_decision(evidence, faces, authorized)
+        return attempt, authorized
+
+    def _record_decision(self, img, faces, authorized):
+        """Log every tracked face (by track id) and upload one evidence image for the attempt."""
+        self.display = draw_faces(img.copy(), [box for _, box, _ in faces], [name for _, _, name in faces],
+                                  self.authorized_user)
+        for _, _, name in faces:
+            log(name, "Authorized" if name == self.authorized_user else "Unknown")
+
+        name = self.authorized_user if authorized else faces[0][2]
+        timestamp = datetime.now().strftime('%Y-%m-%d_%I-%M-%S_%p')
+        upload_name = f"{timestamp}_{name}.jpg"
+        _, buffer = cv2.imencode(".jpg", img)
+        get_upload_queue().enqueue_bytes(
+            S3_BUCKET_RECOGNIZED, f"{S3_FOLDER_ACCEPTED if authorized else S3_FOLDER_REJECTED}/{upload_name}",
+            buffer.tobytes(), PRIORITY_EVIDENCE, content_type="image/jpeg")
+
+    def _report_failed_frame(self, fresh_img, roi=None):
+        # Same measurements the quality gate used, so the label matches why it was let through
+        quality = score_roi(fresh_img, roi)
+        get_metrics().set_gauge("failed_frame_brightness", quality.brightness)
+        get_metrics().set_gauge("failed_frame_sharpness", quality.sharpness)
+        reason = quality.reason or "Unclear cause"
+
+        filename = f"{datetime.now().strftime('%Y-%m-%d_%I-%M-%S_%p')}_{reason.replace(' ', '_')}.jpg"
+        _, buffer = cv2.imencode(".jpg", fresh_img)
+        get_upload_queue().enqueue_bytes(S3_BUCKET_FAILED, f"{S3_FOLDER_FAILED}/{filename}",
+                                         buffer.tobytes(), PRIORITY_EVIDENCE, content_type="image/jpeg")
 
+    def close(self):
+        self._stop.set()
+        self.frames.stop()
+        self.face_mesh.close()
+        self.camera.close()
+
+
+recognizer = None
+_recognizer_lock = threading.Lock()
+
+def get_recognizer():
+    # warmup_task and an early attempt can both get here first; only one may
+    # build the index, watcher thread and pipeline
+    global recognizer
+    if recognizer is None:
+        with _recognizer_lock:
+            if recognizer is None:
+                recognizer = FaceRecognizer()
+    return recognizer
+
+
+def face_rec(show=True):
+    """Run one full attempt on the resident recognizer and return the decision."""
+    rec = get_recognizer()
+    rec.reset()
+    start = time.perf_counter()
+    try:
+        while True:
+            # Blocks up to FRAME_PERIOD on the pipeline queues, so this never spins (also with show=False)
+            result = rec.authenticate()
+            if show and rec.display is not None:
+                cv2.imshow("Face Recognition", rec.display)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    rec.reset()
+                    return False
+            if result is not None:
+                get_metrics().observe("face_rec_attempt", time.perf_counter() - start)
+                return result
     finally:
-        stop_shared_pipeline()
-        cv2.destroyAllWindows()
+        rec.pause()
+        if show:
+            cv2.destroyAllWindows()
@@ -0,0 +1,212 @@
+import itertools
+import threading
+import numpy as np
+from face_detect import box_iou
+from frame_quality import FrameBurst
+
+# --- Config ---
+MAX_FACES = 4               # FaceMesh max_num_faces
+KEY_LANDMARKS = [1, 33, 263, 61, 291, 199, 10]  # nose tip, eye corners, mouth corners, chin, forehead
+IOU_MATCH = 0.3             # a detection continues a track if the boxes overlap at least this much...
+CENTER_MATCH = 0.5          # ...or its landmark centroid moved less than this fraction of the face height
+TRACK_TTL = 10.0            # seconds a track survives without a detection (covers the pause between attempts)
+MAX_GAP = 0.5               # a track unseen for longer than this is no longer "continuously observed"
+RECENT = 0.5                # seconds since last detection for a track to count as "in view"
+REENCODE_SECONDS = 20.0     # cached encodings older than this are refreshed
+LANDMARK_DRIFT = 0.12       # pose/expression change (normalised landmark shape) that forces a re-encode
+REENCODE_GAIN = 0.15        # a rejection is redone once the track has a frame scoring this much better
+
+
+def landmark_points(landmarks, w, h, indices=KEY_LANDMARKS):
+    """Pixel coordinates of the key FaceMesh landmarks as an (N, 2) float array."""
+    return np.array([(landmarks[i].x * w, landmarks[i].y * h) for i in indices], dtype=np.float32)
+
+
+def shape_drift(a, b):
+    """Mean landmark displacement after removing translation and scale; 0 for the same pose."""
+    def normalise(pts):
+        centred = pts - pts.mean(axis=0)
+        scale = np.sqrt((centred ** 2).sum(axis=1).mean())
+        return centred / scale if scale > 0 else centred
+    return float(np.linalg.norm(normalise(a) - normalise(b), axis=1).mean())
+
+
+class FaceTrack:
+    """One face followed across frames, with its cached encoding and identity."""
+
+    def __init__(self, track_id, box, points, timestamp):
+        self.id = track_id
+        self.box = box                  # (top, right, bottom, left)
+        self.points = points            # KEY_LANDMARKS in pixels
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 0
+        self.live = False
+        self.liveness = 0.0
+        self.quality = None
+        self.burst = FrameBurst()
+        self.encoding = None
+        self.identity = None            # enrolled name, "Unknown", or None before the first encoding
+        self.distance = None
+        self.encoded_at = None
+        self.encoded_points = None
+        self.encoded_score = None       # quality score of the frame that was encoded
+        self.reacquired_at = timestamp  # last time the track was picked up again after a gap
+
+    @property
+    def center(self):
+        return self.points.mean(axis=0)
+
+    @property
+    def height(self):
+        return max(1, self.box[2] - self.box[0])
+
+    def as_dict(self, now):
+        return {"id": self.id, "box": list(self.box), "identity": self.identity,
+                "distance": None if self.distance is None else round(self.distance, 3),
+                "live": self.live, "liveness": round(self.liveness, 2), "hits": self.hits,
+                "age_seconds": round(now - self.first_seen, 2),
+                "encoding_age_seconds": None if self.encoded_at is None else round(now - self.encoded_at, 2)}
+
+
+class FaceTracker:
+    """
+    Follows faces across frames and caches one encoding and identity per
+    track, so a face standing at the door is encoded once instead of on
+    every attempt.
+
+    update() matches detections to tracks greedily by IoU, falling back
+    to landmark-centroid distance for fast moves. Ties are broken by
+    track id and detection order, so the same frames always produce the
+    same tracks. A track is re-encoded when its cached encoding is older
+    than REENCODE_SECONDS or the landmark shape has drifted more than
+    LANDMARK_DRIFT since it was encoded. Tracks not seen for TRACK_TTL
+    are dropped, so someone waiting through the pause between attempts
+    keeps their track.
+
+    Across such a gap the tracker cannot tell whether the same person is
+    still there, so cached(..., continuous=True) only returns an identity
+    if the track was observed without a gap longer than MAX_GAP since it
+    was encoded. The recognizer asks for that before trusting any cached
+    identity. A cached rejection is also given up as soon as the track has
+    a frame scoring REENCODE_GAIN better than the one it came from, so a
+    verdict from a dark or blurry frame does not stand for the whole
+    REENCODE_SECONDS.
+
+    Safe to call from the pipeline stages and the attempt thread at once.
+    """
+
+    def __init__(self, ttl=TRACK_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tracks = {}
+        self._ids = itertools.count(1)
+        self.stats = {"tracks_started": 0, "encodings": 0, "cache_hits": 0, "identity_changes": 0}
+
+    def update(self, detections, timestamp, frame=None):
+        """
+        detections: dicts with "box", "points", "live", "liveness" and
+        "quality". Returns the track id for each detection, in order.
+        Live detections with a quality score add `frame` to their track's burst.
+        """
+        with self._lock:
+            self._expire(timestamp)
+            tracks = sorted(self._tracks.values(), key=lambda t: t.id)
+            pairs = []
+            for t in tracks:
+                for d, det in enumerate(detections):
+                    iou = box_iou(t.box, det["box"])
+                    moved = float(np.linalg.norm(t.center - det["points"].mean(axis=0))) / t.height
+                    if iou >= IOU_MATCH or moved <= CENTER_MATCH:
+                        pairs.append((-iou, moved, t.id, d))
+            pairs.sort()
+
+            assigned = [None] * len(detections)
+            used = set()
+            for _, _, track_id, d in pairs:
+                if assigned[d] is None and track_id not in used:
+                    assigned[d] = track_id
+                    used.add(track_id)
+
+            for d, det in enumerate(detections):
+                if assigned[d] is None:
+                    track = FaceTrack(next(self._ids), det["box"], det["points"], timestamp)
+                    self._tracks[track.id] = track
+                    self.stats["tracks_started"] += 1
+                    assigned[d] = track.id
+                track = self._tracks[assigned[d]]
+                if timestamp - track.last_seen > MAX_GAP:
+                    track.reacquired_at = timestamp
+                track.box, track.points = det["box"], det["points"]
+                track.last_seen = timestamp
+                track.hits += 1
+                track.live, track.liveness = det["live"], det["liveness"]
+                track.quality = det["quality"]
+                if det["live"] and det["quality"] is not None and frame is not None:
+                    track.burst.add(timestamp, det["quality"], (frame, det["box"]))
+                elif not det["live"]:
+                    track.burst.clear()
+            return assigned
+
+    def _expire(self, now):
+        for track_id in [i for i, t in self._tracks.items() if now - t.last_seen > self.ttl]:
+            del self._tracks[track_id]
+
+    def needs_encoding(self, track, now):
+        if track.encoded_at is None or now - track.encoded_at > REENCODE_SECONDS:
+            return True
+        return shape_drift(track.points, track.encoded_points) > LANDMARK_DRIFT
+
+    def live_tracks(self, now, recent=RECENT):
+        """Tracks in view and live right now, by id."""
+        with self._lock:
+            return sorted((t for t in self._tracks.values() if t.live and now - t.last_seen <= recent),
+                          key=lambda t: t.id)
+
+    def cached(self, track, now, continuous=False, trusted=None):
+        """
+        The track's identity if its encoding is still good, else None. With
+        continuous=True the track must also not have been lost since it was
+        encoded. Any identity other than `trusted` is also dropped once a
+        clearly better frame of the track is available. Counts cache hits.
+        """
+        with self._lock:
+            if track.identity is None or self.needs_encoding(track, now):
+                return None
+            if continuous and track.reacquired_at > track.encoded_at:
+                return None
+            if track.identity != trusted and track.encoded_score is not None:
+                best = track.burst.best()
+                if best is not None and best[0].score >= track.encoded_score + REENCODE_GAIN:
+                    return None
+            self.stats["cache_hits"] += 1
+            return track.identity
+
+    def best_frame(self, track, passing=True):
+        """The track's best recent (quality, (frame, box)); see FrameBurst.best."""
+        with self._lock:
+            return track.burst.best(passing)
+
+    def set_identity(self, track_id, encoding, identity, distance, now, score=None):
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None:
+                return None     # expired while it was being encoded
+            if track.identity is not None and track.identity != identity:
+                self.stats["identity_changes"] += 1
+                print(f"[TRACK] Track {track_id} re-identified: {track.identity} -> {identity}")
+            track.encoding = encoding
+            track.identity, track.distance = identity, distance
+            track.encoded_at, track.encoded_points = now, track.points.copy()
+            track.encoded_score = score
+            self.stats["encodings"] += 1
+            return track
+
+    def tracks(self, now):
+        """Every current track with its identity, for reports and overlays."""
+        with self._lock:
+            return [t.as_dict(now) for t in sorted(self._tracks.values(), key=lambda t: t.id)]
+
+    def reset(self):
+        with self._lock:
+            self._tracks.clear()
@@ -0,0 +1,377 @@
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from metrics import timer
+from frame_quality import get_exposure_hints
+import hal
+
+# --- Config ---
+COLOR_WIDTH, COLOR_HEIGHT = 1280, 800
+DEPTH_WIDTH, DEPTH_HEIGHT = 640, 480
+FPS = 30
+# Low-power profile used while every active subscriber is content with a
+# few frames per second and nobody needs depth (e.g. presence standby)
+STANDBY_WIDTH, STANDBY_HEIGHT = 640, 480
+STANDBY_FPS = 5
+WAIT_TIMEOUT_MS = 5000
+EXPOSURE_ROI_INTERVAL = 0.5     # seconds between auto-exposure ROI updates while a face is tracked
+EXPOSURE_ROI_STEP = 24          # px the face box must move before the ROI is updated
+PROFILE_RETRY_SECONDS = 5       # wait before retrying a profile the camera refused to open
+
+
+class FramePacket:
+    """One camera frame as delivered to a subscriber."""
+
+    __slots__ = ("seq", "timestamp", "color", "depth", "depth_scale")
+
+    def __init__(self, seq, timestamp, color, depth=None, depth_scale=0.001):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.color = color
+        self.depth = depth
+        self.depth_scale = depth_scale
+
+
+class Subscription:
+    """
+    A consumer's view of the camera: a small ring buffer of frames already
+    converted to the size/format this consumer asked for. When the ring is
+    full the oldest frame is dropped, so a slow consumer never holds up the
+    broker or the other subscribers.
+    """
+
+    def __init__(self, broker, name, size=None, fmt="bgr", depth=False, buffer=2, max_fps=None):
+        self.broker = broker
+        self.name = name
+        self.size = size          # (width, height) or None for native
+        self.fmt = fmt            # "bgr", "rgb" or "gray"
+        self.depth = depth        # also deliver the depth frame aligned to color
+        self.max_fps = max_fps    # deliver at most this rate (None = every frame)
+        self._last_publish = 0.0
+        self._ring = deque(maxlen=buffer)
+        self._cond = threading.Condition()
+        self.delivered = 0
+        self.dropped = 0
+        self.paused = False
+        self.closed = False
+
+    def _publish(self, seq, timestamp, color, depth, depth_scale):
+        if self.max_fps and timestamp - self._last_publish < 1.0 / self.max_fps:
+            return
+        self._last_publish = timestamp
+        img = color
+        if self.size is not None and (img.shape[1], img.shape[0]) != self.size:
+            img = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        if self.fmt == "rgb":
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        elif self.fmt == "gray":
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        packet = FramePacket(seq, timestamp, img, depth if self.depth else None, depth_scale)
+        with self._cond:
+            if len(self._ring) == self._ring.maxlen:
+                self.dropped += 1
+            self._ring.append(packet)
+            self.delivered += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Oldest unread frame, waiting up to `timeout` seconds. None on timeout."""
+        with self._cond:
+            if not self._ring:
+                self._cond.wait(timeout)
+            return self._ring.popleft() if self._ring else None
+
+    def latest(self, timeout=None):
+        """Newest frame, discarding anything older. None on timeout."""
+        with self._cond:
+            if not self._ring:
+                self._cond.wait(timeout)
+            if not self._ring:
+                return None
+            packet = self._ring[-1]
+            self._ring.clear()
+            return packet
+
+    def set_max_fps(self, max_fps):
+        """Change the delivery rate; the broker re-evaluates the camera profile."""
+        if max_fps != self.max_fps:
+            self.max_fps = max_fps
+            self.broker.wake()
+
+    def pause(self):
+        """Keep the subscription (and the camera) open but stop receiving frames."""
+        self.paused = True
+        with self._cond:
+            self._ring.clear()
+        self.broker.wake()
+
+    def resume(self):
+        self.paused = False
+        self.broker.wake()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameBroker:
+    """
+    Opens the D455 once and fans every frame out to all subscribers.
+    The device is started by the first subscribe() and stopped when the
+    last subscriber closes (reference counted). Depth is aligned to color
+    once per frame, and only while some subscriber asked for it.
+
+    While every active subscriber asks for at most STANDBY_FPS and none
+    wants depth, the camera is switched to a low-resolution, low-FPS
+    color-only profile. The full profile comes back as soon as a
+    subscriber needs more. Subscribers that only need a trickle while
+    idle (the live view before a viewer connects, the motion recorder
+    between events) lower their rate with set_max_fps() so standby is
+    reachable. If a profile fails to open, the previous one is reopened
+    and the switch is retried after PROFILE_RETRY_SECONDS.
+
+    Exposure hints from the recognizer point the color sensor's
+    auto-exposure at the face box (rate-limited, applied on the capture
+    thread); a cleared hint meters the whole frame again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._pipeline = None
+        self._align = None
+        self._depth_scale = 0.001
+        self._thread = None
+        self._halt = None
+        self._profile = None
+        self._profile_changed = threading.Event()
+        self._profile_retry_at = 0.0
+        self.frames = 0
+        self.profile_switches = 0
+        self._exposure_wanted = None    # (roi, frame_size) waiting to be applied
+        self._exposure_applied = None
+        self._exposure_applied_at = 0.0
+        self.exposure_updates = 0
+        get_exposure_hints().subscribe(self._on_exposure_hint)
+
+    def subscribe(self, name, size=None, fmt="bgr", depth=False, buffer=2, max_fps=None):
+        sub = Subscription(self, name, size, fmt, depth, buffer, max_fps)
+        with self._lock:
+            self._subscribers.append(sub)
+            if self._halt is None:
+                try:
+                    self._start()
+                except Exception:
+                    # No capture thread: don't leave a subscriber waiting on it
+                    self._subscribers.remove(sub)
+                    raise
+        print(f"[BROKER] '{name}' subscribed ({len(self._subscribers)} active).")
+        self.wake()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            last = not self._subscribers
+        print(f"[BROKER] '{sub.name}' unsubscribed.")
+        if last:
+            self._stop()
+        else:
+            self.wake()
+
+    @property
+    def refcount(self):
+        return len(self._subscribers)
+
+    def wake(self):
+        """Re-evaluate the camera profile now (a subscriber paused, resumed or joined)."""
+        self._profile_changed.set()
+
+    @staticmethod
+    def _profile_for(subscribers):
+        active = [s for s in subscribers if not s.paused]
+        if all(not s.depth and s.max_fps and s.max_fps <= STANDBY_FPS for s in active):
+            return "standby"
+        return "full"
+
+    def _wanted_profile(self):
+        with self._lock:
+            return self._profile_for(self._subscribers)
+
+    # --- Auto-exposure ---
+    def _on_exposure_hint(self, hint):
+        self._exposure_wanted = (hint.roi, hint.frame_size)
+
+    def _update_exposure(self, pipeline):
+        # Runs on the capture thread, which owns the device
+        wanted = self._exposure_wanted
+        roi, frame_size = wanted
+        size = (COLOR_WIDTH, COLOR_HEIGHT)
+        if roi is not None and frame_size and tuple(frame_size) != size:
+            sx, sy = size[0] / frame_size[0], size[1] / frame_size[1]
+            roi = (int(roi[0] * sy), int(roi[1] * sx), int(roi[2] * sy), int(roi[3] * sx))
+        applied = self._exposure_applied
+        if roi is not None and applied is not None:
+            if time.time() - self._exposure_applied_at < EXPOSURE_ROI_INTERVAL:
+                return      # keep the request; it is retried on a later frame
+            if max(abs(a - b) for a, b in zip(roi, applied)) < EXPOSURE_ROI_STEP:
+                self._take_exposure_request(wanted)
+                return
+        self._take_exposure_request(wanted)
+        if roi == applied:
+            return
+        try:
+            hal.set_exposure_roi(pipeline, roi, size)
+        except RuntimeError as e:
+            print(f"[BROKER] Auto-exposure ROI not applied: {e}")
+        self._exposure_applied = roi
+        self._exposure_applied_at = time.time()
+        self.exposure_updates += 1
+
+    def _take_exposure_request(self, wanted):
+        # A hint that arrived meanwhile (e.g. the clear on pause) must not be lost
+        if self._exposure_wanted is wanted:
+            self._exposure_wanted = None
+
+    def _open(self, profile_name):
+        # The real D455, a .bag playback or an .npz replay, depending on the HAL mode
+        if profile_name == "standby":
+            pipeline, _ = hal.open_camera((STANDBY_WIDTH, STANDBY_HEIGHT, STANDBY_FPS))
+        else:
+            pipeline, self._depth_scale = hal.open_camera((COLOR_WIDTH, COLOR_HEIGHT, FPS),
+                                                          (DEPTH_WIDTH, DEPTH_HEIGHT, FPS))
+        self._profile = profile_name
+        self._exposure_applied = None   # a freshly opened sensor meters the whole frame
+        return pipeline
+
+    def _switch_profile(self, pipeline, wanted, halt):
+        """
+        Reopen the camera in the `wanted` profile (capture thread only). If
+        it will not open, fall back to the current profile; if neither
+        opens, keep alternating until one does or the broker is stopped.
+        Returns the new pipeline, or None once halted.
+        """
+        previous = self._profile
+        with self._lock:
+            if halt.is_set():
+                return None
+            pipeline.stop()
+            self._pipeline = None
+        attempt = 0
+        while not halt.is_set():
+            profile = wanted if attempt % 2 == 0 else previous
+            attempt += 1
+            try:
+                opened = self._open(profile)
+            except (RuntimeError, OSError) as e:
+                print(f"[BROKER] Could not open the {profile} profile: {e}")
+                if attempt % 2 == 0:
+                    halt.wait(PROFILE_RETRY_SECONDS)
+                continue
+            with self._lock:
+                if halt.is_set():
+                    opened.stop()
+                    return None
+                self._pipeline = opened
+            if profile == wanted:
+                self.profile_switches += 1
+                print(f"[BROKER] Switched camera to {wanted} profile.")
+            else:
+                self._profile_retry_at = time.time() + PROFILE_RETRY_SECONDS
+                print(f"[BROKER] Staying on the {profile} profile for now.")
+            return opened
+        return None
+
+    def _start(self):
+        # Called with self._lock held (from subscribe, whenever no capture thread is running)
+        self._pipeline = self._open(self._profile_for(self._subscribers))
+        self._align = hal.aligner()
+        # Each run gets its own halt event so a quick stop/start cannot
+        # leave the previous capture thread running on a stopped pipeline
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._pipeline, self._halt),
+                                        name="frame-broker", daemon=True)
+        self._thread.start()
+        print(f"[BROKER] RealSense pipeline started ({self._profile} profile).")
+
+    def _stop(self):
+        with self._lock:
+            if self._subscribers or self._halt is None:
+                return
+            self._halt.set()
+            thread, pipeline = self._thread, self._pipeline
+            self._thread = self._pipeline = self._halt = None
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=2)
+        if pipeline:
+            pipeline.stop()
+        print("[BROKER] RealSense pipeline stopped.")
+
+    def _run(self, pipeline, halt):
+        align = self._align
+        while not halt.is_set():
+            retry = self._profile_retry_at and time.time() >= self._profile_retry_at
+            if self._profile_changed.is_set() or retry:
+                self._profile_changed.clear()
+                self._profile_retry_at = 0.0
+                wanted = self._wanted_profile()
+                if wanted != self._profile:
+                    pipeline = self._switch_profile(pipeline, wanted, halt)
+                    if pipeline is None:
+                        break
+            if self._exposure_wanted is not None and self._profile == "full":
+                self._update_exposure(pipeline)
+            try:
+                with timer("camera_wait_for_frames"):
+                    frames = pipeline.wait_for_frames(WAIT_TIMEOUT_MS)
+            except RuntimeError as e:
+                print(f"[BROKER] wait_for_frames failed: {e}")
+                continue
+
+            with self._lock:
+                subscribers = [s for s in self._subscribers if not s.paused]
+            if not subscribers:
+                continue
+            want_depth = any(s.depth for s in subscribers)
+
+            depth = None
+            if want_depth:
+                with timer("camera_align"):
+                    frames = align.process(frames)
+                depth_frame = frames.get_depth_frame()
+                if depth_frame:
+                    depth = np.asanyarray(depth_frame.get_data()).copy()
+            color_frame = frames.get_color_frame()
+            if not color_frame:
+                continue
+
+            # One copy out of librealsense's buffer; subscribers that take the
+            # native size/format share it and must treat it as read-only
+            color = np.asanyarray(color_frame.get_data()).copy()
+            self.frames += 1
+            timestamp = time.time()
+            for sub in subscribers:
+                sub._publish(self.frames, timestamp, color, depth, self._depth_scale)
+
+    def stats(self):
+        with self._lock:
+            return {"frames": self.frames, "profile": self._profile, "profile_switches": self.profile_switches,
+                    "exposure_updates": self.exposure_updates,
+                    "subscribers": {s.name: {"delivered": s.delivered, "dropped": s.dropped}
+                                    for s in self._subscribers}}
+
+
+broker = FrameBroker()
+
+def get_broker():
+    return broker
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+
+class DropOldestQueue:
+    """
+    Bounded hand-off between two stages. put() never blocks: when the
+    queue is full the oldest item is discarded, so the consumer always
+    gets the freshest data and a slow consumer never stalls its producer.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Oldest queued item, or None if nothing arrives within `timeout`."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    def __init__(self):
+        self.processed = 0
+        self.errors = 0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms):
+        self.processed += 1
+        self.last_ms = elapsed_ms
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self):
+        avg = self.total_ms / self.processed if self.processed else 0.0
+        return {"processed": self.processed, "errors": self.errors,
+                "last_ms": round(self.last_ms, 2), "avg_ms": round(avg, 2), "max_ms": round(self.max_ms, 2)}
+
+
+class Stage:
+    """
+    One worker thread. Source stages (inbox=None) call fn() in a loop;
+    other stages call fn(item) for each item taken from the inbox.
+    A None result is filtered out instead of being passed downstream.
+    """
+
+    def __init__(self, name, fn, inbox=None, outbox=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stats = StageStats()
+        self._thread = None
+
+    def start(self, active, stop):
+        self._thread = threading.Thread(target=self._run, args=(active, stop),
+                                        name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self, active, stop):
+        while not stop.is_set():
+            if not active.wait(0.1):
+                continue
+            if self.inbox is None:
+                item = None
+            else:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+
+            start = time.perf_counter()
+            try:
+                out = self.fn() if self.inbox is None else self.fn(item)
+            except Exception as e:
+                self.stats.errors += 1
+                print(f"[PIPELINE] Stage '{self.name}' failed: {e}")
+                continue
+            self.stats.record((time.perf_counter() - start) * 1000.0)
+
+            if out is not None and self.outbox is not None:
+                self.outbox.put(out)
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+
+class StagedPipeline:
+    """
+    Chain of stages connected by drop-oldest queues:
+
+        add_stage("capture", grab)          # source
+        add_stage("align", align)           # grab -> align
+        add_stage("liveness", check)        # align -> liveness
+        latest = pipe.output.get(timeout)
+
+    Stages can be paused (threads stay alive, queues are flushed) and
+    resumed without rebuilding anything.
+    """
+
+    def __init__(self, queue_size=1):
+        self.queue_size = queue_size
+        self.stages = []
+        self.output = DropOldestQueue(queue_size)
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._started = False
+
+    def add_stage(self, name, fn, inbox=None, outbox=None):
+        """
+        Append a stage fed by the previous stage's output. Passing `inbox`
+        hangs a side stage off the chain instead; its results go to
+        `outbox` (a new queue by default) and the chain output is unchanged.
+        """
+        if inbox is not None:
+            stage = Stage(name, fn, inbox, outbox or DropOldestQueue(self.queue_size))
+        else:
+            if self.stages:
+                inbox = self.output
+                self.output = DropOldestQueue(self.queue_size)
+            stage = Stage(name, fn, inbox, self.output)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        if not self._started:
+            for stage in self.stages:
+                stage.start(self._active, self._stop)
+            self._started = True
+        self._active.set()
+
+    def pause(self):
+        self._active.clear()
+        for stage in self.stages:
+            for queue in (stage.inbox, stage.outbox):
+                if queue is not None:
+                    queue.clear()
+
+    def stop(self):
+        self._active.clear()
+        self._stop.set()
+        for stage in self.stages:
+            stage.join(timeout=1)
+
+    @property
+    def running(self):
+        return self._active.is_set()
+
+    def stats(self):
+        report = {}
+        for stage in self.stages:
+            entry = stage.stats.snapshot()
+            entry["dropped"] = stage.outbox.dropped if stage.outbox is not None else 0
+            report[stage.name] = entry
+        return report
@@ -0,0 +1,213 @@
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+# --- Config ---
+SCORE_SIZE = 96                 # the face ROI is scored as a gray image at most this many px on a side
+TARGET_BRIGHTNESS = 128
+MIN_BRIGHTNESS = 60             # mean gray level of the ROI (old full-frame "Too dark" cut-off)
+MAX_BRIGHTNESS = 200
+MIN_SHARPNESS = 60              # Laplacian variance of the SCORE_SIZE ROI, not of the full frame
+GOOD_SHARPNESS = 250            # sharper than this does not improve the score
+CLIP_LOW, CLIP_HIGH = 16, 240   # gray levels counted as crushed / blown out
+MAX_CLIPPED = 0.25              # fraction of the ROI allowed to be crushed or blown out
+BURST_SECONDS = 0.5             # best frame is picked from the live frames seen this long before the decision
+HINT_MAX_AGE = 2.0              # seconds an exposure hint stays in force
+
+
+class FrameQuality:
+    """Cheap exposure/focus measurements of one face ROI."""
+
+    __slots__ = ("brightness", "sharpness", "clipped", "score", "reason")
+
+    def __init__(self, brightness, sharpness, clipped):
+        self.brightness = brightness
+        self.sharpness = sharpness
+        self.clipped = clipped
+        if brightness < MIN_BRIGHTNESS:
+            self.reason = "Too dark"
+        elif brightness > MAX_BRIGHTNESS:
+            self.reason = "Too bright"
+        elif sharpness < MIN_SHARPNESS:
+            self.reason = "Too blurry"
+        elif clipped > MAX_CLIPPED:
+            self.reason = "Overexposed" if brightness > TARGET_BRIGHTNESS else "Underexposed"
+        else:
+            self.reason = None
+        exposure = 1.0 - min(1.0, abs(brightness - TARGET_BRIGHTNESS) / TARGET_BRIGHTNESS)
+        focus = min(1.0, sharpness / GOOD_SHARPNESS)
+        self.score = exposure * focus * (1.0 - clipped)
+
+    @property
+    def ok(self):
+        return self.reason is None
+
+    def as_dict(self):
+        return {"brightness": round(self.brightness, 1), "sharpness": round(self.sharpness, 1),
+                "clipped": round(self.clipped, 3), "score": round(self.score, 3), "reason": self.reason}
+
+    def __repr__(self):
+        return f"FrameQuality({self.as_dict()})"
+
+
+def score_roi(frame, roi=None, size=SCORE_SIZE):
+    """
+    Score the (top, right, bottom, left) roi of a BGR or gray frame (the
+    whole frame when roi is None). The crop is converted to gray and
+    area-downsampled before anything is measured, so the cost is the same
+    for a 1280x800 frame as for a thumbnail.
+    """
+    img = frame
+    if roi is not None:
+        top, right, bottom, left = roi
+        img = frame[top:bottom, left:right]
+    if img.size == 0:
+        return FrameQuality(0.0, 0.0, 1.0)
+    # Strided view down to ~2x the target first (no copy), so the colour
+    # conversion and area resize only touch a few thousand pixels
+    step = max(1, max(img.shape[:2]) // (2 * size))
+    img = img[::step, ::step]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    h, w = gray.shape
+    scale = size / max(h, w)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    mean, _ = cv2.meanStdDev(gray)
+    sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+    clipped = np.count_nonzero((gray < CLIP_LOW) | (gray > CLIP_HIGH)) / gray.size
+    return FrameQuality(float(mean[0, 0]), float(sharpness), float(clipped))
+
+
+class FrameBurst:
+    """
+    Best frame of the last `seconds`, so the recognizer can send the
+    single best one to the encoder instead of whichever frame happened to
+    be newest. Kept as a sliding-window maximum: a frame is dropped as
+    soon as a newer one scores at least as well, so only a handful of
+    frame references are held however long the window. Frames are copied
+    by the caller.
+    """
+
+    def __init__(self, seconds=BURST_SECONDS):
+        self.seconds = seconds
+        self._frames = deque()  # (timestamp, rank, quality, payload); rank strictly decreasing
+        self.added = 0
+
+    def add(self, timestamp, quality, payload):
+        rank = (quality.ok, quality.score)
+        while self._frames and self._frames[-1][1] <= rank:
+            self._frames.pop()
+        self._frames.append((timestamp, rank, quality, payload))
+        cutoff = timestamp - self.seconds
+        while self._frames[0][0] < cutoff:
+            self._frames.popleft()
+        self.added += 1
+
+    def best(self, passing=True):
+        """(quality, payload) of the highest-scoring frame (only ones that pass the gate if passing), or None."""
+        if not self._frames:
+            return None
+        _, _, quality, payload = self._frames[0]
+        if passing and not quality.ok:
+            return None
+        return quality, payload
+
+    def clear(self):
+        self._frames.clear()
+        self.added = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class ExposureHint:
+    """Where the face is and how it is exposed, for the camera's auto-exposure and the LED ring."""
+
+    __slots__ = ("roi", "frame_size", "quality", "timestamp")
+
+    def __init__(self, roi, frame_size, quality, timestamp=None):
+        self.roi = roi                  # (top, right, bottom, left) in frame_size pixels, None = no face
+        self.frame_size = frame_size    # (width, height)
+        self.quality = quality
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    @property
+    def wants_light(self):
+        """The face is too dark for a good encoding."""
+        return self.quality is not None and self.quality.brightness < MIN_BRIGHTNESS
+
+    def __repr__(self):
+        return f"ExposureHint(roi={self.roi}, quality={self.quality})"
+
+
+class ExposureHints:
+    """
+    Latest exposure hint from the recognizer, fanned out to subscribers
+    (the frame broker points auto-exposure at the face, the flashlight
+    loop reads latest()). publish() calls subscribers on the caller's
+    thread, so they must be quick.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._subscribers = {}
+        self._tokens = itertools.count(1)
+        self.published = 0
+
+    def publish(self, roi, frame_size, quality=None):
+        hint = ExposureHint(roi, frame_size, quality)
+        with self._lock:
+            self._latest = hint
+            self.published += 1
+            targets = list(self._subscribers.items())
+        for token, fn in targets:
+            try:
+                fn(hint)
+            except Exception as e:
+                print(f"[QUALITY] Exposure hint subscriber {token} failed: {e}")
+        return hint
+
+    def clear(self, frame_size=None):
+        """No face any more: consumers go back to whole-frame behaviour."""
+        return self.publish(None, frame_size)
+
+    def latest(self, max_age=HINT_MAX_AGE):
+        """The newest hint with a face in it, or None if there is none younger than max_age."""
+        hint = self._latest
+        if hint is None or hint.roi is None or time.time() - hint.timestamp > max_age:
+            return None
+        return hint
+
+    def subscribe(self, fn):
+        """fn(hint) for every published hint. Returns a token."""
+        token = next(self._tokens)
+        with self._lock:
+            self._subscribers[token] = fn
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+
+exposure_hints = ExposureHints()
+
+def get_exposure_hints():
+    return exposure_hints
+
+
+if __name__ == "__main__":
+    # python frame_quality.py image.jpg [...]   -> whole-image scores, for tuning the thresholds
+    for path in sys.argv[1:]:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"{path}: unreadable")
+            continue
+        start = time.perf_counter()
+        quality = score_roi(image)
+        print(f"{path}: {quality.as_dict()} ({(time.perf_counter() - start) * 1000:.2f} ms)")
@@ -0,0 +1,260 @@
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+import hal
+
+# --- Config ---
+DEFAULT_BOUNCE_MS = 50
+HISTORY_SIZE = 256          # events kept per pin
+LOW, HIGH = 0, 1
+
+
+class GpioEvent:
+    """One accepted level change, timestamped when the edge interrupt fired."""
+
+    __slots__ = ("pin", "level", "timestamp", "source")
+
+    def __init__(self, pin, level, timestamp, source="edge"):
+        self.pin = pin
+        self.level = level
+        self.timestamp = timestamp
+        self.source = source        # "edge", "output" (we drove it) or "settle" (debounce re-read)
+
+    def __repr__(self):
+        return f"GpioEvent(pin={self.pin}, level={self.level}, t={self.timestamp:.3f}, {self.source})"
+
+
+class RPiBackend:
+    """Edge interrupts from RPi.GPIO (rpi-lgpio on the Pi 5), or hal.SimGPIO in simulation."""
+
+    def __init__(self):
+        self.GPIO = hal.gpio()
+        self.GPIO.setmode(self.GPIO.BCM)
+
+    def setup_input(self, pin, pull):
+        GPIO = self.GPIO
+        pud = {"up": GPIO.PUD_UP, "down": GPIO.PUD_DOWN}.get(pull, GPIO.PUD_OFF)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=pud)
+
+    def add_edge_callback(self, pin, fn):
+        # No hardware bouncetime: the bus debounces in software so the
+        # final level after a bounce is never lost
+        self.GPIO.add_event_detect(pin, self.GPIO.BOTH, callback=lambda ch: fn(ch, self.GPIO.input(ch)))
+
+    def remove(self, pin):
+        self.GPIO.remove_event_detect(pin)
+
+    def read(self, pin):
+        return int(self.GPIO.input(pin))
+
+
+class SimulatedBackend:
+    """In-memory pins for tests and benches; inject() plays the role of the hardware edge."""
+
+    def __init__(self):
+        self.levels = {}
+        self._callbacks = {}
+
+    def setup_input(self, pin, pull):
+        self.levels.setdefault(pin, HIGH if pull == "up" else LOW)
+
+    def add_edge_callback(self, pin, fn):
+        self._callbacks[pin] = fn
+
+    def remove(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def read(self, pin):
+        return self.levels.get(pin, LOW)
+
+    def inject(self, pin, level):
+        if self.levels.get(pin) == level:
+            return
+        self.levels[pin] = level
+        fn = self._callbacks.get(pin)
+        if fn:
+            fn(pin, level)
+
+    def pulse(self, pin, seconds, bounces=0):
+        """Drive pin HIGH for `seconds` (optionally with contact bounce on both edges)."""
+        for _ in range(bounces):
+            self.inject(pin, HIGH)
+            self.inject(pin, LOW)
+        self.inject(pin, HIGH)
+        time.sleep(seconds)
+        for _ in range(bounces):
+            self.inject(pin, LOW)
+            self.inject(pin, HIGH)
+        self.inject(pin, LOW)
+
+
+class GpioEventBus:
+    """
+    Edge-driven GPIO fan-out, replacing the per-module 100 ms polling threads.
+
+    watch() arms an edge interrupt on a pin. Each edge is stamped the
+    moment it fires, then debounced in software: a change within bounce_ms
+    of the last accepted edge is held back and the pin is re-read once the
+    window closes, so short pulses are kept and the settled level is never
+    lost. Accepted events go into a per-pin history and are delivered on one
+    dispatcher thread to every subscriber of that pin, so a slow subscriber
+    never delays the interrupt handler.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else RPiBackend()
+        self._lock = threading.Lock()
+        self._pins = {}             # pin -> {"bounce", "level", "accepted_at", "settle"}
+        self._subscribers = {}      # token -> (pin, edge, fn, name)
+        self._history = {}
+        self._tokens = itertools.count(1)
+        self._events = queue.Queue()
+        self.stats = {"edges": 0, "accepted": 0, "debounced": 0, "dispatched": 0}
+        self._dispatcher = None
+        self.start()
+
+    def start(self):
+        """Start the dispatcher thread (again, if it has died)."""
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="gpio-bus", daemon=True)
+            self._dispatcher.start()
+
+    def alive(self):
+        return self._dispatcher is not None and self._dispatcher.is_alive()
+
+    # --- Pins ---
+    def watch(self, pin, pull="down", bounce_ms=DEFAULT_BOUNCE_MS):
+        with self._lock:
+            if pin in self._pins:
+                return
+            self.backend.setup_input(pin, pull)
+            self._pins[pin] = {"bounce": bounce_ms / 1000.0, "level": self.backend.read(pin),
+                               "accepted_at": 0.0, "settle": None}
+            self._history[pin] = deque(maxlen=HISTORY_SIZE)
+        self.backend.add_edge_callback(pin, self._on_edge)
+
+    def unwatch(self, pin):
+        with self._lock:
+            state = self._pins.pop(pin, None)
+        if state:
+            self.backend.remove(pin)
+            if state["settle"]:
+                state["settle"].cancel()
+
+    def level(self, pin):
+        with self._lock:
+            state = self._pins.get(pin)
+            return state["level"] if state else None
+
+    def record_output(self, pin, level):
+        """Log (and announce) a level we drove ourselves, e.g. the lock relay."""
+        with self._lock:
+            self._history.setdefault(pin, deque(maxlen=HISTORY_SIZE))
+        self._accept(pin, int(level), time.time(), "output")
+
+    # --- Edges ---
+    def _on_edge(self, pin, level, source="edge", timestamp=None):
+        now = time.time()
+        self.stats["edges"] += 1
+        with self._lock:
+            state = self._pins.get(pin)
+            if state is None:
+                return
+            level = int(level)
+            if level == state["level"]:
+                return
+            wait = state["accepted_at"] + state["bounce"] - now
+            if wait > 0:
+                # Inside the bounce window: decide once the contact has settled
+                self.stats["debounced"] += 1
+                state["pending_at"] = now
+                if state["settle"] is None:
+                    state["settle"] = threading.Timer(wait, self._settle, args=(pin,))
+                    state["settle"].daemon = True
+                    state["settle"].start()
+                return
+            state["level"] = level
+            state["accepted_at"] = now
+        self._accept(pin, level, timestamp or now, source)
+
+    def _settle(self, pin):
+        with self._lock:
+            state = self._pins.get(pin)
+            if state is None:
+                return
+            state["settle"] = None
+            state["accepted_at"] = 0.0
+            pending_at = state.get("pending_at")
+        # Stamped with the last held-back edge, not the end of the window
+        self._on_edge(pin, self.backend.read(pin), "settle", pending_at)
+
+    def _accept(self, pin, level, timestamp, source):
+        event = GpioEvent(pin, level, timestamp, source)
+        with self._lock:
+            self._history[pin].append(event)
+        self.stats["accepted"] += 1
+        self._events.put(event)
+
+    # --- Subscribers ---
+    def subscribe(self, pin, fn, edge="both", name=None):
+        """fn(event) on every accepted "rising", "falling" or "both" edge of pin. Returns a token."""
+        token = next(self._tokens)
+        with self._lock:
+            self._subscribers[token] = (pin, edge, fn, name or getattr(fn, "__name__", "subscriber"))
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def on_hold(self, pin, seconds, fn, level=HIGH, name=None):
+        """fn(event) once pin has stayed at `level` for `seconds` (e.g. a long-press reboot)."""
+        timer = [None]
+
+        def on_change(event):
+            if timer[0]:
+                timer[0].cancel()
+                timer[0] = None
+            if event.level == level:
+                timer[0] = threading.Timer(seconds, fn, args=(event,))
+                timer[0].daemon = True
+                timer[0].start()
+
+        return self.subscribe(pin, on_change, name=name or f"hold-{pin}")
+
+    def _dispatch_loop(self):
+        while True:
+            event = self._events.get()
+            edge = "rising" if event.level == HIGH else "falling"
+            with self._lock:
+                targets = [(fn, name) for pin, want, fn, name in self._subscribers.values()
+                           if pin == event.pin and want in ("both", edge)]
+            for fn, name in targets:
+                try:
+                    fn(event)
+                    self.stats["dispatched"] += 1
+                except Exception as e:
+                    print(f"[GPIO] Subscriber '{name}' failed on pin {event.pin}: {e}")
+
+    # --- History ---
+    def history(self, pin=None, since=None):
+        with self._lock:
+            pins = [pin] if pin is not None else list(self._history)
+            events = [e for p in pins for e in self._history.get(p, ())]
+        if since is not None:
+            events = [e for e in events if e.timestamp >= since]
+        return sorted(events, key=lambda e: e.timestamp)
+
+
+bus = None
+_bus_lock = threading.Lock()
+
+def get_bus(backend=None):
+    """The process-wide bus; pass a SimulatedBackend before first use to run without hardware."""
+    global bus
+    with _bus_lock:
+        if bus is None:
+            bus = GpioEventBus(backend)
+    return bus
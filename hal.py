@@ -0,0 +1,549 @@
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import sys
+import threading
+import time
+
+# --- Config ---
+HAL_ENV = "SMARTDOOR_HAL"               # "hardware" (default) or "sim"
+REPLAY_ENV = "SMARTDOOR_REPLAY"         # .bag (librealsense playback) or .npz recording; synthetic if unset
+LOCAL_S3_ENV = "SMARTDOOR_LOCAL_S3"     # directory backing the local S3 stand-in
+LOCAL_S3_DIR = "/tmp/smartdoor-s3"
+SIM_LUX = 100.0
+SIM_SIZE = (640, 480)
+SIM_FPS = 30
+REPLAY_REALTIME = True                  # pace replay at the recorded fps; False = as fast as it can be read
+SIM_DEPTH_MM = 600                      # flat "face" plane for the synthetic depth stream
+DEPTH_SCALE = 0.001
+NEO_DEVICE = "/dev/spidev0.0"
+NEO_LEDS = 1000
+NEO_SPEED_KHZ = 800
+VEML_ADDRESS = 0x10
+
+
+def simulated():
+    return os.environ.get(HAL_ENV, "hardware") == "sim"
+
+
+def use_sim(replay=None, s3_dir=None):
+    """Switch this process to simulated hardware; call before anything opens a device."""
+    os.environ[HAL_ENV] = "sim"
+    if replay:
+        os.environ[REPLAY_ENV] = replay
+    if s3_dir:
+        os.environ[LOCAL_S3_ENV] = s3_dir
+
+
+# --- Camera ---
+class ReplayFrame:
+    def __init__(self, data):
+        self.data = data
+
+    def get_data(self):
+        return self.data
+
+    def __bool__(self):
+        return self.data is not None
+
+
+class ReplayFrameset:
+    def __init__(self, color, depth):
+        self.color = ReplayFrame(color)
+        self.depth = ReplayFrame(depth)
+
+    def get_color_frame(self):
+        return self.color
+
+    def get_depth_frame(self):
+        return self.depth
+
+
+class ReplayPipeline:
+    """
+    Stands in for rs.pipeline: plays an .npz recording (arrays "color"
+    N×H×W×3 BGR and optional "depth" N×H×W z16, already aligned to color,
+    plus "fps") in a loop. Without a recording it generates a moving
+    synthetic scene. Frames are paced at the recorded rate unless
+    realtime=False, which is what throughput benches want.
+    """
+
+    def __init__(self, source=None, realtime=None):
+        self.source = source
+        self.realtime = REPLAY_REALTIME if realtime is None else realtime
+        self.fps = SIM_FPS
+        self.color = self.depth = None
+        if source:
+            import numpy as np
+            data = np.load(source)
+            self.color = data["color"]
+            self.depth = data["depth"] if "depth" in data.files else None
+            self.fps = float(data["fps"]) if "fps" in data.files else SIM_FPS
+        self.index = 0
+        self._next_at = 0.0
+        self.delivered = 0
+        self.exposure_roi = None    # last region set_exposure_roi() asked for
+
+    # rs.pipeline / rs.pipeline_profile surface used by the frame broker
+    def start(self, config=None):
+        self._next_at = time.perf_counter()
+        return self
+
+    def stop(self):
+        pass
+
+    def get_device(self):
+        return self
+
+    def first_depth_sensor(self):
+        return self
+
+    def get_depth_scale(self):
+        return DEPTH_SCALE
+
+    def _synthetic(self, i):
+        import numpy as np
+        w, h = SIM_SIZE
+        x = np.roll(np.linspace(0, 255, w, dtype=np.uint8), i * 4)
+        color = np.dstack([np.tile(x, (h, 1))] * 3)
+        depth = np.full((h, w), SIM_DEPTH_MM, dtype=np.uint16)
+        return color, depth
+
+    def wait_for_frames(self, timeout_ms=5000):
+        if self.realtime:
+            delay = self._next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_at = max(self._next_at, time.perf_counter() - 1.0) + 1.0 / self.fps
+        if self.color is None:
+            color, depth = self._synthetic(self.index)
+        else:
+            n = self.index % len(self.color)
+            color = self.color[n]
+            depth = self.depth[n] if self.depth is not None else None
+        self.index += 1
+        self.delivered += 1
+        return ReplayFrameset(color, depth)
+
+
+class PassthroughAlign:
+    """Recordings are stored aligned, so alignment is a no-op."""
+
+    def process(self, frames):
+        return frames
+
+
+def open_camera(color, depth=None):
+    """
+    Start the camera and return (pipeline, depth_scale). color and depth
+    are (width, height, fps) tuples, and depth=None means color only.
+    """
+    replay = os.environ.get(REPLAY_ENV)
+    if simulated() and not (replay and replay.endswith(".bag")):
+        pipeline = ReplayPipeline(replay)
+        return pipeline.start(), DEPTH_SCALE
+    import pyrealsense2 as rs
+    pipeline = rs.pipeline()
+    config = rs.config()
+    if replay and replay.endswith(".bag"):
+        config.enable_device_from_file(replay, repeat_playback=True)
+    else:
+        config.enable_stream(rs.stream.color, color[0], color[1], rs.format.bgr8, color[2])
+        if depth:
+            config.enable_stream(rs.stream.depth, depth[0], depth[1], rs.format.z16, depth[2])
+    profile = pipeline.start(config)
+    scale = profile.get_device().first_depth_sensor().get_depth_scale() if depth or replay else DEPTH_SCALE
+    return pipeline, scale
+
+
+def aligner():
+    replay = os.environ.get(REPLAY_ENV)
+    if simulated() and not (replay and replay.endswith(".bag")):
+        return PassthroughAlign()
+    import pyrealsense2 as rs
+    return rs.align(rs.stream.color)
+
+
+def set_exposure_roi(pipeline, roi, size):
+    """
+    Point the color sensor's auto-exposure at roi, a (top, right, bottom,
+    left) box in size=(width, height) pixels; None meters the whole frame.
+    Raises RuntimeError if the device refuses (e.g. AE off, .bag playback).
+    """
+    if isinstance(pipeline, ReplayPipeline):
+        pipeline.exposure_roi = roi
+        return
+    top, right, bottom, left = roi if roi is not None else (0, size[0], size[1], 0)
+    sensor = pipeline.get_active_profile().get_device().first_color_sensor().as_roi_sensor()
+    region = sensor.get_region_of_interest()
+    region.min_x, region.min_y = max(0, left), max(0, top)
+    region.max_x, region.max_y = min(size[0], right) - 1, min(size[1], bottom) - 1
+    sensor.set_region_of_interest(region)
+
+
+# --- GPIO ---
+class SimGPIO:
+    """The slice of the RPi.GPIO API this project uses, on in-memory pins."""
+
+    BCM = "BCM"
+    IN, OUT = "in", "out"
+    LOW, HIGH = 0, 1
+    PUD_OFF, PUD_UP, PUD_DOWN = "off", "up", "down"
+    RISING, FALLING, BOTH = "rising", "falling", "both"
+
+    def __init__(self):
+        self.levels = {}
+        self.modes = {}
+        self.writes = []                # (timestamp, pin, level) for every output()
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        self.modes[pin] = mode
+        if mode == self.IN:
+            self.levels.setdefault(pin, self.HIGH if pull_up_down == self.PUD_UP else self.LOW)
+        elif initial is not None:
+            self.levels[pin] = int(initial)
+
+    def output(self, pin, level):
+        self.levels[pin] = int(level)
+        self.writes.append((time.time(), pin, int(level)))
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self._callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def cleanup(self, *pins):
+        self._callbacks.clear()
+
+    def inject(self, pin, level):
+        """Drive an input pin as the outside world would, firing its edge callback."""
+        with self._lock:
+            level = int(level)
+            if self.levels.get(pin) == level:
+                return
+            self.levels[pin] = level
+            edge, fn = self._callbacks.get(pin, (None, None))
+        if fn and edge in (self.BOTH, self.RISING if level else self.FALLING):
+            fn(pin)
+
+    def pulse(self, pin, seconds):
+        self.inject(pin, self.HIGH)
+        time.sleep(seconds)
+        self.inject(pin, self.LOW)
+
+
+_gpio = None
+
+def gpio():
+    """RPi.GPIO on the Pi, SimGPIO in simulation."""
+    global _gpio
+    if _gpio is None:
+        if simulated():
+            _gpio = SimGPIO()
+        else:
+            import RPi.GPIO as GPIO
+            _gpio = GPIO
+    return _gpio
+
+
+# --- Light sensor and LED ring ---
+class SimLightSensor:
+    """VEML7700 stand-in; benches set .lux (or .script, a function of time) to drive it."""
+
+    def __init__(self, lux=SIM_LUX):
+        self._lux = lux
+        self.script = None
+        self.light_gain = 1
+        self.integration_time = 100
+        self.reads = 0
+
+    @property
+    def lux(self):
+        self.reads += 1
+        return self.script(time.time()) if self.script else self._lux
+
+    @lux.setter
+    def lux(self, value):
+        self._lux = value
+
+
+class SimNeo:
+    """Pi5Neo stand-in that keeps the pixel buffer and counts SPI updates."""
+
+    def __init__(self, device=NEO_DEVICE, num_leds=NEO_LEDS, spi_speed_khz=NEO_SPEED_KHZ):
+        self.num_leds = num_leds
+        self.pixels = [(0, 0, 0)] * num_leds
+        self.shown = list(self.pixels)
+        self.updates = 0
+
+    def fill_strip(self, r=0, g=0, b=0):
+        self.pixels = [(r, g, b)] * self.num_leds
+
+    def set_led_color(self, index, r, g, b):
+        self.pixels[index] = (r, g, b)
+
+    def update_strip(self, sleep_duration=None):
+        self.shown = list(self.pixels)
+        self.updates += 1
+
+    def clear_strip(self):
+        self.fill_strip(0, 0, 0)
+
+
+def light_sensor():
+    if simulated():
+        return SimLightSensor()
+    import board
+    import busio
+    from adafruit_veml7700 import VEML7700
+    sensor = VEML7700(busio.I2C(board.SCL, board.SDA), address=VEML_ADDRESS)
+    sensor.light_gain = 1
+    sensor.integration_time = 100
+    return sensor
+
+
+def led_strip(device=NEO_DEVICE, num_leds=NEO_LEDS, spi_speed_khz=NEO_SPEED_KHZ):
+    if simulated():
+        return SimNeo(device, num_leds, spi_speed_khz)
+    from pi5neo import Pi5Neo
+    return Pi5Neo(device, num_leds, spi_speed_khz)
+
+
+# --- S3 ---
+def _client_error(code, operation, message=""):
+    from botocore.exceptions import ClientError
+    return ClientError({"Error": {"Code": code, "Message": message or code}}, operation)
+
+
+class LocalS3:
+    """
+    Directory-backed stand-in for the boto3 S3 client, covering the calls
+    this project makes. Objects live at <root>/<bucket>/<key>. ETags are
+    MD5s, so conditional GETs answer 304 exactly as S3 does. stats counts
+    requests and bytes in each direction, which the benchmarks report as
+    upload volume.
+    """
+
+    def __init__(self, root=LOCAL_S3_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._uploads = {}
+        self.stats = {"put_requests": 0, "get_requests": 0, "list_requests": 0, "delete_requests": 0,
+                      "bytes_uploaded": 0, "bytes_downloaded": 0, "objects_written": 0}
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, n in increments.items():
+                self.stats[name] += n
+
+    @staticmethod
+    def _read_body(body):
+        if body is None:
+            return b""
+        if isinstance(body, str):
+            return body.encode("utf-8")
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            return bytes(body)
+        return body.read()
+
+    def _write(self, bucket, key, data):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._count(put_requests=1, bytes_uploaded=len(data), objects_written=1)
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def _meta(self, path, key=None):
+        with open(path, "rb") as f:
+            etag = f'"{hashlib.md5(f.read()).hexdigest()}"'
+        modified = datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc)
+        meta = {"ETag": etag, "LastModified": modified, "ContentLength": os.path.getsize(path)}
+        if key is not None:
+            meta.update(Key=key, Size=meta["ContentLength"])
+        return meta
+
+    # --- Objects ---
+    def put_object(self, Bucket, Key, Body=None, **kwargs):
+        return {"ETag": self._write(Bucket, Key, self._read_body(Body))}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, **kwargs):
+        with open(Filename, "rb") as f:
+            self._write(Bucket, Key, f.read())
+
+    def head_object(self, Bucket, Key, **kwargs):
+        path = self._path(Bucket, Key)
+        self._count(get_requests=1)
+        if not os.path.isfile(path):
+            raise _client_error("404", "HeadObject", "Not Found")
+        return self._meta(path)
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        meta = self.head_object(Bucket, Key)
+        if IfNoneMatch is not None and IfNoneMatch == meta["ETag"]:
+            raise _client_error("304", "GetObject", "Not Modified")
+        with open(self._path(Bucket, Key), "rb") as f:
+            data = f.read()
+        self._count(bytes_downloaded=len(data))
+        return dict(meta, Body=io.BytesIO(data))
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        body = self.get_object(Bucket, Key)["Body"].read()
+        with open(Filename, "wb") as f:
+            f.write(body)
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count(delete_requests=1)
+        path = self._path(Bucket, Key)
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        for obj in Delete.get("Objects", []):
+            self.delete_object(Bucket, obj["Key"])
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", StartAfter="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self._count(list_requests=1)
+        base = os.path.join(self.root, Bucket)
+        keys = []
+        for folder, _, files in os.walk(base):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(folder, name), base).replace(os.sep, "/")
+                if key.startswith(Prefix) and key > max(StartAfter, ContinuationToken or ""):
+                    keys.append(key)
+        keys.sort()
+        page = keys[:MaxKeys]
+        resp = {"Contents": [self._meta(self._path(Bucket, k), k) for k in page], "KeyCount": len(page),
+                "IsTruncated": len(keys) > MaxKeys}
+        if resp["IsTruncated"]:
+            resp["NextContinuationToken"] = page[-1]
+        if not page:
+            del resp["Contents"]
+        return resp
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                token = None
+                while True:
+                    page = client.list_objects_v2(ContinuationToken=token, **kwargs)
+                    yield page
+                    if not page.get("IsTruncated"):
+                        return
+                    token = page["NextContinuationToken"]
+
+        return Paginator()
+
+    # --- Multipart ---
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = hashlib.sha1(f"{Bucket}/{Key}/{time.time()}".encode()).hexdigest()
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        data = self._read_body(Body)
+        with self._lock:
+            if UploadId not in self._uploads:
+                raise _client_error("NoSuchUpload", "UploadPart")
+            self._uploads[UploadId][PartNumber] = data
+        self._count(put_requests=1, bytes_uploaded=len(data))
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        with self._lock:
+            parts = self._uploads.pop(UploadId, None)
+        if parts is None:
+            raise _client_error("NoSuchUpload", "CompleteMultipartUpload")
+        data = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self._count(objects_written=1)
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}-{len(parts)}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+
+_local_s3 = None
+_s3_lock = threading.Lock()
+
+def s3_client(**config):
+    """
+    boto3's S3 client on the device, with `config` passed to botocore's
+    Config (boto3 is imported here, on first use). One shared LocalS3 in
+    simulation.
+    """
+    global _local_s3
+    if not simulated():
+        import boto3
+        from botocore.config import Config
+        return boto3.client("s3", config=Config(**config) if config else None)
+    with _s3_lock:
+        if _local_s3 is None:
+            _local_s3 = LocalS3(os.environ.get(LOCAL_S3_ENV, LOCAL_S3_DIR))
+    return _local_s3
+
+
+def record(path, seconds, depth=True):
+    """Capture `seconds` of aligned color (+ depth) from the real camera into an .npz for replay."""
+    import numpy as np
+    from frame_broker import get_broker, FPS
+    colors, depths = [], []
+    with get_broker().subscribe("hal-record", depth=depth, buffer=FPS * 2) as sub:
+        end = time.time() + seconds
+        while time.time() < end:
+            packet = sub.get(timeout=1)
+            if packet is None:
+                continue
+            colors.append(packet.color)
+            if depth and packet.depth is not None:
+                depths.append(packet.depth)
+    arrays = {"color": np.stack(colors), "fps": np.array(len(colors) / seconds)}
+    if depths and len(depths) == len(colors):
+        arrays["depth"] = np.stack(depths)
+    np.savez_compressed(path, **arrays)
+    print(f"[HAL] Recorded {len(colors)} frames to {path}")
+
+
+if __name__ == "__main__":
+    # python hal.py record out.npz [seconds]   -> capture a replay file on the Pi
+    # python hal.py s3-reset [dir]             -> empty the local S3 stand-in
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "record":
+        record(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 10)
+    elif command == "s3-reset":
+        root = sys.argv[2] if len(sys.argv) > 2 else LOCAL_S3_DIR
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"[HAL] Cleared {root}")
+    else:
+        print("usage: hal.py record out.npz [seconds] | s3-reset [dir]")
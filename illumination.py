@@ -0,0 +1,182 @@
+import sys
+import threading
+import time
+from metrics import get_metrics
+
+# --- Config ---
+LUX_ON = 40             # ambient below this is dark enough to light the face (old LUX_THRESHOLD)
+LUX_HYSTERESIS = 1.5    # ...and it stays "dark" until ambient rises above LUX_ON x this
+NIGHT_LEVEL = 50        # starting level for an attempt in the dark (old LED_BRIGHTNESS)
+MAX_LEVEL = 160
+RAMP_STEP = 10          # largest level change per tick
+TARGET_BRIGHTNESS = 128 # face-ROI mean gray level the ring steers towards
+DEADBAND = 25           # no change while the face is within this of the target
+TICK = 0.1              # seconds between control steps during an attempt
+LUX_INTERVAL = 0.5      # seconds between VEML7700 reads during an attempt (100 ms integration)
+IDLE_POLL = 5.0         # seconds between ambient reads while idle, so an attempt starts at the right level
+SETTLE = 0.15           # ignore face hints from frames captured this soon after a level change
+ATTEMPT_TIMEOUT = 30    # seconds before a start without a matching end is treated as ended
+
+
+class IlluminationController:
+    """
+    Drives the LED ring from ambient lux and the face-ROI brightness the
+    recognizer publishes (frame_quality exposure hints). The ring is only
+    lit while a recognition attempt is active; between attempts it is off
+    and the light sensor is read every IDLE_POLL.
+
+    During an attempt the level starts at NIGHT_LEVEL when it is dark
+    (LUX_ON / LUX_HYSTERESIS), then ramps by at most RAMP_STEP per tick
+    towards a face brightness of TARGET_BRIGHTNESS ± DEADBAND. A dark
+    face lights the ring even in daylight (backlit), and a blurry face
+    in the dark asks for more light so auto-exposure can shorten. Ambient
+    lux is only sampled while the ring is off, since the ring itself
+    would be measured otherwise. The strip is written only when the
+    level actually changes.
+    """
+
+    def __init__(self, lux_on=LUX_ON, strip=None, sensor=None):
+        self.lux_on = lux_on
+        self.lux_off = lux_on * LUX_HYSTERESIS
+        self._strip = strip
+        self._sensor = sensor
+        self.level = 0
+        self.ambient_lux = None
+        self.dark = False
+        self._active = threading.Event()
+        self._attempt_started = 0.0
+        self._changed_at = 0.0
+        self._last_lux_read = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"attempts": 0, "strip_updates": 0, "lux_reads": 0, "face_steps": 0}
+
+    # --- Attempt signals (recognizer thread) ---
+    def attempt_started(self):
+        if not self._active.is_set():
+            self.stats["attempts"] += 1
+        self._attempt_started = time.time()
+        self._active.set()
+        self._wake.set()
+
+    def attempt_ended(self):
+        self._active.clear()
+        self._wake.set()
+
+    @property
+    def active(self):
+        if self._active.is_set() and time.time() - self._attempt_started > ATTEMPT_TIMEOUT:
+            print("[LIGHT] Attempt never ended; switching the ring off.")
+            self._active.clear()
+        return self._active.is_set()
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="illumination", daemon=True)
+            self._thread.start()
+        return self
+
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._strip is not None:
+            self._set_level(0)
+
+    def snapshot(self):
+        return dict(self.stats, level=self.level, ambient_lux=self.ambient_lux, dark=self.dark,
+                    active=self._active.is_set())
+
+    # --- Control loop ---
+    def _run(self):
+        # Devices are shared with smartdoor (shutdown flash); hints pull in cv2,
+        # so both are loaded on this thread rather than at import
+        from smartdoor import get_neo, get_light_sensor
+        from frame_quality import get_exposure_hints
+        if self._strip is None:
+            self._strip = get_neo()
+        if self._sensor is None:
+            self._sensor = get_light_sensor()
+        hints = get_exposure_hints()
+
+        while not self._stop.is_set():
+            active = self.active
+            now = time.time()
+            if self.level == 0 and now - self._last_lux_read >= (LUX_INTERVAL if active else IDLE_POLL):
+                self._read_ambient(now)
+            self._set_level(self._next_level(hints) if active else 0)
+            self._wake.wait(TICK if active else IDLE_POLL)
+            self._wake.clear()
+
+    def _read_ambient(self, now):
+        try:
+            lux = self._sensor.lux
+        except (OSError, RuntimeError) as e:
+            print(f"[LIGHT] Light sensor read failed: {e}")
+            return
+        self._last_lux_read = now
+        self.stats["lux_reads"] += 1
+        self.ambient_lux = lux
+        if lux < self.lux_on:
+            self.dark = True
+        elif lux > self.lux_off:
+            self.dark = False
+
+    def _next_level(self, hints):
+        hint = hints.latest(max_age=TICK * 5)
+        if hint is None or hint.quality is None or hint.timestamp < self._changed_at + SETTLE:
+            if self.level == 0 and self.dark:
+                return NIGHT_LEVEL      # no face (yet) in the dark: light the porch
+            return self.level
+        quality = hint.quality
+        if quality.brightness < TARGET_BRIGHTNESS - DEADBAND or (self.dark and quality.reason == "Too blurry"):
+            step = RAMP_STEP
+        elif quality.brightness > TARGET_BRIGHTNESS + DEADBAND or quality.reason == "Overexposed":
+            step = -RAMP_STEP
+        else:
+            return self.level
+        self.stats["face_steps"] += 1
+        return max(0, min(MAX_LEVEL, self.level + step))
+
+    def _set_level(self, level):
+        if level == self.level:
+            return
+        self._strip.fill_strip(level, level, level)
+        self._strip.update_strip()
+        self.level = level
+        self._changed_at = time.time()
+        self.stats["strip_updates"] += 1
+        get_metrics().set_gauge("led_level", level)
+
+
+illumination = None
+_illumination_lock = threading.Lock()
+
+def get_illumination(lux_on=None):
+    """The process-wide controller; lux_on only applies when it is first created."""
+    global illumination
+    with _illumination_lock:
+        if illumination is None:
+            illumination = IlluminationController(lux_on=LUX_ON if lux_on is None else lux_on)
+    return illumination
+
+
+if __name__ == "__main__":
+    # python illumination.py [seconds]   -> hold an attempt open and print the controller state
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    controller = get_illumination().start()
+    controller.attempt_started()
+    try:
+        for _ in range(int(seconds)):
+            time.sleep(1)
+            print(controller.snapshot())
+    finally:
+        controller.attempt_ended()
+        controller.stop()
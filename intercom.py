@@ -0,0 +1,211 @@
+import io
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+import av
+import pyaudio
+
+# --- Config ---
+AUDIO_BUCKET = "audioforstream"
+AUDIO_PREFIX = ""
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".3gp", ".m4a", ".aac")
+ACTIVE_POLL_SECONDS = 0.5       # while someone is on the live stream / right after a message
+IDLE_POLL_SECONDS = 5           # nobody watching: list rarely
+ACTIVE_LINGER_SECONDS = 60      # stay fast this long after the last message
+FULL_RESCAN_SECONDS = 60        # catch keys that do not sort after the cursor
+PREFETCH_CLIPS = 2              # downloaded clips waiting to play
+PLAYED_FILE = "/home/pi/smartdoor/intercom_played.json"
+PLAYED_HISTORY = 500
+OUTPUT_RATE = 48000
+OUTPUT_CHANNELS = 2
+OUTPUT_DEVICE_INDEX = None      # PyAudio/ALSA default output
+
+
+class PlayedLog:
+    """Persistent, bounded record of messages already played (key + ETag), so nothing plays twice."""
+
+    def __init__(self, path=PLAYED_FILE, size=PLAYED_HISTORY):
+        self.path = path
+        self.size = size
+        self._ids = OrderedDict()
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._ids = OrderedDict((i, True) for i in json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"[AUDIO] Could not read played log: {e}")
+
+    def __contains__(self, message_id):
+        return message_id in self._ids
+
+    def add(self, message_id):
+        self._ids[message_id] = True
+        while len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(list(self._ids), f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[AUDIO] Could not save played log: {e}")
+
+
+class AudioIntercom:
+    """
+    Plays voice messages dropped into the audio bucket through the door speaker.
+
+    A fetcher thread lists the bucket incrementally, starting after the
+    last key it has seen (StartAfter). It lists every ACTIVE_POLL_SECONDS
+    while a live stream is open or a message arrived recently, and every
+    IDLE_POLL_SECONDS otherwise. It downloads new clips into memory ahead
+    of playback. The player thread decodes each clip in-process with PyAV
+    and writes PCM to one long-lived ALSA output stream, so no player
+    process is spawned per clip. A message is recorded in the played log
+    before its object is deleted, so a crash or a failed delete can never
+    replay it.
+    """
+
+    def __init__(self, client, bucket=AUDIO_BUCKET, prefix=AUDIO_PREFIX, played=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.played = played or PlayedLog()
+        self._clips = queue.Queue(maxsize=PREFETCH_CLIPS)
+        self._queued = set()
+        self._cursor = ""
+        self._last_full_scan = 0
+        self._active_until = 0
+        self._streaming = False
+        self._wake = threading.Event()
+        self._running = False
+        self._threads = {}
+        self._pa = None
+        self._out = None
+        self.stats = {"listings": 0, "empty_listings": 0, "played": 0, "skipped_replays": 0,
+                      "last_latency_seconds": 0.0}
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the fetch/play threads; calling it again restarts any that have died."""
+        self._running = True
+        for name, target in (("intercom-fetch", self._fetch_loop), ("intercom-play", self._play_loop)):
+            if name not in self._threads or not self._threads[name].is_alive():
+                self._threads[name] = threading.Thread(target=target, name=name, daemon=True)
+                self._threads[name].start()
+        print("[AUDIO] Intercom started.")
+
+    def alive(self):
+        return self._running and all(t.is_alive() for t in self._threads.values())
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        self._clips.put(None)
+
+    def set_active(self, streaming):
+        """Poll fast while someone is watching the live stream (they are the ones talking)."""
+        self._streaming = streaming
+        self._wake.set()
+
+    def _interval(self):
+        if self._streaming or time.time() < self._active_until:
+            return ACTIVE_POLL_SECONDS
+        return IDLE_POLL_SECONDS
+
+    # --- Fetching ---
+    def _list_new(self):
+        full = time.time() - self._last_full_scan >= FULL_RESCAN_SECONDS
+        kwargs = {"Bucket": self.bucket, "Prefix": self.prefix}
+        if self._cursor and not full:
+            kwargs["StartAfter"] = self._cursor
+        if full:
+            self._last_full_scan = time.time()
+        keys = []
+        while True:
+            resp = self.client.list_objects_v2(**kwargs)
+            self.stats["listings"] += 1
+            keys.extend(resp.get("Contents", []))
+            if not resp.get("IsTruncated"):
+                break
+            kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+        if not keys:
+            self.stats["empty_listings"] += 1
+        return keys
+
+    def _fetch_loop(self):
+        while self._running:
+            try:
+                for obj in self._list_new():
+                    key = obj["Key"]
+                    self._cursor = max(self._cursor, key)
+                    message_id = f"{key}:{obj.get('ETag', '')}"
+                    if not key.lower().endswith(AUDIO_EXTENSIONS) or message_id in self._queued:
+                        continue
+                    if message_id in self.played:
+                        self.stats["skipped_replays"] += 1
+                        self._delete(key)
+                        continue
+                    body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+                    print(f"[AUDIO] New message {key} ({len(body)} bytes) prefetched.")
+                    self._queued.add(message_id)
+                    self._active_until = time.time() + ACTIVE_LINGER_SECONDS
+                    # Blocks while PREFETCH_CLIPS are already waiting to play
+                    self._clips.put((message_id, key, body, obj.get("LastModified")))
+            except Exception as e:
+                print(f"[AUDIO] Error while listing audio bucket: {e}")
+            self._wake.wait(self._interval())
+            self._wake.clear()
+
+    def _delete(self, key):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            print(f"[AUDIO] Could not delete {key}: {e}")
+
+    # --- Playback ---
+    def _output(self):
+        if self._out is None:
+            self._pa = pyaudio.PyAudio()
+            self._out = self._pa.open(format=pyaudio.paInt16, channels=OUTPUT_CHANNELS, rate=OUTPUT_RATE,
+                                      output=True, output_device_index=OUTPUT_DEVICE_INDEX)
+        return self._out
+
+    def _play_loop(self):
+        while self._running:
+            item = self._clips.get()
+            if item is None:
+                break
+            message_id, key, body, uploaded = item
+            try:
+                if uploaded is not None:
+                    self.stats["last_latency_seconds"] = time.time() - uploaded.timestamp()
+                print(f"[AUDIO] Playing: {key}")
+                self.play(body)
+                self.stats["played"] += 1
+            except Exception as e:
+                print(f"[AUDIO] Failed to play {key}: {e}")
+            # Recorded before the delete: a failed delete must not replay the message
+            self.played.add(message_id)
+            self._queued.discard(message_id)
+            self._delete(key)
+        if self._out is not None:
+            self._out.stop_stream()
+            self._out.close()
+            self._pa.terminate()
+
+    def play(self, data):
+        """Decode any container/codec FFmpeg knows and write it to the speaker as s16 PCM."""
+        out = self._output()
+        resampler = av.AudioResampler(format="s16", layout="stereo" if OUTPUT_CHANNELS == 2 else "mono",
+                                      rate=OUTPUT_RATE)
+        with av.open(io.BytesIO(data)) as container:
+            for frame in container.decode(audio=0):
+                for chunk in resampler.resample(frame):
+                    out.write(chunk.to_ndarray().tobytes())
+            for chunk in resampler.resample(None):
+                out.write(chunk.to_ndarray().tobytes())
@@ -0,0 +1,70 @@
+import sys
+import numpy as np
+
+# --- Config ---
+MESH_POINTS = 468                             # FaceMesh landmarks (478 with refine_landmarks)
+SAMPLE_LANDMARKS = np.arange(0, MESH_POINTS, 2)
+MIN_VALID_POINTS = 40
+MIN_DEPTH_M, MAX_DEPTH_M = 0.2, 2.0           # D455 usable range at the door
+RELIEF_THRESHOLD = 0.03                       # m between nose tip and cheeks (old DEPTH_VARIATION)
+PLANE_RESIDUAL_THRESHOLD = 0.005              # m RMS off the best-fit plane; a photo/screen is ~0
+LIVENESS_THRESHOLD = 0.5
+
+
+def landmark_pixels(landmarks, w, h, indices=SAMPLE_LANDMARKS):
+    """Pixel coordinates of the sampled mesh landmarks as two int arrays."""
+    pts = np.array([(landmarks[i].x, landmarks[i].y) for i in indices if i < len(landmarks)], dtype=np.float32)
+    xs = np.clip((pts[:, 0] * w).astype(np.int32), 0, w - 1)
+    ys = np.clip((pts[:, 1] * h).astype(np.int32), 0, h - 1)
+    return xs, ys
+
+
+def depth_liveness(depth_image, xs, ys, depth_scale=0.001):
+    """
+    Score how much the face region looks like a real 3D face.
+
+    depth_image is the aligned z16 frame as a numpy array and (xs, ys) the
+    sampled landmark pixels. All depths are gathered in one indexing
+    operation. A plane is fitted in inverse depth (which is exactly affine
+    in pixel coordinates for any flat surface, tilted or not), so photos
+    and screens leave almost no residual while a face leaves several mm.
+
+    Returns (confidence in [0, 1], details dict).
+    """
+    z = depth_image[ys, xs].astype(np.float32) * depth_scale
+    valid = (z > MIN_DEPTH_M) & (z < MAX_DEPTH_M)
+    n = int(valid.sum())
+    if n < MIN_VALID_POINTS:
+        return 0.0, {"points": n, "relief_m": 0.0, "residual_m": 0.0}
+
+    z = z[valid]
+    u = xs[valid].astype(np.float32)
+    v = ys[valid].astype(np.float32)
+    A = np.column_stack([u, v, np.ones_like(u)])
+    coef, *_ = np.linalg.lstsq(A, 1.0 / z, rcond=None)
+    plane_z = 1.0 / np.maximum(A @ coef, 1e-6)
+    residual = float(np.sqrt(np.mean((z - plane_z) ** 2)))
+
+    lo, hi = np.percentile(z, [5, 95])
+    relief = float(hi - lo)
+
+    planarity = min(1.0, residual / (2 * PLANE_RESIDUAL_THRESHOLD))
+    depth_relief = min(1.0, relief / (2 * RELIEF_THRESHOLD))
+    confidence = float(np.sqrt(planarity * depth_relief))
+    return confidence, {"points": n, "relief_m": relief, "residual_m": residual}
+
+
+def is_live(depth_image, landmarks, w, h, depth_scale=0.001, threshold=LIVENESS_THRESHOLD):
+    xs, ys = landmark_pixels(landmarks, w, h)
+    confidence, _ = depth_liveness(depth_image, xs, ys, depth_scale)
+    return confidence >= threshold, confidence
+
+
+if __name__ == "__main__":
+    # Score a recorded frame: python liveness.py depth.npy landmarks_px.npy [depth_scale]
+    # landmarks_px.npy holds an (N, 2) array of x, y pixel coordinates.
+    depth = np.load(sys.argv[1])
+    pts = np.load(sys.argv[2]).astype(np.int32)
+    scale = float(sys.argv[3]) if len(sys.argv) > 3 else 0.001
+    confidence, details = depth_liveness(depth, pts[:, 0], pts[:, 1], scale)
+    print(f"[LIVENESS] confidence={confidence:.2f} {details}")
@@ -1,21 +1,14 @@
-import pyrealsense2 as rs
-import numpy as np
 import cv2
-import boto3
 import time
 from datetime import datetime
+from frame_broker import get_broker
+from upload_queue import get_upload_queue, PRIORITY_BUFFER
 
 # AWS S3 Configuration
 S3_BUCKET_NAME = "smartdoorlivefeed"
 
-# Initialize S3 client
-s3_client = boto3.client("s3")
-
-# Configure RealSense pipeline
-pipeline = rs.pipeline()
-config = rs.config()
-config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
-pipeline.start(config)
+# Subscribe to the shared RealSense frame broker
+camera = get_broker().subscribe("livestream", size=(640, 480))
 
 # Define video parameters
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec for MP4
@@ -32,12 +25,11 @@ last_upload_time = time.time()
 
 try:
     while True:
-        frames = pipeline.wait_for_frames()
-        color_frame = frames.get_color_frame()
-        if not color_frame:
+        packet = camera.latest(timeout=1)
+        if packet is None:
             continue
 
-        color_image = np.asanyarray(color_frame.get_data())
+        color_image = packet.color
         out.write(color_image)  # Write frame to video file
 
         # Display live feed (optional)
@@ -49,10 +41,10 @@ try:
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
             s3_filename = f"live_feed_{timestamp}.mp4"
 
-            # Upload the recorded video
-            with open(video_filename, "rb") as video_file:
-                s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=s3_filename, Body=video_file, ContentType="video/mp4")
-                print(f"Uploaded {s3_filename} to S3")
+            # Hand the segment to the upload queue (lowest priority) and keep recording
+            get_upload_queue().enqueue_file(video_filename, S3_BUCKET_NAME, s3_filename,
+                                            PRIORITY_BUFFER, content_type="video/mp4")
+            print(f"Queued {s3_filename} for upload")
 
             # Reset for new recording
             out = cv2.VideoWriter(video_filename, fourcc, fps, frame_size)
@@ -64,5 +56,5 @@ try:
 
 finally:
     out.release()
-    pipeline.stop()
+    camera.close()
     cv2.destroyAllWindows()
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from smartdoor import open_lock, close_lock
+from aws_sync import upload_log_and_status
+
+# --- Config ---
+LAST_OVERRIDE_FILE = "/home/pi/smartdoor/last_override.json"
+
+# --- State ---
+last_override = None    # lock state last driven (True = locked), persisted across restarts
+lock_guard = threading.Lock()
+
+
+def load_last_override():
+    """Restore last_override from the previous run and return it (None if there is nothing saved)."""
+    global last_override
+    last_override = None
+    if os.path.exists(LAST_OVERRIDE_FILE):
+        try:
+            with open(LAST_OVERRIDE_FILE, "r") as f:
+                data = json.load(f)
+                last_override = data.get("last_override")
+        except Exception as e:
+            print(f"[WARN] Could not read last_override file: {e}")
+    return last_override
+
+def save_last_override(value):
+    try:
+        with open(LAST_OVERRIDE_FILE, "w") as f:
+            json.dump({"last_override": value}, f)
+    except Exception as e:
+        print(f"[WARN] Could not save last_override file: {e}")
+
+def apply_override(override, reason):
+    """Drive the lock to the override value."""
+    global last_override
+    if override is None:
+        # Nothing known yet (e.g. booted offline): keep whatever state the lock is in
+        print(f"[OVERRIDE] No override value ({reason}); lock left as is.")
+        return
+    with lock_guard:
+        print(f"[OVERRIDE APPLIED] Reason: {reason}. override={override}, last_override={last_override}")
+        if override:
+            close_lock()
+            upload_log_and_status(f"Lock ON (manual override - {reason})", True)
+        else:
+            open_lock()
+            upload_log_and_status(f"Lock OFF (manual override - {reason})", False)
+        last_override = override
+        save_last_override(last_override)
+
+def apply_face_result(authorized):
+    global last_override
+    with lock_guard:
+        if authorized:
+            open_lock()
+            upload_log_and_status("Lock OFF (face scan)", False)
+        else:
+            close_lock()
+            upload_log_and_status("Lock ON (face scan)", True)
+        last_override = not authorized
+        save_last_override(last_override)
@@ -1,96 +1,149 @@
 # --- main.py ---
-from smartdoor import setup_gpio, open_lock, close_lock, start_flashlight, stop_flashlight, neo
-from aws_sync import fetch_override_status, upload_log_and_status
-from face_rec_aws import face_rec
-from motionSensor import motionStatus
-from awsStream import setup_gpio, start_stream
-from eventRecord import start_recording
-import threading
+# Only what lock and override control need is imported here. The camera,
+# streaming, audio and face-recognition stacks load in the background
+# once the lock is live (see build_controller); `python startup_profile.py`
+# prints the import-time profile of this module.
+import startup_profile
+from startup_profile import mark, timed_import
+from smartdoor import setup_gpio, get_neo
+from illumination import get_illumination
+import lock_actions
+from lock_actions import load_last_override, apply_override, apply_face_result
+from override_channel import OverrideChannel
+from motionSensor import setup_motion_sensor, get_motion_status
+from recognition_scheduler import RecognitionScheduler
+from door_controller import DoorController
+from gpio_bus import get_bus
+from upload_queue import get_upload_queue
+from metrics import get_metrics
+import asyncio
+import sys
 import time
-import RPi.GPIO as GPIO
-import json
+from hal import gpio
 import os
 
-LAST_OVERRIDE_FILE = "/home/pi/smartdoor/last_override.json"
+GPIO = gpio()
 
-def load_last_override():
-    if os.path.exists(LAST_OVERRIDE_FILE):
-        try:
-            with open(LAST_OVERRIDE_FILE, "r") as f:
-                data = json.load(f)
-                return data.get("last_override")
-        except Exception as e:
-            print(f"[WARN] Could not read last_override file: {e}")
-    return None
-
-def save_last_override(value):
-    try:
-        with open(LAST_OVERRIDE_FILE, "w") as f:
-            json.dump({"last_override": value}, f)
-    except Exception as e:
-        print(f"[WARN] Could not save last_override file: {e}")
+OVERRIDE_CHECK_INTERVAL = 3  # seconds before the override is re-applied after a face-scan unlock
 
-def main():
-    setup_gpio()
-    last_override = load_last_override()
-    first_run = True
-    start_flashlight()  # Start once and leave running
+def face_rec(show=True):
+    # Normally already loaded by the warm-up task; on an early attempt this waits for it
+    return timed_import("face_rec_aws").face_rec(show)
 
-    if motionStatus:
-        print("[MOTION] Movement detected.")
-        threading.Thread(target=start_recording, args=(10,), daemon=True).start()
+def aws_stream():
+    return timed_import("awsStream")
 
-    try:
-        while True:
-            override = fetch_override_status()
-
-            if first_run or override != last_override:
-                reason = "initial boot" if first_run else "value changed"
-                print(f"[OVERRIDE APPLIED] Reason: {reason}. override={override}, last_override={last_override}")
-                if override:
-                    close_lock()
-                    upload_log_and_status(f"Lock ON (manual override - {reason})", True)
-                else:
-                    open_lock()
-                    upload_log_and_status(f"Lock OFF (manual override - {reason})", False)
-                last_override = override
-                save_last_override(last_override)
-                first_run = False
+def loaded(name):
+    """The module if something has already imported it, without triggering the import."""
+    return sys.modules.get(name)
+
+def shutdown_flash():
+    # Flash the LED ring briefly to indicate shutdown
+    neo = get_neo()
+    for _ in range(2):
+        neo.fill_strip(0, 0, 255)  # GBR
+        neo.update_strip()
+        time.sleep(0.3)
+        neo.fill_strip(0, 0, 0)
+        neo.update_strip()
+        time.sleep(0.3)
 
+def build_controller():
+    controller = DoorController()
+    actions, post = controller.threadsafe_queue()
+
+    # Pushed override changes and face results land on one queue, so lock
+    # actuation is serialised by the lock task instead of by shared globals
+    overrides = OverrideChannel(on_change=lambda value, source: post(("override", value, "value changed")))
+    scheduler = RecognitionScheduler(face_rec, on_result=lambda authorized: post(("face", authorized)))
+
+    def start_overrides():
+        value = overrides.start()
+        if value is not None:
+            post(("override", value, "channel start"))
+
+    async def lock_task():
+        if lock_actions.last_override is not None and "lock control ready" not in startup_profile.milestones:
+            # Known state from the last run, before the network is even up
+            await controller.run_blocking("lock.override", apply_override, lock_actions.last_override, "restored at boot")
+        mark("lock control ready")
+        while True:
+            try:
+                item = await asyncio.wait_for(actions.get(), OVERRIDE_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                # e.g. back to the override state after a face-scan unlock
+                if overrides.value is not None and overrides.value != lock_actions.last_override:
+                    await controller.run_blocking("lock.override", apply_override, overrides.value, "value changed")
+                continue
+            if item is None:
+                return
+            if item[0] == "override":
+                await controller.run_blocking("lock.override", apply_override, item[1], item[2])
+                mark("override applied")
             else:
-                print("[INFO] No override change. Proceeding with face recognition...")
-                upload_log_and_status("No override change. Using face recognition.", None)
-                try:
-                    if face_rec():
-                        open_lock()
-                        upload_log_and_status("Lock OFF (face scan)", False)
-                        last_override = False
-                        save_last_override(last_override)
-                    else:
-                        close_lock()
-                        upload_log_and_status("Lock ON (face scan)", True)
-                        last_override = True
-                        save_last_override(last_override)
-                except Exception as e:
-                    print(f"[WARNING] face_rec() failed: {e}. Continuing loop.")
-
-            time.sleep(3)
-
-    except KeyboardInterrupt:
-        print("[EXIT] KeyboardInterrupt received. Stopping flashlight and cleaning up GPIO.")
-    finally:
-        stop_flashlight()
-
-        # Flash the LED ring briefly to indicate shutdown
-        for _ in range(2):
-            neo.fill_strip(0, 0, 255)  # GBR
-            neo.update_strip()
-            time.sleep(0.3)
-            neo.fill_strip(0, 0, 0)
-            neo.update_strip()
-            time.sleep(0.3)
-
-        GPIO.cleanup()
+                await controller.run_blocking("lock.face", apply_face_result, item[1])
+
+    async def warmup_task():
+        # Models and the resident recognizer, so the first attempt does not pay for them
+        rec = await controller.run_blocking("load.face_rec_aws", timed_import, "face_rec_aws")
+        await controller.run_blocking("load.recognizer", rec.get_recognizer)
+        mark("recognizer warm")
+
+    async def streaming_task():
+        # Live view only; the motion clip recorder is its own component
+        awsStream = await controller.run_blocking("load.awsStream", aws_stream)
+        awsStream.stop_event.clear()
+        awsStream.streaming_event.set()
+        track = await controller.run_blocking("stream.open", awsStream.RealSenseVideoTrack)
+        awsStream.video_track_instance = track
+        try:
+            await awsStream.stream_offer(track)
+        finally:
+            if track.keep_recording:
+                await controller.run_blocking("stream.close", track.stop)
+            awsStream.video_track_instance = None
+
+    # Lock and override control first; everything heavy loads behind them
+    controller.supervise("lock", lock_task)
+    controller.supervise_component("overrides", start_overrides, overrides.alive, overrides.stop)
+    controller.supervise_component("sensors", lambda: (setup_motion_sensor(), get_bus().start()),
+                                   lambda: get_bus().alive())
+    controller.supervise_component("recognition", scheduler.start, scheduler.alive, scheduler.stop)
+    controller.supervise_component("metrics", get_metrics().start, get_metrics().alive, get_metrics().stop)
+    controller.supervise_component("illumination", get_illumination().start, get_illumination().alive,
+                                   get_illumination().stop)
+    controller.supervise("warmup", warmup_task)
+    controller.supervise_component("recorder", lambda: aws_stream().start_recorder(get_motion_status),
+                                   lambda: aws_stream().recorder_alive(), lambda: aws_stream().stop_recorder())
+    controller.supervise("streaming", streaming_task)
+    controller.supervise_component("audio", lambda: aws_stream().intercom.start(),
+                                   lambda: aws_stream().intercom.alive(), lambda: aws_stream().intercom.stop())
+
+    controller.add_report_source("startup", startup_profile.report)
+    controller.add_report_source("overrides", lambda: overrides.stats)
+    controller.add_report_source("recognition", scheduler.stats)
+    controller.add_report_source("faces", lambda: loaded("face_rec_aws").recognizer.tracks())
+    controller.add_report_source("pipeline", lambda: loaded("face_rec_aws").recognizer.stats())
+    controller.add_report_source("recorder", lambda: loaded("awsStream").recorder.stats)
+    controller.add_report_source("audio", lambda: loaded("awsStream").intercom.stats)
+    controller.add_report_source("illumination", get_illumination().snapshot)
+    controller.add_report_source("gpio", lambda: get_bus().stats)
+    controller.add_report_source("uploads", lambda: get_upload_queue().stats())
+    controller.add_report_source("stages", lambda: get_metrics().snapshot()["stages"])
+
+    # Shutdown: let the stream end cleanly, then release hardware in reverse order
+    controller.on_shutdown(lambda: loaded("awsStream") and loaded("awsStream").stop_streaming())
+    controller.add_cleanup(GPIO.cleanup)
+    controller.add_cleanup(shutdown_flash)
+    return controller
+
+def main():
+    mark("imports done")
+    setup_gpio()
+    load_last_override()
+    # SIGUSR1 prints the task/latency report; SIGINT/SIGTERM shut down in order
+    print(f"[MAIN] Controller PID {os.getpid()} (kill -USR1 {os.getpid()} for a report)")
+    build_controller().run()
 
 if __name__ == "__main__":
     main()
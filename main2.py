@@ -1,82 +1,56 @@
 # --- main.py ---
-from smartdoor import setup_gpio, open_lock, close_lock, start_flashlight, stop_flashlight, neo
-from aws_sync import fetch_override_status, upload_log_and_status
-from face_rec_aws import face_rec
+from smartdoor import setup_gpio, start_flashlight, stop_flashlight, get_neo
+import lock_actions
+from lock_actions import load_last_override, apply_override, apply_face_result
+from override_channel import OverrideChannel
 from motionSensor2 import motionStatus
+from recognition_scheduler import RecognitionScheduler
 import time
-import RPi.GPIO as GPIO
-import json
-import os
+from hal import gpio
 
-LAST_OVERRIDE_FILE = "/home/pi/smartdoor/last_override.json"
+GPIO = gpio()
 
-def load_last_override():
-    if os.path.exists(LAST_OVERRIDE_FILE):
-        try:
-            with open(LAST_OVERRIDE_FILE, "r") as f:
-                data = json.load(f)
-                return data.get("last_override")
-        except Exception as e:
-            print(f"[WARN] Could not read last_override file: {e}")
-    return None
+OVERRIDE_CHECK_INTERVAL = 3  # seconds (an override change wakes the loop early)
 
-def save_last_override(value):
-    try:
-        with open(LAST_OVERRIDE_FILE, "w") as f:
-            json.dump({"last_override": value}, f)
-    except Exception as e:
-        print(f"[WARN] Could not save last_override file: {e}")
+def face_rec(show=True):
+    # face_recognition and mediapipe load with the first attempt, not at start-up
+    from face_rec_aws import face_rec as run_attempt
+    return run_attempt(show)
 
 def main():
     setup_gpio()
-    last_override = load_last_override()
-    first_run = True
+    load_last_override()
     start_flashlight()  # Start once and leave running
 
+    # Pushed override changes are applied immediately, even mid-scan
+    overrides = OverrideChannel(on_change=lambda value, source: apply_override(value, "value changed"))
+    apply_override(overrides.start(), "initial boot")
+
     if motionStatus:
         print("[MOTION] Movement detected.")
 
+    # Face recognition runs only when motion or a face at the door arms it
+    scheduler = RecognitionScheduler(face_rec, on_result=apply_face_result).start()
+
     try:
         while True:
-            override = fetch_override_status()
-
-            if first_run or override != last_override:
-                reason = "initial boot" if first_run else "value changed"
-                print(f"[OVERRIDE APPLIED] Reason: {reason}. override={override}, last_override={last_override}")
-                if override:
-                    close_lock()
-                    upload_log_and_status(f"Lock ON (manual override - {reason})", True)
-                else:
-                    open_lock()
-                    upload_log_and_status(f"Lock OFF (manual override - {reason})", False)
-                last_override = override
-                save_last_override(last_override)
-                first_run = False
+            override = overrides.value
 
-            else:
-                print("[INFO] No override change. Proceeding with face recognition...")
-                upload_log_and_status("No override change. Using face recognition.", None)
-                try:
-                    if face_rec():
-                        open_lock()
-                        upload_log_and_status("Lock OFF (face scan)", False)
-                        last_override = False
-                        save_last_override(last_override)
-                    else:
-                        close_lock()
-                        upload_log_and_status("Lock ON (face scan)", True)
-                        last_override = True
-                        save_last_override(last_override)
-                except Exception as e:
-                    print(f"[WARNING] face_rec() failed: {e}. Continuing loop.")
+            if override != lock_actions.last_override:
+                # e.g. back to the override state after a face-scan unlock
+                apply_override(override, "value changed")
 
-            time.sleep(3)
+            overrides.wait_for_change(OVERRIDE_CHECK_INTERVAL)
 
     except KeyboardInterrupt:
         print("[EXIT] KeyboardInterrupt received. Stopping flashlight and cleaning up GPIO.")
     finally:
+        print(f"[SCHEDULER] {scheduler.stats()}")
+        scheduler.stop()
+        overrides.stop()
         stop_flashlight()
 
+        neo = get_neo()
         # Flash the LED ring briefly to indicate shutdown
         for _ in range(2):
             neo.fill_strip(0, 0, 255)  # GBR
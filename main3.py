@@ -1,97 +1,79 @@
 # --- main.py ---
-from smartdoor import setup_gpio, open_lock, close_lock, start_flashlight, stop_flashlight, neo
-from aws_sync import fetch_override_status, upload_log_and_status
+from smartdoor import setup_gpio, start_flashlight, stop_flashlight, get_neo
+import lock_actions
+from lock_actions import load_last_override, apply_override, apply_face_result
+from override_channel import OverrideChannel
 from motionSensor import setup_motion_sensor, get_motion_status
 from awsStream import start_streaming_thread
+from recognition_scheduler import RecognitionScheduler
+from gpio_bus import get_bus
 import time
-import RPi.GPIO as GPIO
-import json
+from hal import gpio
 import os
-import threading
 
-LAST_OVERRIDE_FILE = "/home/pi/smartdoor/last_override.json"
+GPIO = gpio()
 
-# --- Reboot Button Watchdog Thread ---
+OVERRIDE_CHECK_INTERVAL = 3  # seconds (an override change wakes the loop early)
+
+# --- Reboot Button Watchdog ---
 def start_button_watchdog():
     BUTTON_PIN = 27
     HOLD_TIME = 5  # seconds
 
-    # GPIO is already set in setup_gpio() to PUD_DOWN
-
-    def watchdog_loop():
-        print("[BUTTON] Reboot watchdog running...")
-        try:
-            while True:
-                if GPIO.input(BUTTON_PIN) == GPIO.HIGH:  # ← Button pressed (HIGH)
-                    press_start = time.time()
-                    print("[BUTTON] Detected press.")
-                    while GPIO.input(BUTTON_PIN) == GPIO.HIGH:
-                        time.sleep(0.1)
-                        if time.time() - press_start >= HOLD_TIME:
-                            print("[BUTTON] Reboot triggered!")
-                            os.sync()
-                            os.system("sudo /sbin/reboot -f &")
-                            return
-                time.sleep(0.1)
-        except Exception as e:
-            print(f"[BUTTON] Error: {e}")
-    threading.Thread(target=watchdog_loop, daemon=True).start()
-
-# --- Helpers for manual override ---
-def load_last_override():
-    if os.path.exists(LAST_OVERRIDE_FILE):
-        try:
-            with open(LAST_OVERRIDE_FILE, "r") as f:
-                data = json.load(f)
-                return data.get("last_override")
-        except Exception as e:
-            print(f"[WARN] Could not read last_override file: {e}")
-    return None
-
-def save_last_override(value):
-    try:
-        with open(LAST_OVERRIDE_FILE, "w") as f:
-            json.dump({"last_override": value}, f)
-    except Exception as e:
-        print(f"[WARN] Could not save last_override file: {e}")
+    def on_press(event):
+        if event.level == GPIO.HIGH:  # ← Button pressed (HIGH)
+            print("[BUTTON] Detected press.")
+
+    def on_hold(event):
+        print("[BUTTON] Reboot triggered!")
+        os.sync()
+        os.system("sudo /sbin/reboot -f &")
+
+    # Edge interrupts on the button pin; the hold timer starts at the press edge
+    bus = get_bus()
+    bus.watch(BUTTON_PIN, pull="down")
+    bus.subscribe(BUTTON_PIN, on_press, edge="rising", name="reboot-press")
+    bus.on_hold(BUTTON_PIN, HOLD_TIME, on_hold, name="reboot-watchdog")
+    print("[BUTTON] Reboot watchdog armed.")
 
 # --- Main entrypoint ---
+def face_rec(show=True):
+    # face_recognition and mediapipe load with the first attempt, not at start-up
+    from face_rec_aws import face_rec as run_attempt
+    return run_attempt(show)
+
 def main():
     setup_gpio()                # ✅ Set GPIO mode and input pins
     start_button_watchdog()     # ✅ Start reboot thread after GPIO is ready
     setup_motion_sensor()       # ✅ Start PIR motion monitoring
-    last_override = load_last_override()
-    first_run = True
+    load_last_override()
     start_flashlight()          # ✅ Start ambient light LED controller
 
+    # ✅ Override changes are pushed and applied as they arrive
+    overrides = OverrideChannel(on_change=lambda value, source: apply_override(value, "value changed"))
+    apply_override(overrides.start(), "initial boot")
+
     start_streaming_thread(get_motion_status)  # ✅ Begin RealSense stream + event recorder
 
+    # ✅ Face recognition only when the PIR or a face at the door arms it
+    scheduler = RecognitionScheduler(lambda: face_rec(show=False), on_result=apply_face_result).start()
+
     try:
         while True:
-            override = fetch_override_status()
-
-            if first_run or override != last_override:
-                reason = "initial boot" if first_run else "value changed"
-                print(f"[OVERRIDE APPLIED] Reason: {reason}. override={override}, last_override={last_override}")
-                if override:
-                    close_lock()
-                    upload_log_and_status(f"Lock ON (manual override - {reason})", True)
-                else:
-                    open_lock()
-                    upload_log_and_status(f"Lock OFF (manual override - {reason})", False)
-                last_override = override
-                save_last_override(last_override)
-                first_run = False
-            else:
-                print("[INFO] No override change. Streaming and monitoring...")
-
-            time.sleep(3)
+            override = overrides.wait_for_change(OVERRIDE_CHECK_INTERVAL)
+            if override != lock_actions.last_override:
+                # e.g. back to the override state after a face-scan unlock
+                apply_override(override, "value changed")
 
     except KeyboardInterrupt:
         print("[EXIT] KeyboardInterrupt received. Stopping flashlight and cleaning up GPIO.")
     finally:
+        print(f"[SCHEDULER] {scheduler.stats()}")
+        scheduler.stop()
+        overrides.stop()
         stop_flashlight()
 
+        neo = get_neo()
         # Flash LED ring briefly to indicate shutdown
         for _ in range(2):
             neo.fill_strip(0, 0, 255)
@@ -0,0 +1,228 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Config ---
+METRICS_PORT = 9108
+METRICS_FILE = "/home/pi/smartdoor/metrics.jsonl"
+METRICS_FILE_MAX_BYTES = 5 * 1024 * 1024
+METRICS_FILE_KEEP = 3           # rotated files kept: metrics.jsonl.1 .. .3
+SNAPSHOT_SECONDS = 60
+RECENT_SAMPLES = 512            # per stage, for p50/p95 in snapshots
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PREFIX = "smartdoor"
+
+
+class Histogram:
+    """Cumulative latency histogram (Prometheus buckets) plus a window of recent samples."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(1000 * recent[min(len(recent) - 1, int(p * len(recent)))], 3) if recent else 0.0
+
+        return {"count": self.count, "avg_ms": round(1000 * self.sum / self.count, 3) if self.count else 0.0,
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": round(1000 * self.max, 3)}
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and gauges for the whole door pipeline.
+
+    Hot paths wrap their work in `with timer("stage"):`. That costs two
+    perf_counter() calls and one short lock, so it is cheap enough for
+    per-frame stages. The registry is served as Prometheus text on
+    METRICS_PORT (/metrics), with every stage in one
+    smartdoor_stage_seconds family labelled by stage. A summary with
+    p50/p95 is appended to a size-rotated JSONL file every
+    SNAPSHOT_SECONDS. A slow unlock can then be traced to the camera, the
+    models or S3.
+    """
+
+    def __init__(self, path=METRICS_FILE, port=METRICS_PORT):
+        self.path = path
+        self.port = port
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._gauges = {}
+        self._server = None
+        self._writer = None
+        self._running = False
+        self.started_at = time.time()
+
+    # --- Recording ---
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def wrap(fn):
+            def inner(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            inner.__name__ = fn.__name__
+            inner.__doc__ = fn.__doc__
+            return inner
+        return wrap
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = float(value)
+
+    # --- Export ---
+    def snapshot(self):
+        with self._lock:
+            return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "uptime_seconds": round(time.time() - self.started_at, 1),
+                    "stages": {stage: hist.summary() for stage, hist in sorted(self._stages.items())},
+                    "gauges": dict(self._gauges)}
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        name = f"{PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each door pipeline stage.", f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, hist in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+            for gauge, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {PREFIX}_{gauge} gauge")
+                lines.append(f"{PREFIX}_{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= METRICS_FILE_MAX_BYTES:
+                for i in range(METRICS_FILE_KEEP - 1, 0, -1):
+                    if os.path.exists(f"{self.path}.{i}"):
+                        os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+        except OSError as e:
+            print(f"[METRICS] Could not write snapshot: {e}")
+
+    # --- Lifecycle ---
+    def start(self):
+        """Serve /metrics and start the JSONL writer (restarting either if it has died)."""
+        self._running = True
+        if self._server is None and self.port:
+            try:
+                self._server = ThreadingHTTPServer(("0.0.0.0", self.port), make_metrics_handler(self))
+                self._server.daemon_threads = True
+                threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+                print(f"[METRICS] Serving on :{self.port}/metrics")
+            except OSError as e:
+                print(f"[METRICS] Endpoint unavailable: {e}")
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+            self._writer.start()
+        return self
+
+    def alive(self):
+        return self._running and self._writer is not None and self._writer.is_alive()
+
+    def stop(self):
+        self._running = False
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+        self.write_snapshot()
+
+    def _write_loop(self):
+        while self._running:
+            time.sleep(SNAPSHOT_SECONDS)
+            if self._running:
+                self.write_snapshot()
+
+
+def make_metrics_handler(metrics):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, kind = json.dumps(metrics.snapshot()).encode("utf-8"), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, kind = metrics.render().encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    global metrics
+    with _metrics_lock:
+        if metrics is None:
+            metrics = Metrics()
+    return metrics
+
+def timer(stage):
+    """`with timer("face_encodings"):` on the process-wide registry."""
+    return get_metrics().timer(stage)
+
+
+if __name__ == "__main__":
+    # python metrics.py summary [file]   -> per-stage latency from the latest JSONL snapshot
+    path = sys.argv[2] if len(sys.argv) > 2 else METRICS_FILE
+    with open(path, "r") as f:
+        last = json.loads(f.readlines()[-1])
+    print(f"[METRICS] Snapshot {last['time']} (uptime {last['uptime_seconds']}s)")
+    for stage, s in sorted(last["stages"].items(), key=lambda kv: -kv[1]["p95_ms"]):
+        print(f"  {stage:28s} n={s['count']:<7d} avg={s['avg_ms']:>9.2f}  p50={s['p50_ms']:>9.2f}  "
+              f"p95={s['p95_ms']:>9.2f}  max={s['max_ms']:>9.2f} ms")
+    for gauge, value in sorted(last["gauges"].items()):
+        print(f"  {gauge:28s} {value}")
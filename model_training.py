@@ -1,31 +1,8 @@
-import os
-from imutils import paths
-import face_recognition
-import pickle
-import cv2
-
-print("[INFO] start processing faces...")
-imagePaths = list(paths.list_images("dataset"))
-knownEncodings = []
-knownNames = []
-
-for (i, imagePath) in enumerate(imagePaths):
-    print(f"[INFO] processing image {i + 1}/{len(imagePaths)}")
-    name = imagePath.split(os.path.sep)[-2]
-    
-    image = cv2.imread(imagePath)
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
-    boxes = face_recognition.face_locations(rgb, model="hog")
-    encodings = face_recognition.face_encodings(rgb, boxes)
-    
-    for encoding in encodings:
-        knownEncodings.append(encoding)
-        knownNames.append(name)
-
-print("[INFO] serializing encodings...")
-data = {"encodings": knownEncodings, "names": knownNames}
-with open("encodings.pickle", "wb") as f:
-    f.write(pickle.dumps(data))
-
-print("[INFO] Training complete. Encodings saved to 'encodings.pickle'")
\ No newline at end of file
+from encoding_store import EncodingStore, STORE_FILE
+from enroll_engine import enroll_images, dataset_images
+
+if __name__ == "__main__":
+    print("[INFO] start processing faces...")
+    images = dataset_images("dataset")
+    added = enroll_images(images, EncodingStore(STORE_FILE))
+    print(f"[INFO] Training complete. {added} new encodings saved to '{STORE_FILE}'")
@@ -1,25 +1,24 @@
-import RPi.GPIO as GPIO
-import threading
-import time
+from gpio_bus import get_bus, HIGH
 
 PIR_PIN = 22
 motionStatus = False
-lock = threading.Lock()
+_status_token = None
 
-def setup_motion_sensor():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(PIR_PIN, GPIO.IN)
+def _on_motion_edge(event):
+    global motionStatus
+    motionStatus = event.level == HIGH
 
-    def _watch_motion():
-        global motionStatus
-        while True:
-            with lock:
-                motionStatus = GPIO.input(PIR_PIN)
-            time.sleep(0.1)
+def setup_motion_sensor():
+    # Edge interrupts on the PIR pin instead of a 100 ms polling thread
+    global _status_token
+    bus = get_bus()
+    bus.watch(PIR_PIN, pull=None)
+    if _status_token is None:
+        _status_token = bus.subscribe(PIR_PIN, _on_motion_edge, name="motion-status")
 
-    _thread = threading.Thread(target=_watch_motion, daemon=True)
-    _thread.start()
+def on_motion(fn):
+    """Call fn(event) on every PIR rising edge, timestamped at the interrupt."""
+    return get_bus().subscribe(PIR_PIN, fn, edge="rising", name=getattr(fn, "__name__", "motion"))
 
 def get_motion_status():
-    with lock:
-        return motionStatus
+    return get_bus().level(PIR_PIN) == HIGH
@@ -1,18 +1,13 @@
-import RPi.GPIO as GPIO
-import threading
-import time
+from gpio_bus import get_bus, HIGH
 
-GPIO.setmode(GPIO.BCM)
 PIR_PIN = 22
-GPIO.setup(PIR_PIN, GPIO.IN)
 
-motionStatus = False  # This gets updated continuously
+motionStatus = False  # Updated from PIR edge interrupts
 
-def _watch_motion():
+def _on_motion_edge(event):
     global motionStatus
-    while True:
-        motionStatus = GPIO.input(PIR_PIN)
-        time.sleep(0.1)
+    motionStatus = event.level == HIGH
 
-_thread = threading.Thread(target=_watch_motion, daemon=True)
-_thread.start()
\ No newline at end of file
+bus = get_bus()
+bus.watch(PIR_PIN, pull=None)
+bus.subscribe(PIR_PIN, _on_motion_edge, name="motion-status")
\ No newline at end of file
@@ -0,0 +1,301 @@
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hal import s3_client
+
+# --- Config ---
+S3_BUCKET_NAME = "doorinfo"
+OVERRIDE_FILE = "door_override.json"
+# Push endpoint speaking the stand-in protocol below (GET <url> as server-sent
+# events). The signaling server does not serve one, so none is configured and
+# conditional S3 polling is the path in use; point this at a deployed stand-in
+# (python override_channel.py serve) to get pushed changes.
+OVERRIDE_STREAM_URL = None
+STREAM_READ_TIMEOUT = 30        # seconds without data (incl. heartbeats) before reconnecting
+STREAM_RETRY_SECONDS = 30       # how long to fall back to polling before retrying the stream
+POLL_MIN_SECONDS = 0.5          # polling interval right after a change or reconnect
+POLL_MAX_SECONDS = 3            # backs off to the old fixed 3 s poll while nothing changes
+HEARTBEAT_SECONDS = 10          # stand-in server keepalive
+STANDIN_PORT = 8090
+
+
+def parse_override(data):
+    """Both override file layouts seen in the field: {"door_override": ...} and {"override": ...}."""
+    value = data.get("door_override", data.get("override"))
+    return None if value is None else bool(value)
+
+
+class OverrideChannel:
+    """
+    Delivers door override changes to the lock controller.
+
+    Without a stream_url (the default, see OVERRIDE_STREAM_URL) the channel
+    polls door_override.json with conditional GETs (If-None-Match), so an
+    unchanged file costs only a 304. The poll interval starts at
+    POLL_MIN_SECONDS and doubles to POLL_MAX_SECONDS while nothing changes.
+
+    Given a stream_url, a server-sent event stream is the primary channel
+    and a change arrives as soon as the server pushes it. Polling is then
+    the fallback while the stream is down, and every STREAM_RETRY_SECONDS
+    the channel tries the stream again.
+
+    on_change(value, source) runs on the channel thread. wait_for_change()
+    lets a control loop sleep until the next change instead of a fixed delay.
+    """
+
+    def __init__(self, on_change=None, stream_url=OVERRIDE_STREAM_URL, poll_url=None,
+                 bucket=S3_BUCKET_NAME, key=OVERRIDE_FILE, client=None):
+        self.on_change = on_change
+        self.stream_url = stream_url
+        self.poll_url = poll_url            # HTTP fallback (stand-in server); S3 when None
+        self.bucket = bucket
+        self.key = key
+        self.client = client            # S3 fallback client, created on the first S3 poll
+        self.value = None
+        self.source = None
+        self.changed_at = None
+        self._etag = None
+        self._cond = threading.Condition()
+        self._version = 0
+        self._running = False
+        self._thread = None
+        self.stats = {"pushes": 0, "polls": 0, "not_modified": 0, "changes": 0,
+                      "stream_connects": 0, "stream_failures": 0}
+
+    # --- Lifecycle ---
+    def start(self, timeout=5):
+        """Start the channel and return the first known value (None if none arrived in time)."""
+        self._running = True
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="override-channel", daemon=True)
+            self._thread.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._version > 0, timeout)
+            return self.value
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def alive(self):
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def wait_for_change(self, timeout=None):
+        """Block until the override changes (or timeout); returns the current value."""
+        with self._cond:
+            seen = self._version
+            self._cond.wait_for(lambda: self._version != seen or not self._running, timeout)
+            return self.value
+
+    # --- Delivery ---
+    def _set(self, value, source):
+        if value is None:
+            return
+        with self._cond:
+            first = self._version == 0
+            changed = value != self.value
+            if changed or first:
+                self.value = value
+                self.source = source
+                self.changed_at = time.time()
+                self._version += 1
+                self._cond.notify_all()
+        if changed and not first:
+            self.stats["changes"] += 1
+            print(f"[OVERRIDE] {value} via {source}")
+            if self.on_change:
+                try:
+                    self.on_change(value, source)
+                except Exception as e:
+                    print(f"[OVERRIDE] on_change failed: {e}")
+
+    def _run(self):
+        while self._running:
+            if self.stream_url:
+                self._stream()
+            # Stream unavailable or dropped: poll until it is worth retrying
+            deadline = time.time() + STREAM_RETRY_SECONDS if self.stream_url else float("inf")
+            interval = POLL_MIN_SECONDS
+            while self._running and time.time() < deadline:
+                try:
+                    changed = self._poll_once()
+                    interval = POLL_MIN_SECONDS if changed else min(interval * 2, POLL_MAX_SECONDS)
+                except Exception as e:
+                    print(f"[OVERRIDE] Poll failed: {e}")
+                    interval = min(interval * 2, POLL_MAX_SECONDS)
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running, interval)
+
+    def _stream(self):
+        try:
+            req = urllib.request.Request(self.stream_url, headers={"Accept": "text/event-stream"})
+            with urllib.request.urlopen(req, timeout=STREAM_READ_TIMEOUT) as resp:
+                self.stats["stream_connects"] += 1
+                print(f"[OVERRIDE] Push stream connected: {self.stream_url}")
+                # Catch anything that changed while we were disconnected
+                self._poll_once()
+                for raw in resp:
+                    if not self._running:
+                        return
+                    line = raw.decode("utf-8").strip()
+                    if line.startswith("data:"):
+                        self.stats["pushes"] += 1
+                        self._set(parse_override(json.loads(line[5:])), "push")
+        except Exception as e:
+            self.stats["stream_failures"] += 1
+            print(f"[OVERRIDE] Push stream unavailable, falling back to polling: {e}")
+
+    def _poll_once(self):
+        """One conditional GET; True when the override changed."""
+        self.stats["polls"] += 1
+        before = self.value
+        data = self._poll_http() if self.poll_url else self._poll_s3()
+        if data is None:
+            self.stats["not_modified"] += 1
+            return False
+        self._set(parse_override(data), "poll")
+        return self.value != before
+
+    def _poll_s3(self):
+        from botocore.exceptions import ClientError
+        if self.client is None:
+            self.client = s3_client(signature_version="s3v4")
+        kwargs = {"IfNoneMatch": self._etag} if self._etag else {}
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=self.key, **kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+                return None
+            raise
+        self._etag = resp.get("ETag")
+        return json.loads(resp["Body"].read().decode("utf-8"))
+
+    def _poll_http(self):
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.poll_url, headers=headers),
+                                        timeout=POLL_MAX_SECONDS) as resp:
+                self._etag = resp.headers.get("ETag")
+                return json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+
+
+# --- Local stand-in server ---
+class StandInState:
+    def __init__(self, value=True):
+        self.value = value
+        self.version = 1
+        self.cond = threading.Condition()
+
+    def set(self, value):
+        with self.cond:
+            self.value = bool(value)
+            self.version += 1
+            self.cond.notify_all()
+
+    def body(self):
+        return json.dumps({"door_override": self.value}).encode("utf-8")
+
+
+def make_standin_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.endswith("/stream"):
+                return self._stream()
+            etag = f'"{state.version}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = state.body()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            state.set(parse_override(data))
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        do_PUT = do_POST
+
+        def _stream(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            seen = None
+            try:
+                while True:
+                    with state.cond:
+                        state.cond.wait_for(lambda: state.version != seen, HEARTBEAT_SECONDS)
+                        changed, seen = state.version != seen, state.version
+                        body = state.body()
+                    self.wfile.write(b"data: " + body + b"\n\n" if changed else b": ping\n\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def serve_standin(port=STANDIN_PORT, value=True):
+    """Run the stand-in on a background thread; returns (server, state)."""
+    state = StandInState(value)
+    server = ThreadingHTTPServer(("0.0.0.0", port), make_standin_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    # python override_channel.py serve [port]          -> local stand-in endpoint
+    # python override_channel.py latency [port] [n]    -> measure push delivery against it
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else STANDIN_PORT
+    if command == "serve":
+        server, _ = serve_standin(port)
+        print(f"[OVERRIDE] Stand-in on :{port}  (GET /override, GET /override/stream, POST /override)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        server, state = serve_standin(port)
+        base = f"http://127.0.0.1:{port}/override"
+        channel = OverrideChannel(stream_url=base + "/stream", poll_url=base)
+        channel.start()
+        delays = []
+        for i in range(rounds):
+            sent = time.time()
+            state.set(not channel.value)
+            channel.wait_for_change(timeout=2)
+            delays.append((channel.changed_at - sent) * 1000)
+            time.sleep(0.05)
+        delays.sort()
+        print(f"[OVERRIDE] push delivery over {rounds} changes: "
+              f"median {delays[len(delays) // 2]:.1f} ms, max {delays[-1]:.1f} ms")
+        channel.stop()
+        server.shutdown()
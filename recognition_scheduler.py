@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+from gpio_bus import get_bus
+
+# --- Config ---
+PIR_PIN = 22
+ARM_SECONDS = 10                # a trigger keeps recognition armed this long
+ATTEMPT_COOLDOWN = 5            # seconds between the end of one attempt and the next
+MAX_ATTEMPTS_PER_MINUTE = 6
+PRESENCE_FPS = 2                # face-mesh presence probe rate in standby
+PRESENCE_SIZE = (320, 240)
+PRESENCE_HOLDOFF = 30           # ignore presence this long after a successful attempt
+
+
+class RecognitionScheduler:
+    """
+    Runs face recognition only when someone is plausibly at the door.
+
+    A PIR rising edge, or a face found by the low-rate face-mesh presence
+    probe, arms the scheduler for ARM_SECONDS. While it is armed, attempts
+    run back to back. Two limits apply: ATTEMPT_COOLDOWN seconds must pass
+    after each attempt, and at most MAX_ATTEMPTS_PER_MINUTE may start in
+    any 60 s window. A successful attempt disarms it until the next
+    trigger. Otherwise the only camera consumer is the presence probe,
+    which subscribes at PRESENCE_FPS without depth. That lets the frame
+    broker drop the camera to its standby profile. stats() reports how much
+    of the time recognition actually ran.
+    """
+
+    def __init__(self, attempt_fn, on_result=None, pir_pin=PIR_PIN, presence=True):
+        self.attempt_fn = attempt_fn
+        self.on_result = on_result
+        self.pir_pin = pir_pin
+        self.presence = presence
+        self._armed_until = 0.0
+        self._last_attempt_end = 0.0
+        self._presence_after = 0.0
+        self._recent_starts = deque()
+        self._wake = threading.Event()
+        self._running = False
+        self._probe = None
+        self._threads = {}
+        self._pir_token = None
+        self._started_at = None
+        self.stats_counters = {"attempts": 0, "authorized": 0, "triggers_motion": 0, "triggers_presence": 0,
+                               "deferred_cooldown": 0, "deferred_rate": 0, "attempt_seconds": 0.0,
+                               "last_trigger_latency": 0.0}
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the scheduler; calling it again restarts any thread that has died."""
+        self._running = True
+        self._started_at = self._started_at or time.time()
+        if self.pir_pin is not None and self._pir_token is None:
+            bus = get_bus()
+            bus.watch(self.pir_pin, pull=None)
+            self._pir_token = bus.subscribe(self.pir_pin, lambda event: self.trigger("motion", event.timestamp),
+                                            edge="rising", name="recognition-scheduler")
+        targets = [("recognition-scheduler", self._run)]
+        if self.presence:
+            targets.append(("presence-probe", self._presence_loop))
+        for name, fn in targets:
+            if name not in self._threads or not self._threads[name].is_alive():
+                self._threads[name] = threading.Thread(target=fn, name=name, daemon=True)
+                self._threads[name].start()
+        print("[SCHEDULER] Recognition scheduler armed on motion"
+              f"{' and face presence' if self.presence else ''}.")
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._pir_token is not None:
+            get_bus().unsubscribe(self._pir_token)
+            self._pir_token = None
+
+    def alive(self):
+        return self._running and all(t.is_alive() for t in self._threads.values())
+
+    # --- Triggers ---
+    def trigger(self, source="manual", timestamp=None):
+        now = time.time()
+        if now >= self._armed_until:
+            print(f"[SCHEDULER] Armed by {source}.")
+            if timestamp is not None:
+                self.stats_counters["last_trigger_latency"] = now - timestamp
+        self._armed_until = now + ARM_SECONDS
+        key = f"triggers_{source}"
+        if key in self.stats_counters:
+            self.stats_counters[key] += 1
+        self._wake.set()
+
+    @property
+    def armed(self):
+        return time.time() < self._armed_until
+
+    def _presence_loop(self):
+        """Cheap standby probe: one small face-mesh pass every 1/PRESENCE_FPS seconds."""
+        # Loaded on this thread so the scheduler can arm on motion before mediapipe is up
+        import mediapipe as mp
+        from frame_broker import get_broker
+        mesh = mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1,
+                                               refine_landmarks=False, min_detection_confidence=0.5)
+        self._probe = get_broker().subscribe("presence", size=PRESENCE_SIZE, fmt="rgb",
+                                             buffer=1, max_fps=PRESENCE_FPS)
+        try:
+            while self._running:
+                if self.armed or time.time() < self._presence_after:
+                    # Recognition owns the camera (or the visitor was just let in)
+                    self._probe.pause()
+                    time.sleep(0.5)
+                    continue
+                self._probe.resume()
+                packet = self._probe.latest(timeout=1)
+                if packet is not None and mesh.process(packet.color).multi_face_landmarks:
+                    self.trigger("presence", packet.timestamp)
+        finally:
+            mesh.close()
+            self._probe.close()
+
+    # --- Attempts ---
+    def _next_slot(self):
+        """Seconds until an attempt may start (0 = now)."""
+        now = time.time()
+        while self._recent_starts and now - self._recent_starts[0] > 60:
+            self._recent_starts.popleft()
+        cooldown = self._last_attempt_end + ATTEMPT_COOLDOWN - now
+        if cooldown > 0:
+            self.stats_counters["deferred_cooldown"] += 1
+            return cooldown
+        if len(self._recent_starts) >= MAX_ATTEMPTS_PER_MINUTE:
+            self.stats_counters["deferred_rate"] += 1
+            return self._recent_starts[0] + 60 - now
+        return 0
+
+    def _run(self):
+        while self._running:
+            if not self.armed:
+                self._wake.wait()   # standby: nothing to do until a trigger
+                self._wake.clear()
+                continue
+            wait = self._next_slot()
+            if wait > 0:
+                self._wake.wait(min(wait, max(0.1, self._armed_until - time.time())))
+                self._wake.clear()
+                continue
+
+            start = time.time()
+            self._recent_starts.append(start)
+            self.stats_counters["attempts"] += 1
+            try:
+                authorized = bool(self.attempt_fn())
+            except Exception as e:
+                print(f"[SCHEDULER] Recognition attempt failed: {e}")
+                authorized = None
+            self._last_attempt_end = time.time()
+            self.stats_counters["attempt_seconds"] += self._last_attempt_end - start
+
+            if authorized is None:
+                continue
+            if authorized:
+                self.stats_counters["authorized"] += 1
+                self._armed_until = 0.0     # door is open; wait for the next arrival
+                self._presence_after = time.time() + PRESENCE_HOLDOFF
+            if self.on_result:
+                try:
+                    self.on_result(authorized)
+                except Exception as e:
+                    print(f"[SCHEDULER] on_result failed: {e}")
+
+    # --- Metrics ---
+    def stats(self):
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        attempt_seconds = self.stats_counters["attempt_seconds"]
+        return dict(self.stats_counters, uptime_seconds=elapsed, armed=self.armed,
+                    duty_cycle=attempt_seconds / elapsed if elapsed else 0.0,
+                    standby_seconds=elapsed - attempt_seconds)
@@ -0,0 +1,198 @@
+import glob
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from metrics import timer
+
+# --- Config ---
+PART_SIZE = 5 * 1024 * 1024             # S3 minimum for every part except the last
+SPOOL_DIR = "/home/pi/smartdoor/upload_spool"
+MAX_SPOOLED_PARTS = 4                   # bounds local disk use to ~20 MB per upload
+JOURNAL_FILE = "journal.json"
+PART_RETRIES = 3                        # attempts per part before the rest of the upload waits for resume_pending
+PART_RETRY_SECONDS = 1                  # first retry delay, doubled per attempt
+
+# Spool directories of sinks still open in this process; resume_pending leaves them alone
+_open_dirs = set()
+_open_lock = threading.Lock()
+
+
+def _fsync_write(path, data, mode="wb"):
+    tmp = path + ".tmp"
+    with open(tmp, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class MultipartUploadSink:
+    """
+    Write-only file object that streams into an S3 multipart upload while
+    the clip is still being recorded (PyAV writes fragmented MP4 into it).
+
+    Every PART_SIZE bytes are spooled to disk and uploaded as one part by a
+    background thread; the part file is deleted once S3 acknowledges it.
+    A journal (upload id, key, acknowledged ETags) is fsynced after each
+    part, so resume_pending() can finish the upload after a crash or reboot.
+    At most MAX_SPOOLED_PARTS parts wait on disk; beyond that write()
+    blocks until the network catches up.
+
+    A part that still fails after PART_RETRIES attempts marks the sink
+    failed. write() keeps accepting data, and the remaining parts are only
+    spooled, so the recording is never cut short. close() then leaves the
+    journal for resume_pending() instead of completing the upload.
+    """
+
+    def __init__(self, s3, bucket, key, spool_dir=None, content_type="video/mp4"):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        resp = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        self.upload_id = resp["UploadId"]
+        self.dir = os.path.join(spool_dir or SPOOL_DIR, hashlib.sha1(self.upload_id.encode()).hexdigest()[:16])
+        os.makedirs(self.dir, exist_ok=True)
+        with _open_lock:
+            _open_dirs.add(self.dir)
+        self.journal = {"bucket": bucket, "key": key, "upload_id": self.upload_id,
+                        "parts": [], "closed": False}
+        self._save_journal()
+
+        self._buf = bytearray()
+        self._next_part = 1
+        self._pending = queue.Queue(maxsize=MAX_SPOOLED_PARTS)
+        self._error = None
+        self.bytes_written = 0
+        self.closed = False
+        self._uploader = threading.Thread(target=self._upload_loop, daemon=True)
+        self._uploader.start()
+
+    # --- File object interface (what PyAV needs) ---
+    def write(self, data):
+        self._buf += data
+        self.bytes_written += len(data)
+        while len(self._buf) >= PART_SIZE:
+            self._spool_part(bytes(self._buf[:PART_SIZE]))
+            del self._buf[:PART_SIZE]
+        return len(data)
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
+
+    # --- Parts ---
+    def _save_journal(self):
+        _fsync_write(os.path.join(self.dir, JOURNAL_FILE), json.dumps(self.journal).encode())
+
+    def _spool_part(self, data):
+        number = self._next_part
+        self._next_part += 1
+        path = os.path.join(self.dir, f"part-{number:05d}")
+        _fsync_write(path, data)
+        self._pending.put((number, path))     # blocks while too many parts are waiting
+
+    @property
+    def failed(self):
+        return self._error is not None
+
+    def _upload_loop(self):
+        while True:
+            job = self._pending.get()
+            if job is None:
+                return
+            if self._error is not None:
+                continue        # offline: the part stays in the spool for resume_pending
+            number, path = job
+            for attempt in range(PART_RETRIES):
+                try:
+                    upload_part(self.s3, self.journal, number, path)
+                    self._save_journal()
+                    break
+                except Exception as e:
+                    print(f"[UPLOAD] Part {number} of {self.key} failed (attempt {attempt + 1}): {e}")
+                    if attempt + 1 == PART_RETRIES:
+                        print(f"[UPLOAD] Spooling the rest of {self.key} for a later resume.")
+                        self._error = e
+                    else:
+                        time.sleep(PART_RETRY_SECONDS * 2 ** attempt)
+
+    def close(self):
+        """Upload the tail as the last part and complete the upload (or leave it for resume_pending)."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._buf or self._next_part == 1:
+                self._spool_part(bytes(self._buf))
+                self._buf.clear()
+            self.journal["closed"] = True
+            self._pending.put(None)
+            self._uploader.join()
+            self._save_journal()
+            if self._error is None:
+                complete_upload(self.s3, self.journal, self.dir)
+        finally:
+            with _open_lock:
+                _open_dirs.discard(self.dir)
+
+
+def upload_part(s3, journal, number, path):
+    with open(path, "rb") as f, timer("s3_upload_part"):
+        resp = s3.upload_part(Bucket=journal["bucket"], Key=journal["key"], UploadId=journal["upload_id"],
+                              PartNumber=number, Body=f.read())
+    journal["parts"].append({"PartNumber": number, "ETag": resp["ETag"]})
+    os.remove(path)
+
+
+def complete_upload(s3, journal, spool_dir):
+    parts = sorted(journal["parts"], key=lambda p: p["PartNumber"])
+    if parts:
+        s3.complete_multipart_upload(Bucket=journal["bucket"], Key=journal["key"],
+                                     UploadId=journal["upload_id"], MultipartUpload={"Parts": parts})
+        print(f"[UPLOAD] Completed s3://{journal['bucket']}/{journal['key']} ({len(parts)} parts)")
+    else:
+        s3.abort_multipart_upload(Bucket=journal["bucket"], Key=journal["key"], UploadId=journal["upload_id"])
+    for f in glob.glob(os.path.join(spool_dir, "*")):
+        os.remove(f)
+    os.rmdir(spool_dir)
+
+
+def resume_pending(s3, spool_dir=None):
+    """
+    Finish uploads interrupted by a crash or reboot: push any spooled parts
+    S3 has not acknowledged, then complete the upload with what was
+    recorded (a fragmented MP4 cut short is still playable). Uploads of
+    sinks still open in this process are skipped. Returns the number of
+    uploads that are still pending.
+    """
+    pending = 0
+    for journal_path in glob.glob(os.path.join(spool_dir or SPOOL_DIR, "*", JOURNAL_FILE)):
+        upload_dir = os.path.dirname(journal_path)
+        with _open_lock:
+            if upload_dir in _open_dirs:
+                continue
+        try:
+            with open(journal_path, "r") as f:
+                journal = json.load(f)
+            done = {p["PartNumber"] for p in journal["parts"]}
+            for path in sorted(glob.glob(os.path.join(upload_dir, "part-*"))):
+                if path.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                number = int(os.path.basename(path).split("-")[1])
+                if number in done:
+                    os.remove(path)
+                    continue
+                upload_part(s3, journal, number, path)
+                _fsync_write(journal_path, json.dumps(journal).encode())
+            print(f"[UPLOAD] Resuming interrupted upload of {journal['key']}")
+            complete_upload(s3, journal, upload_dir)
+        except Exception as e:
+            pending += 1
+            print(f"[UPLOAD] Could not resume {upload_dir}: {e}")
+    return pending
@@ -1,26 +1,34 @@
-import time
-import board
-import busio
 import threading
-import RPi.GPIO as GPIO
-from adafruit_veml7700 import VEML7700
-from pi5neo import Pi5Neo
+from gpio_bus import get_bus
+from illumination import get_illumination
+import hal
 
 LUX_THRESHOLD = 40
 RELAY_PIN = 17
-LED_BRIGHTNESS = 50
 
-neo = Pi5Neo('/dev/spidev0.0', 1000, 800)
-neo.fill_strip(0, 0, 0)
-neo.update_strip()
+GPIO = hal.gpio()
 
-i2c = busio.I2C(board.SCL, board.SDA)
-veml7700 = VEML7700(i2c, address=0x10)
-veml7700.light_gain = 1
-veml7700.integration_time = 100
+# SPI and I2C are opened on first use, not at import, so the relay is
+# usable before the LED ring and light sensor have been brought up
+neo = None
+veml7700 = None
+_devices_lock = threading.Lock()
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(RELAY_PIN, GPIO.OUT)
+def get_neo():
+    global neo
+    with _devices_lock:
+        if neo is None:
+            neo = hal.led_strip('/dev/spidev0.0', 1000, 800)
+            neo.fill_strip(0, 0, 0)
+            neo.update_strip()
+    return neo
+
+def get_light_sensor():
+    global veml7700
+    with _devices_lock:
+        if veml7700 is None:
+            veml7700 = hal.light_sensor()
+    return veml7700
 
 def setup_gpio():
     GPIO.setmode(GPIO.BCM)
@@ -29,41 +37,18 @@ def setup_gpio():
 
 def open_lock():
     GPIO.output(RELAY_PIN, GPIO.LOW)
+    get_bus().record_output(RELAY_PIN, GPIO.LOW)
     print("Lock OPEN")
 
 def close_lock():
     GPIO.output(RELAY_PIN, GPIO.HIGH)
+    get_bus().record_output(RELAY_PIN, GPIO.HIGH)
     print("Lock CLOSED")
 
-flashlight_active = False
-flashlight_thread = None
-
-def flashlight_loop(threshold=LUX_THRESHOLD):
-    global flashlight_active
-    leds_on = False
-
-    while flashlight_active:
-        lux = veml7700.lux
-        if lux < threshold and not leds_on:
-            neo.fill_strip(LED_BRIGHTNESS, LED_BRIGHTNESS, LED_BRIGHTNESS)
-            neo.update_strip()
-            leds_on = True
-        elif lux >= threshold and leds_on:
-            neo.fill_strip(0, 0, 0)
-            neo.update_strip()
-            leds_on = False
-        time.sleep(0.5)
-
+# The LED ring is driven by the illumination controller, which only lights
+# it during recognition attempts; these keep the old entry points
 def start_flashlight(threshold=LUX_THRESHOLD):
-    global flashlight_active, flashlight_thread
-    flashlight_active = True
-    flashlight_thread = threading.Thread(target=flashlight_loop, args=(threshold,))
-    flashlight_thread.start()
+    return get_illumination(threshold).start()
 
 def stop_flashlight():
-    global flashlight_active, flashlight_thread
-    flashlight_active = False
-    if flashlight_thread:
-        flashlight_thread.join()
-    neo.fill_strip(0, 0, 0)
-    neo.update_strip()
+    get_illumination().stop()
@@ -1,30 +1,22 @@
-import pyrealsense2 as rs
-import numpy as np
 import cv2
-import boto3
 import time
 from datetime import datetime
+from frame_broker import get_broker
+from upload_queue import get_upload_queue, PRIORITY_BUFFER
 
 # AWS S3 Configuration
 S3_BUCKET_NAME = "smartdoorlivefeed"
 
-# Initialize S3 client
-s3_client = boto3.client("s3")
-
-# Configure RealSense pipeline
-pipeline = rs.pipeline()
-config = rs.config()
-config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
-pipeline.start(config)
+# Subscribe to the shared RealSense frame broker
+camera = get_broker().subscribe("snapshots", size=(640, 480))
 
 try:
     while True:
-        frames = pipeline.wait_for_frames()
-        color_frame = frames.get_color_frame()
-        if not color_frame:
+        packet = camera.latest(timeout=1)
+        if packet is None:
             continue
 
-        color_image = np.asanyarray(color_frame.get_data())
+        color_image = packet.color
 
         # Convert to JPEG format
         _, buffer = cv2.imencode(".jpg", color_image)
@@ -33,9 +25,10 @@ try:
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S%f")[:-3]  # Include milliseconds
         filename = f"frame_{timestamp}.jpg"
 
-        # Upload to S3
-        s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=filename, Body=buffer.tobytes(), ContentType="image/jpeg")
-        print(f"Uploaded {filename} to S3")
+        # Queue for upload (lowest priority) so a slow network never stalls capture
+        get_upload_queue().enqueue_bytes(S3_BUCKET_NAME, filename, buffer.tobytes(), PRIORITY_BUFFER,
+                                         content_type="image/jpeg")
+        print(f"Queued {filename} for upload")
 
         # Display the live feed
         cv2.imshow("RealSense D455 Live Feed", color_image)
@@ -48,5 +41,5 @@ try:
             break
 
 finally:
-    pipeline.stop()
+    camera.close()
     cv2.destroyAllWindows()
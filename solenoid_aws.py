@@ -1,22 +1,16 @@
 import RPi.GPIO as GPIO
-import time
-import boto3
 import json
 from datetime import datetime
-from botocore.exceptions import ClientError
-from botocore.config import Config
+from upload_queue import get_upload_queue, PRIORITY_LOCK_STATUS
+from access_log import get_access_log
+from override_channel import OverrideChannel
 
 # GPIO Pin for the relay
 RELAY_PIN = 17
 
 # AWS S3 Configuration
 S3_BUCKET_NAME = "doorinfo"
-OVERRIDE_FILE = "door_override.json"
 STATUS_FILE = "door_status.json"
-LOG_FILE = "door_log.txt"
-
-# S3 Client (with config to reduce caching issues)
-s3_client = boto3.client("s3", config=Config(signature_version='s3v4'))
 
 def upload_log_and_status(action, lock_status):
     """
@@ -30,20 +24,9 @@ def upload_log_and_status(action, lock_status):
     print(f"[DEBUG] Lock status: {lock_status}")
     print(f"[DEBUG] Timestamp: {timestamp}")
 
-    # Fetch current log
-    try:
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=LOG_FILE)
-        existing_logs = response["Body"].read().decode("utf-8")
-    except s3_client.exceptions.NoSuchKey:
-        existing_logs = ""
-
-    updated_logs = existing_logs + log_message
-
-    try:
-        s3_client.put_object(Body=updated_logs.encode("utf-8"), Bucket=S3_BUCKET_NAME, Key=LOG_FILE)
-        print(f"[DEBUG] Log updated successfully in {LOG_FILE}")
-    except Exception as e:
-        print(f"[ERROR] Failed to upload log: {e}")
+    # Append to the sharded access log (batched, uploaded in the background)
+    get_access_log().append(action, lock_status=lock_status)
+    print(f"[DEBUG] Log entry appended: {log_message.strip()}")
 
     # Update status file
     status_data = {
@@ -51,44 +34,26 @@ def upload_log_and_status(action, lock_status):
         "lock_status": lock_status
     }
 
-    try:
-        s3_client.put_object(
-            Body=json.dumps(status_data).encode("utf-8"),
-            Bucket=S3_BUCKET_NAME,
-            Key=STATUS_FILE
-        )
-        print(f"[DEBUG] door_status.json updated: {status_data}")
-    except Exception as e:
-        print(f"[ERROR] Failed to update door_status.json: {e}")
-
-def fetch_override_status():
-    """
-    Fetches the override boolean from S3.
-    Returns True (lock ON) or False (lock OFF). Defaults to True if error.
-    """
-    try:
-        print(f"[DEBUG] Fetching override file from S3 at {datetime.now()}")
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=OVERRIDE_FILE)
-        content = response["Body"].read().decode("utf-8")
-        print(f"[DEBUG] Raw override file content: {content}")
-
-        override_data = json.loads(content)
-        override_value = override_data.get("override", True)
-        print(f"[DEBUG] Parsed override value: {override_value} (type: {type(override_value)})")
-        return bool(override_value)
-    except (ClientError, json.JSONDecodeError) as e:
-        print(f"[ERROR] Failed to fetch or parse override file: {e}")
-        return True  # Safe default to locked
+    # Queued at the highest priority; the relay loop never waits on S3
+    get_upload_queue().enqueue_bytes(S3_BUCKET_NAME, STATUS_FILE, json.dumps(status_data).encode("utf-8"),
+                                     PRIORITY_LOCK_STATUS, coalesce=True)
+    print(f"[DEBUG] door_status.json queued: {status_data}")
 
 # GPIO Setup
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(RELAY_PIN, GPIO.OUT)
 
+# Override changes come from the override channel (conditional GETs, push when configured)
+overrides = OverrideChannel()
+overrides.start()
+
 try:
     last_state = None
 
     while True:
-        override_status = fetch_override_status()
+        override_status = overrides.value
+        if override_status is None:
+            override_status = True  # Safe default to locked
         print(f"[INFO] Override from file: {override_status}")
         print(f"[DEBUG] Last known state: {last_state}")
         print(f"[DEBUG] Comparison result: override_status={override_status} (type: {type(override_status)}), last_state={last_state} (type: {type(last_state)})")
@@ -111,7 +76,7 @@ try:
             print("[DEBUG] No state change. No update needed.")
 
         print("[INFO] --- End of cycle ---\n")
-        time.sleep(3)
+        overrides.wait_for_change(timeout=3)
 
 except KeyboardInterrupt:
     print("Exiting program.")
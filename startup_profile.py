@@ -0,0 +1,96 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# --- Config ---
+TOP_MODULES = 20                # rows shown by the import-time report
+LOCK_READY_TARGET = 1.0         # seconds from process start to lock control
+
+
+def process_age():
+    """Seconds since this process was exec'd (Linux /proc), so interpreter start-up is included."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time() - _loaded_at
+
+
+_loaded_at = time.time()
+_offset = process_age() - (time.time() - _loaded_at)
+_lock = threading.Lock()
+milestones = {}                 # name -> seconds since process start (first occurrence)
+imports = {}                    # module -> seconds spent in timed_import
+
+
+def now():
+    return _offset + (time.time() - _loaded_at)
+
+
+def mark(name):
+    """Record the first time `name` happened, in seconds since process start."""
+    with _lock:
+        if name not in milestones:
+            milestones[name] = round(now(), 3)
+            print(f"[BOOT] {name} at {milestones[name]:.3f}s")
+    return milestones[name]
+
+
+def timed_import(name):
+    """
+    importlib.import_module that records how long the first import took.
+    Always goes through importlib, so a caller racing an import already in
+    progress on another thread waits for it instead of getting the
+    partially initialised module out of sys.modules.
+    """
+    first = name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if first:
+        with _lock:
+            imports.setdefault(name, round(time.perf_counter() - start, 3))
+        print(f"[BOOT] Loaded {name} in {imports[name]:.3f}s")
+    return module
+
+
+def report():
+    ready = milestones.get("lock control ready")
+    return {"milestones": dict(milestones), "lazy_imports_seconds": dict(imports),
+            "lock_ready_seconds": ready, "lock_ready_target_seconds": LOCK_READY_TARGET,
+            "lock_ready_on_target": ready is not None and ready <= LOCK_READY_TARGET}
+
+
+def import_profile(module, top=TOP_MODULES):
+    """
+    Run `python -X importtime -c "import <module>"` and return (total_s, rows):
+    the slowest `top` rows as (cumulative_s, self_s, indent, name), slowest first.
+    indent is importtime's nesting whitespace; total_s is the largest cumulative time.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if m:
+            rows.append((int(m.group(2)) / 1e6, int(m.group(1)) / 1e6, m.group(3), m.group(4)))
+    if proc.returncode != 0:
+        print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    total = max((r[0] for r in rows), default=0.0)
+    return total, sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    # python startup_profile.py [module ...]   -> import-time report (default: main)
+    for module in sys.argv[1:] or ["main"]:
+        total, rows = import_profile(module)
+        print(f"\nimport {module}: {total:.3f}s")
+        print(f"{'cumulative':>11} {'self':>8}  module")
+        for cumulative, own, indent, name in rows:
+            print(f"{cumulative:>10.3f}s {own:>7.3f}s  {name}")
@@ -0,0 +1,276 @@
+import glob
+import itertools
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from metrics import timer
+from hal import s3_client
+
+# --- Config ---
+SPOOL_DIR = "/home/pi/smartdoor/upload_queue"
+MAX_SPOOL_BYTES = 512 * 1024 * 1024     # lowest-priority jobs are evicted beyond this
+WORKERS = 2                             # concurrent uploads
+BACKOFF_BASE = 2                        # seconds, doubled per failed attempt
+BACKOFF_MAX = 300
+
+# Priority classes: lower uploads first
+PRIORITY_LOCK_STATUS = 0
+PRIORITY_EVIDENCE = 1
+PRIORITY_MOTION_CLIP = 2
+PRIORITY_BUFFER = 3
+PRIORITY_NAMES = {PRIORITY_LOCK_STATUS: "lock_status", PRIORITY_EVIDENCE: "evidence",
+                  PRIORITY_MOTION_CLIP: "motion_clip", PRIORITY_BUFFER: "buffer"}
+
+
+def _fsync_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class UploadJob:
+    """One spooled object: its payload file plus a JSON sidecar describing where it goes."""
+
+    def __init__(self, job_id, bucket, key, priority, content_type=None, created=None, attempts=0):
+        self.id = job_id
+        self.bucket = bucket
+        self.key = key
+        self.priority = priority
+        self.content_type = content_type
+        self.created = created or time.time()
+        self.attempts = attempts
+        self.next_try = 0
+        self.size = 0
+        self.superseded = False
+
+    def to_json(self):
+        return json.dumps({"id": self.id, "bucket": self.bucket, "key": self.key, "priority": self.priority,
+                           "content_type": self.content_type, "created": self.created,
+                           "attempts": self.attempts}).encode()
+
+
+class UploadQueue:
+    """
+    Shared background uploader for every S3 write on the door.
+
+    Producers hand over bytes or a finished file and return immediately.
+    The payload is spooled to disk first, so it survives going offline,
+    a crash or a reboot. WORKERS threads share one pooled client and always
+    take the highest-priority job that is due. Jobs for the same bucket/key
+    never run concurrently, so a newer version cannot be overwritten by an
+    older PUT that was still in flight. A failed job backs off
+    exponentially. The first success after a failure makes every waiting
+    job due again, so the backlog drains as soon as the network is back.
+    """
+
+    def __init__(self, spool_dir=SPOOL_DIR, workers=WORKERS, client=None):
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._threads = []
+        self._running = False
+        self.metrics = {"enqueued": 0, "uploaded": 0, "failed_attempts": 0, "evicted": 0,
+                        "superseded": 0, "bytes_uploaded": 0, "last_upload_seconds": 0.0}
+        os.makedirs(spool_dir, exist_ok=True)
+        self._load_spool()
+
+    @property
+    def client(self):
+        # Created by the first upload, not at start-up: enqueueing never waits on boto3
+        with self._client_lock:
+            if self._client is None:
+                self._client = s3_client(signature_version="s3v4", max_pool_connections=self.workers,
+                                         retries={"max_attempts": 2, "mode": "standard"})
+            return self._client
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"uploader-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[UPLOAD] Queue started ({len(self._jobs)} spooled job(s), {self.workers} worker(s)).")
+        return self
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _load_spool(self):
+        for meta_path in glob.glob(os.path.join(self.spool_dir, "*.json")):
+            try:
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+                job = UploadJob(meta["id"], meta["bucket"], meta["key"], meta["priority"],
+                                meta.get("content_type"), meta.get("created"), meta.get("attempts", 0))
+                job.size = os.path.getsize(self._payload_path(job))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[UPLOAD] Dropping unreadable spool entry {meta_path}: {e}")
+                os.remove(meta_path)
+                continue
+            self._jobs[job.id] = job
+        if self._jobs:
+            last = max(int(job_id.split("-")[-1]) for job_id in self._jobs)
+            self._ids = itertools.count(last + 1)
+
+    # --- Producers ---
+    def enqueue_bytes(self, bucket, key, body, priority, content_type=None, coalesce=False):
+        """
+        Spool `body` for upload. With coalesce=True an older job for the
+        same bucket/key that has not been sent yet is dropped, for objects
+        where only the newest version matters (e.g. door_status.json).
+        """
+        job = self._new_job(bucket, key, priority, content_type)
+        _fsync_write(self._payload_path(job), body)
+        job.size = len(body)
+        return self._commit(job, coalesce)
+
+    def enqueue_file(self, path, bucket, key, priority, content_type=None):
+        """Move a finished file into the spool and upload it; the original path is free to reuse."""
+        job = self._new_job(bucket, key, priority, content_type)
+        shutil.move(path, self._payload_path(job))
+        job.size = os.path.getsize(self._payload_path(job))
+        return self._commit(job, False)
+
+    def _new_job(self, bucket, key, priority, content_type):
+        return UploadJob(f"{priority}-{next(self._ids):08d}", bucket, key, priority, content_type)
+
+    def _payload_path(self, job):
+        return os.path.join(self.spool_dir, job.id + ".bin")
+
+    def _meta_path(self, job):
+        return os.path.join(self.spool_dir, job.id + ".json")
+
+    def _commit(self, job, coalesce):
+        _fsync_write(self._meta_path(job), job.to_json())
+        with self._cond:
+            if coalesce:
+                for old in [j for j in self._jobs.values() if j.bucket == job.bucket and j.key == job.key]:
+                    self.metrics["superseded"] += 1
+                    if old.attempts < 0:
+                        old.superseded = True   # in flight; never retried
+                    else:
+                        self._discard(old)
+            self._jobs[job.id] = job
+            self.metrics["enqueued"] += 1
+            self._evict()
+            self._cond.notify()
+        return job.id
+
+    def _discard(self, job):
+        self._jobs.pop(job.id, None)
+        for path in (self._meta_path(job), self._payload_path(job)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _evict(self):
+        """Keep the spool under MAX_SPOOL_BYTES by dropping the oldest lowest-priority jobs."""
+        total = sum(j.size for j in self._jobs.values())
+        for job in sorted(self._jobs.values(), key=lambda j: (-j.priority, j.created)):
+            if total <= MAX_SPOOL_BYTES or job.priority == PRIORITY_LOCK_STATUS:
+                break
+            if job.attempts < 0:        # being uploaded right now
+                continue
+            print(f"[UPLOAD] Spool full, dropping {job.key}")
+            total -= job.size
+            self._discard(job)
+            self.metrics["evicted"] += 1
+
+    # --- Workers ---
+    def _next_due(self):
+        now = time.time()
+        # Jobs whose object is being uploaded right now wait for that upload to finish
+        busy = {(j.bucket, j.key) for j in self._jobs.values() if j.attempts < 0}
+        ready = [j for j in self._jobs.values() if j.attempts >= 0 and (j.bucket, j.key) not in busy]
+        due = [j for j in ready if j.next_try <= now]
+        if due:
+            return min(due, key=lambda j: (j.priority, j.id)), 0
+        waiting = [j.next_try for j in ready]
+        return None, (min(waiting) - now if waiting else None)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    job, wait = self._next_due()
+                    if job is not None:
+                        break
+                    self._cond.wait(wait)
+                if not self._running:
+                    return
+                attempts, job.attempts = job.attempts, -1      # claimed
+            ok = self._upload(job, attempts + 1)
+            with self._cond:
+                if not ok and job.superseded:
+                    self._discard(job)
+                    self._cond.notify_all()     # the newer version of this key may go now
+                elif ok:
+                    self._discard(job)
+                    # The network is back: stop backing off everything else
+                    for other in self._jobs.values():
+                        other.next_try = 0
+                    self._cond.notify_all()
+                elif job.id in self._jobs:
+                    job.attempts = attempts + 1
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts)
+                    job.next_try = time.time() + delay * random.uniform(0.5, 1.0)
+                    self._cond.notify_all()
+
+    def _upload(self, job, attempt):
+        extra = {"ContentType": job.content_type} if job.content_type else {}
+        start = time.time()
+        try:
+            stage = "s3_put_" + PRIORITY_NAMES.get(job.priority, "other")
+            with open(self._payload_path(job), "rb") as body, timer(stage):
+                self.client.put_object(Bucket=job.bucket, Key=job.key, Body=body, **extra)
+        except FileNotFoundError:
+            print(f"[UPLOAD] Payload for {job.key} vanished, dropping job.")
+            return True
+        except Exception as e:
+            self.metrics["failed_attempts"] += 1
+            print(f"[UPLOAD] {job.key} failed (attempt {attempt}): {e}")
+            return False
+        self.metrics["uploaded"] += 1
+        self.metrics["bytes_uploaded"] += job.size
+        self.metrics["last_upload_seconds"] = time.time() - start
+        print(f"[UPLOAD] {job.key} → s3://{job.bucket}/{job.key}")
+        return True
+
+    # --- Metrics ---
+    def stats(self):
+        with self._cond:
+            pending = {name: 0 for name in PRIORITY_NAMES.values()}
+            for job in self._jobs.values():
+                pending[PRIORITY_NAMES.get(job.priority, str(job.priority))] += 1
+            oldest = min((j.created for j in self._jobs.values()), default=None)
+            return dict(self.metrics, pending=pending,
+                        spool_bytes=sum(j.size for j in self._jobs.values()),
+                        oldest_pending_seconds=time.time() - oldest if oldest else 0.0)
+
+
+upload_queue = None
+_queue_lock = threading.Lock()
+
+def get_upload_queue():
+    global upload_queue
+    with _queue_lock:
+        if upload_queue is None:
+            upload_queue = UploadQueue().start()
+    return upload_queue